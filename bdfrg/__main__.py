@@ -0,0 +1,7 @@
+import sys
+
+from bdfrg.cli import main
+
+# Guarded, worker processes started with spawn import the main module again
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,406 @@
+"""
+Command line entry point of bdfrg, usable on machines without a display.
+
+Only the configuration model and the serializers are imported here, Tk is imported when the "gui" command is run.
+Run as python -m bdfrg <command>.
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+from bdfrg.configuration_profiles import ProfileStore, load_configuration_file
+from bdfrg.input_configuration import BDFR_MODES, InputConfiguration, argv_to_string, validate_input_configuration
+
+
+def load_configuration(arguments: argparse.Namespace) -> InputConfiguration:
+    if arguments.profile is not None:
+        return ProfileStore(arguments.profiles_directory).load(arguments.profile)
+    return load_configuration_file(arguments.configuration)
+
+
+def add_configuration_arguments(parser: argparse.ArgumentParser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('configuration', nargs='?',
+                        help='A configuration JSON file, the profile.json of a profile or a profile directory')
+    source.add_argument('--profile', help='The name of a saved profile')
+    parser.add_argument('--profiles-directory',
+                        help='The directory holding the profiles (default: ~/.config/bdfrg/profiles)')
+    parser.add_argument('--mode', choices=BDFR_MODES, default='download', help='The BDFR sub command')
+
+
+def run_command(arguments: argparse.Namespace) -> int:
+    input_config = load_configuration(arguments)
+
+    if not arguments.skip_validation:
+        problems = validate_input_configuration(input_config, arguments.mode)
+        if problems:
+            for problem in problems:
+                print(f'error: {problem}', file=sys.stderr)
+            return 1
+
+    if arguments.exclude_existing:
+        from bdfrg.directory_index import exclude_indexed_posts
+        input_config = exclude_indexed_posts(input_config)
+
+    # Imported on use, validating does not need the job runner and the ID file handling
+    from bdfrg.execution.job_runner import build_command
+    command = build_command(input_config, arguments.mode, arguments.executable)
+
+    if arguments.json:
+        json.dump(command, sys.stdout)
+        sys.stdout.write('\n')
+    else:
+        print(argv_to_string(command))
+    return 0
+
+
+def run_validate(arguments: argparse.Namespace) -> int:
+    problems = validate_input_configuration(load_configuration(arguments), arguments.mode)
+
+    for problem in problems:
+        print(f'error: {problem}', file=sys.stderr)
+    if not problems:
+        print('Configuration is valid')
+    return 1 if problems else 0
+
+
+def run_batch(arguments: argparse.Namespace) -> int:
+    from bdfrg.execution import job_manifest
+
+    if arguments.base_profile is not None:
+        base_config = ProfileStore(arguments.profiles_directory).load(arguments.base_profile)
+    elif arguments.base is not None:
+        base_config = load_configuration_file(arguments.base)
+    else:
+        base_config = None
+
+    report = job_manifest.ManifestReport()
+    generate_lines = job_manifest.generate_script_lines if arguments.format == 'script' \
+        else job_manifest.generate_json_lines
+
+    # The manifest is streamed, each job is read, validated and written before the next one is read
+    with open(arguments.manifest, newline='') as manifest_file:
+        entries = job_manifest.read_manifest(manifest_file, arguments.manifest_format)
+        jobs = job_manifest.generate_jobs(entries, base_config, arguments.mode, arguments.executable)
+
+        output = open(arguments.output, 'w') if arguments.output is not None else sys.stdout
+        try:
+            for line in generate_lines(jobs, report):
+                output.write(line)
+                output.write('\n')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+    print(report.summary(), file=sys.stderr)
+    return 1 if report.invalid_count else 0
+
+
+def run_index(arguments: argparse.Namespace) -> int:
+    from bdfrg.directory_index import DirectoryIndex
+
+    index = DirectoryIndex.for_configuration(load_configuration(arguments))
+    if not arguments.full:
+        index.load()
+    report = index.update(arguments.workers)
+    index.save()
+
+    print(report.summary(), file=sys.stderr)
+    if arguments.output is not None:
+        index.get_ids().write(arguments.output)
+    return 0
+
+
+def run_dedupe(arguments: argparse.Namespace) -> int:
+    from bdfrg.dedupe import DedupeEngine, HashCache
+
+    directory = load_configuration(arguments).directory
+    if not directory:
+        raise Exception('The configuration has no download directory')
+
+    hash_cache = HashCache(arguments.hash_cache)
+    try:
+        report = DedupeEngine(directory, hash_cache, arguments.workers, arguments.min_size).run(arguments.dry_run)
+    finally:
+        hash_cache.close()
+
+    print(report.summary())
+    return 1 if report.failed_files else 0
+
+
+def run_schemes(arguments: argparse.Namespace) -> int:
+    from bdfrg import scheme_analysis
+
+    posts = scheme_analysis.load_posts(arguments.sample, arguments.posts) if arguments.sample is not None else None
+    analysis = scheme_analysis.analyze_configuration(load_configuration(arguments), posts)
+
+    print(f'Example: {analysis.example_path}')
+    print(analysis.summary())
+    for warning in analysis.warnings:
+        print(f'warning: {warning}', file=sys.stderr)
+    return 1 if analysis.warnings else 0
+
+
+def run_logs(arguments: argparse.Namespace) -> int:
+    from bdfrg.execution import log_analysis
+    from bdfrg.execution.progress import format_duration
+
+    analysis = log_analysis.analyze_logs(arguments.logs, arguments.workers)
+    print(analysis.summary(), file=sys.stderr)
+
+    for title, sources in (('Domain', analysis.domains), ('Module', analysis.modules)):
+        print(f'{title:<30} {"attempts":>9} {"success":>8} {"timeouts":>9} {"time":>10}')
+        for name, stats in sorted(sources.items(), key=lambda item: -item[1].seconds)[:arguments.top]:
+            print(f'{name:<30} {stats.attempts:>9} {stats.success_rate:>8.0%} {stats.timeouts:>9} '
+                  f'{format_duration(stats.seconds):>10}')
+        print()
+
+    suggestion = log_analysis.suggest_exclusions(analysis, arguments.min_attempts, arguments.max_success_rate)
+    if not suggestion.skip_domain and not suggestion.disable_module:
+        print('No domains or modules to exclude')
+        return 0
+
+    print(f'Suggested exclusions, {format_duration(suggestion.seconds)} spent on them: '
+          f'{argv_to_string(suggestion.to_arguments())}')
+    if arguments.profile is not None:
+        store = ProfileStore(arguments.profiles_directory)
+        store.save(arguments.profile, log_analysis.apply_exclusions(store.load(arguments.profile), suggestion))
+        print(f'Added to profile {arguments.profile}')
+    return 0
+
+
+def run_sync(arguments: argparse.Namespace) -> int:
+    from bdfrg.execution.incremental_sync import IncrementalSync
+    from bdfrg.execution.rate_budget import RateBudget
+
+    sync = IncrementalSync(load_configuration(arguments), arguments.mode, arguments.executable, arguments.state,
+                           arguments.log_directory)
+    if arguments.plan:
+        sync.load()
+        for job in sync.plan():
+            print(f'# {job.key}')
+            print(argv_to_string(job.command))
+        return 0
+
+    sync.budget = RateBudget()
+    report = sync.run(arguments.concurrency)
+    print(report.summary())
+    return 1 if any(result.return_code != 0 for result in report.results) else 0
+
+
+def run_job(arguments: argparse.Namespace) -> int:
+    import threading
+
+    from bdfrg.execution.checkpoint import SYNC_INTERVAL_SECONDS, CheckpointJournal, resume_configuration
+    from bdfrg.execution.job_runner import build_command, run_process
+    from bdfrg.execution.rate_budget import BudgetLease, RateBudget, get_target_count
+
+    input_config = load_configuration(arguments)
+
+    if not arguments.skip_validation:
+        problems = validate_input_configuration(input_config, arguments.mode)
+        if problems:
+            for problem in problems:
+                print(f'error: {problem}', file=sys.stderr)
+            return 1
+
+    # Derived before resuming, so every run of the configuration uses the same journal
+    journal = CheckpointJournal.for_configuration(input_config, arguments.mode)
+    completed_ids = journal.load()
+    if completed_ids and arguments.no_resume:
+        journal.discard()
+    elif completed_ids:
+        print(f'Resuming, skipping {len(completed_ids)} posts completed by an interrupted run', file=sys.stderr)
+        input_config = resume_configuration(input_config, completed_ids)
+
+    command = build_command(input_config, arguments.mode, arguments.executable)
+    lease = BudgetLease(RateBudget(), arguments.profile or arguments.configuration, arguments.mode,
+                        get_target_count(input_config))
+    journal.open()
+    # Syncs the journal also while BDFR prints nothing, e.g. while it downloads a large video
+    journal_closed = threading.Event()
+
+    def sync_journal():
+        while not journal_closed.wait(SYNC_INTERVAL_SECONDS):
+            journal.sync()
+
+    def on_line(line: str):
+        sys.stdout.write(line)
+        journal.feed(line)
+        lease.feed(line)
+
+    threading.Thread(target=sync_journal, daemon=True).start()
+    try:
+        if not lease.try_start():
+            print('Waiting for the API budget shared with the other running jobs', file=sys.stderr)
+            lease.wait()
+        return_code, resource_monitor = run_process(command, on_line, input_config.resource_config)
+        if resource_monitor.available:
+            print(f'Resources: {resource_monitor.totals.summary()}', file=sys.stderr)
+    finally:
+        lease.release()
+        journal_closed.set()
+        journal.close()
+
+    if return_code == 0:
+        journal.discard()
+    return return_code
+
+
+def run_budget(arguments: argparse.Namespace) -> int:
+    import time
+
+    from bdfrg.execution.progress import format_duration
+    from bdfrg.execution.rate_budget import RateBudget
+
+    budget = RateBudget()
+    if arguments.requests_per_minute is not None or arguments.max_jobs is not None:
+        budget.configure(arguments.requests_per_minute, arguments.max_jobs)
+
+    while True:
+        metrics = budget.metrics()
+        print(metrics.summary())
+        for job in metrics.jobs:
+            state = f'{job.requests_per_minute:.1f} requests per minute' if job.running else 'waiting'
+            print(f'  {job.description} (pid {job.pid}): {state}, {job.requests:.0f} requests in '
+                  f'{format_duration(job.seconds)}')
+        if arguments.watch is None:
+            return 0
+        try:
+            time.sleep(arguments.watch)
+        except KeyboardInterrupt:
+            return 0
+
+
+def run_gui(arguments: argparse.Namespace) -> int:
+    # The only place Tk is imported, everything else works without a display
+    from bdfrg.gui import configuration_gui
+    configuration_gui.main()
+    return 0
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='bdfrg', description='Build and validate Bulk Downloader For Reddit commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command_parser = commands.add_parser('command', help='Print the BDFR command of a configuration')
+    add_configuration_arguments(command_parser)
+    command_parser.add_argument('--executable', default='bdfr', help='The BDFR executable (default: %(default)s)')
+    command_parser.add_argument('--json', action='store_true',
+                                help='Print the argument list as JSON array instead of a shell command')
+    command_parser.add_argument('--skip-validation', action='store_true',
+                                help='Print the command even if the configuration is invalid')
+    command_parser.add_argument('--exclude-existing', action='store_true',
+                                help='Index the download directory and exclude the posts already downloaded to it')
+    command_parser.set_defaults(handler=run_command)
+
+    validate_parser = commands.add_parser('validate', help='Check a configuration for invalid values')
+    add_configuration_arguments(validate_parser)
+    validate_parser.set_defaults(handler=run_validate)
+
+    batch_parser = commands.add_parser('batch', help='Build the BDFR commands of all jobs of a manifest')
+    batch_parser.add_argument('manifest', help='A CSV or JSON Lines (.jsonl) file with one job per row')
+    base = batch_parser.add_mutually_exclusive_group()
+    base.add_argument('--base', help='The configuration file the jobs are applied to')
+    base.add_argument('--base-profile', help='The name of the saved profile the jobs are applied to')
+    batch_parser.add_argument('--profiles-directory',
+                              help='The directory holding the profiles (default: ~/.config/bdfrg/profiles)')
+    batch_parser.add_argument('--manifest-format', choices=('csv', 'jsonl'),
+                              help='The format of the manifest (default: csv for .csv files, jsonl otherwise)')
+    batch_parser.add_argument('--mode', choices=BDFR_MODES, default='download',
+                              help='The BDFR sub command of jobs without a mode')
+    batch_parser.add_argument('--executable', default='bdfr', help='The BDFR executable (default: %(default)s)')
+    batch_parser.add_argument('--format', choices=('script', 'jsonl'), default='script',
+                              help='Write a shell script or one JSON object per job (default: %(default)s)')
+    batch_parser.add_argument('--output', help='The file to write to (default: standard output)')
+    batch_parser.set_defaults(handler=run_batch)
+
+    index_parser = commands.add_parser('index', help='Index the post IDs already downloaded to the directory of a '
+                                                     'configuration')
+    add_configuration_arguments(index_parser)
+    index_parser.add_argument('--output', help='Write the IDs to this file, usable as --exclude-id-file')
+    index_parser.add_argument('--full', action='store_true', help='Scan all directories, not only the changed ones')
+    index_parser.add_argument('--workers', type=int, help='The number of threads scanning directories')
+    index_parser.set_defaults(handler=run_index)
+
+    dedupe_parser = commands.add_parser('dedupe', help='Replace duplicate files in the download directory of a '
+                                                       'configuration with hard links')
+    add_configuration_arguments(dedupe_parser)
+    dedupe_parser.add_argument('--dry-run', action='store_true', help='Only report the duplicates')
+    dedupe_parser.add_argument('--workers', type=int, help='The number of hashing processes')
+    dedupe_parser.add_argument('--min-size', type=int, default=1024,
+                               help='Ignore files smaller than this many bytes (default: %(default)s)')
+    dedupe_parser.add_argument('--hash-cache', help='The hash cache database (default: ~/.cache/bdfrg/'
+                                                    'hash_cache.sqlite3)')
+    dedupe_parser.set_defaults(handler=run_dedupe)
+
+    schemes_parser = commands.add_parser('schemes', help='Preview the paths the file and folder scheme of a '
+                                                         'configuration produce')
+    add_configuration_arguments(schemes_parser)
+    schemes_parser.add_argument('--sample', help='Post metadata written by "bdfr archive" (a JSON or JSON Lines file '
+                                                 'or a directory of them), a synthetic sample is used if not given')
+    schemes_parser.add_argument('--posts', type=int, help='Analyze at most this many posts of the sample')
+    schemes_parser.set_defaults(handler=run_schemes)
+
+    logs_parser = commands.add_parser('logs', help='Show per domain and module statistics of BDFR log files and '
+                                                   'suggest domains and modules to exclude')
+    logs_parser.add_argument('logs', nargs='+', help='Log files written by BDFR with --log')
+    logs_parser.add_argument('--workers', type=int, help='The number of processes analyzing large files')
+    logs_parser.add_argument('--top', type=int, default=20,
+                             help='The number of domains and modules shown (default: %(default)s)')
+    logs_parser.add_argument('--min-attempts', type=int, default=20,
+                             help='Only suggest domains and modules attempted this often (default: %(default)s)')
+    logs_parser.add_argument('--max-success-rate', type=float, default=0.1,
+                             help='Suggest domains and modules succeeding at most this often (default: %(default)s)')
+    logs_parser.add_argument('--profile', help='Add the suggested exclusions to this saved profile')
+    logs_parser.add_argument('--profiles-directory',
+                             help='The directory holding the profiles (default: ~/.config/bdfrg/profiles)')
+    logs_parser.set_defaults(handler=run_logs)
+
+    sync_parser = commands.add_parser('sync', help='Download only the posts that are new since the last sync, one job '
+                                                   'per subreddit, user and multireddit')
+    add_configuration_arguments(sync_parser)
+    sync_parser.add_argument('--executable', default='bdfr', help='The BDFR executable (default: %(default)s)')
+    sync_parser.add_argument('--plan', action='store_true', help='Only print the commands of the next sync')
+    sync_parser.add_argument('--concurrency', type=int, default=1,
+                             help='The number of jobs running at the same time (default: %(default)s)')
+    sync_parser.add_argument('--state', help='The state file (default: derived from the download directory, in '
+                                             '~/.cache/bdfrg/sync)')
+    sync_parser.add_argument('--log-directory', help='Where the log files of the jobs are written (default: next to '
+                                                     'the state file)')
+    sync_parser.set_defaults(handler=run_sync)
+
+    run_parser = commands.add_parser('run', help='Run BDFR with a configuration, an interrupted run is resumed '
+                                                 'where it stopped')
+    add_configuration_arguments(run_parser)
+    run_parser.add_argument('--executable', default='bdfr', help='The BDFR executable (default: %(default)s)')
+    run_parser.add_argument('--no-resume', action='store_true',
+                            help='Start over, forgetting the posts completed by an interrupted run')
+    run_parser.add_argument('--skip-validation', action='store_true',
+                            help='Run BDFR even if the configuration is invalid')
+    run_parser.set_defaults(handler=run_job)
+
+    budget_parser = commands.add_parser('budget', help='Show the usage of the API budget shared by the running jobs '
+                                                       'and change the budget')
+    budget_parser.add_argument('--requests-per-minute', type=float,
+                               help='The combined requests per minute of all jobs')
+    budget_parser.add_argument('--max-jobs', type=int, help='The maximum number of jobs running at the same time')
+    budget_parser.add_argument('--watch', type=float, metavar='SECONDS',
+                               help='Show the usage every SECONDS seconds until interrupted')
+    budget_parser.set_defaults(handler=run_budget)
+
+    gui_parser = commands.add_parser('gui', help='Start the configuration GUI')
+    gui_parser.set_defaults(handler=run_gui)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    arguments = create_parser().parse_args(argv)
+
+    try:
+        return arguments.handler(arguments)
+    except Exception as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
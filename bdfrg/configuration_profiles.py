@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+from bdfrg import type_utils
+from bdfrg.input_configuration import InputConfiguration
+
+# Bump when the on disk layout of profiles changes
+PROFILE_VERSION = 1
+
+# Lists with more entries than this are stored in their own file next to the profile instead of inline
+INLINE_LIST_LIMIT = 100
+
+# Key marking a list that is stored in its own file
+LIST_FILE_KEY = '$file'
+
+CONFIGURATION_FILE_NAME = 'profile.json'
+SUMMARY_FILE_NAME = 'summary.json'
+
+PROFILE_NAME_PATTERN = re.compile(r'^[\w-][\w .-]*$')
+
+
+def get_default_profiles_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config'),
+                        'bdfrg', 'profiles')
+
+
+@dataclass
+class ProfileSummary:
+    name: str
+    saved_at: float
+    # Number of entries per list field (e.g. 'download_config.exclude_id' -> 120000), only non-empty lists
+    list_counts: Dict[str, int]
+
+    @property
+    def target_count(self) -> int:
+        return sum(self.list_counts.get(field_name, 0) for field_name in ('subreddit', 'user', 'multireddit', 'link'))
+
+
+def _write_text(path: str, text: str):
+    # Write to a temporary file first, so a crash never leaves a partially written file behind
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+
+
+def _write_json(path: str, value):
+    _write_text(path, json.dumps(value))
+
+
+def load_configuration_file(path: str) -> InputConfiguration:
+    """
+    Load a configuration from a file. Accepts a profile directory, the profile.json of a profile (lists stored in
+    their own file are read from next to it) or a plain JSON object as written by type_utils.dataclass_to_dict.
+    Fields missing from a plain JSON object keep their default value.
+    :param path: The path of the file or profile directory
+    :return: The configuration
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, CONFIGURATION_FILE_NAME)
+    profile_directory = os.path.dirname(path)
+
+    with open(path) as f:
+        profile = json.load(f)
+
+    if not isinstance(profile, dict):
+        raise Exception(f'Expected a JSON object in {path}')
+
+    if 'configuration' not in profile:
+        return type_utils.dataclass_from_dict(InputConfiguration, profile)
+
+    if profile.get('version') != PROFILE_VERSION:
+        raise Exception(f'Unsupported version {profile.get("version")} of profile {path}')
+
+    def internalize(values: dict):
+        for field_name, value in values.items():
+            if isinstance(value, dict) and LIST_FILE_KEY in value:
+                with open(os.path.join(profile_directory, value[LIST_FILE_KEY])) as f:
+                    values[field_name] = f.read().split('\n')
+            elif isinstance(value, dict):
+                internalize(value)
+
+    configuration = profile['configuration']
+    internalize(configuration)
+
+    return type_utils.dataclass_from_dict(InputConfiguration, configuration)
+
+
+class ProfileStore:
+    """
+    Stores named configuration profiles, each in its own directory.
+
+    A profile consists of a small summary (read by the profile browser), the configuration with all small values
+    and one plain text file per large list, one entry per line. The large lists are only read when the profile is
+    loaded, reading them is a single split of the file content.
+
+    :param directory: The directory holding the profiles.
+    :type directory: str
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or get_default_profiles_directory()
+
+    def get_profile_directory(self, name: str) -> str:
+        if not PROFILE_NAME_PATTERN.match(name):
+            raise Exception(f'Invalid profile name {name!r}, only letters, digits, spaces, ".", "_" and "-" are allowed')
+        return os.path.join(self.directory, name)
+
+    def save(self, name: str, input_config: InputConfiguration):
+        """
+        Save a configuration as profile, replacing an existing profile of the same name.
+        :param name: The name of the profile
+        :param input_config: The configuration to save
+        :return: None
+        """
+        profile_directory = self.get_profile_directory(name)
+        os.makedirs(profile_directory, exist_ok=True)
+
+        list_counts = {}
+        list_files = set()
+
+        def externalize(values: dict, prefix: str):
+            for field_name, value in values.items():
+                path = prefix + field_name
+                if isinstance(value, dict):
+                    externalize(value, f'{path}.')
+                elif isinstance(value, list) and value:
+                    list_counts[path] = len(value)
+                    if len(value) > INLINE_LIST_LIMIT:
+                        file_name = f'{path}.txt'
+                        _write_text(os.path.join(profile_directory, file_name), '\n'.join(value))
+                        list_files.add(file_name)
+                        values[field_name] = {LIST_FILE_KEY: file_name}
+
+        configuration = type_utils.dataclass_to_dict(input_config)
+        externalize(configuration, '')
+
+        _write_json(os.path.join(profile_directory, CONFIGURATION_FILE_NAME),
+                    {'version': PROFILE_VERSION, 'configuration': configuration})
+        _write_json(os.path.join(profile_directory, SUMMARY_FILE_NAME),
+                    {'version': PROFILE_VERSION, 'saved_at': time.time(), 'list_counts': list_counts})
+
+        # Remove list files of a previous save that are no longer used
+        for file_name in os.listdir(profile_directory):
+            if file_name.endswith('.txt') and file_name not in list_files:
+                os.remove(os.path.join(profile_directory, file_name))
+
+    def load(self, name: str) -> InputConfiguration:
+        """
+        Load a profile.
+        :param name: The name of the profile
+        :return: The configuration of the profile
+        """
+        return load_configuration_file(os.path.join(self.get_profile_directory(name), CONFIGURATION_FILE_NAME))
+
+    def load_summary(self, name: str) -> ProfileSummary:
+        with open(os.path.join(self.get_profile_directory(name), SUMMARY_FILE_NAME)) as f:
+            summary = json.load(f)
+        return ProfileSummary(name, summary['saved_at'], summary['list_counts'])
+
+    def list_profiles(self) -> List[ProfileSummary]:
+        """
+        List all profiles, only the small summary of each profile is read.
+        :return: The summaries of all profiles, sorted by name
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        summaries = []
+        for name in sorted(os.listdir(self.directory)):
+            # Not a profile, e.g. .DS_Store or a stray file
+            if not PROFILE_NAME_PATTERN.match(name):
+                continue
+            try:
+                summaries.append(self.load_summary(name))
+            except (OSError, ValueError, KeyError) as e:
+                print(f'Skipping invalid profile {name}: {e}')
+
+        return summaries
+
+    def delete(self, name: str):
+        shutil.rmtree(self.get_profile_directory(name))
@@ -0,0 +1,278 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Files at least this large are hashed through a memory map instead of being read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+# Files are sent to the worker processes in batches, one task per file costs more than hashing small files
+HASH_BATCH_SIZE = 64
+
+# SQLite limits the number of parameters of a statement
+_LOOKUP_BATCH_SIZE = 400
+
+# Suffix of the temporary link created next to a duplicate before it replaces it
+_LINK_SUFFIX = '.bdfrg-link'
+
+
+def get_default_hash_cache_path() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'hash_cache.sqlite3')
+
+
+def hash_file(path: str) -> str:
+    """
+    Compute the SHA-256 hash of a file, large files are read through a memory map.
+    :param path: The path of the file
+    :return: The hex digest
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return hashlib.sha256(f.read()).hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def hash_files(paths: List[str]) -> List[Optional[str]]:
+    # Runs in the worker processes, files that can not be read get no hash
+    hashes = []
+    for path in paths:
+        try:
+            hashes.append(hash_file(path))
+        except (OSError, ValueError):
+            hashes.append(None)
+    return hashes
+
+
+# (device, inode, size, modification time), changes whenever the content of a file may have changed
+FileKey = Tuple[int, int, int, int]
+
+
+class HashCache:
+    """
+    Persistent cache of file hashes in a SQLite database, keyed by (device, inode, size, modification time).
+    A file that was modified or replaced gets a different key, so its old hash is never used.
+
+    :param path: The path of the database.
+    :type path: str
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or get_default_hash_cache_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS hashes (device INTEGER, inode INTEGER, size INTEGER, '
+                                'modification_time INTEGER, hash TEXT, PRIMARY KEY (device, inode))')
+
+    def get(self, keys: Iterable[FileKey]) -> Dict[FileKey, str]:
+        """
+        Look up the hashes of files.
+        :param keys: The keys of the files
+        :return: The cached hashes by key, keys without an up to date hash are missing
+        """
+        keys = list(keys)
+        hashes = {}
+
+        for start in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + _LOOKUP_BATCH_SIZE]
+            wanted = set(batch)
+            condition = ' OR '.join(['(device = ? AND inode = ?)'] * len(batch))
+            parameters = [value for key in batch for value in key[:2]]
+
+            for device, inode, size, modification_time, file_hash in self.connection.execute(
+                    f'SELECT device, inode, size, modification_time, hash FROM hashes WHERE {condition}', parameters):
+                key = (device, inode, size, modification_time)
+                if key in wanted:
+                    hashes[key] = file_hash
+
+        return hashes
+
+    def put(self, hashes: Dict[FileKey, str]):
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)',
+                                        [key + (file_hash,) for key, file_hash in hashes.items()])
+
+    def close(self):
+        self.connection.close()
+
+
+@dataclass
+class DedupeReport:
+    scanned_files: int = 0
+    # Files sharing their size with another file, only these are hashed
+    candidate_files: int = 0
+    hashed_files: int = 0
+    cached_files: int = 0
+    duplicate_files: int = 0
+    linked_files: int = 0
+    reclaimed_bytes: int = 0
+    failed_files: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return f'{self.scanned_files} files, {self.candidate_files} candidates ({self.hashed_files} hashed, ' \
+               f'{self.cached_files} cached), {self.duplicate_files} duplicates, {self.linked_files} hard linked, ' \
+               f'{self.reclaimed_bytes / 1e6:.1f} MB reclaimed, {self.failed_files} failed in {self.seconds:.1f}s'
+
+
+def _walk_files(directory: str) -> Iterator[Tuple[str, os.stat_result]]:
+    pending = [directory]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(_LINK_SUFFIX):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+
+
+class DedupeEngine:
+    """
+    Replaces duplicate files in a directory tree with hard links.
+
+    Files are grouped by device and size first, only files sharing both with a file of another inode can be
+    duplicates and are hashed. Hashes are taken from the HashCache if possible, the rest is hashed in a process
+    pool. Within each group of equal hashes, all files are linked to the oldest one.
+
+    :param directory: The directory to deduplicate.
+    :type directory: str
+    :param hash_cache: The cache of file hashes.
+    :type hash_cache: HashCache
+    :param max_workers: The number of hashing processes, the number of CPUs if not given.
+    :type max_workers: int
+    :param min_size: Files smaller than this are ignored, linking them saves less than it costs.
+    :type min_size: int
+    """
+
+    def __init__(self, directory: str, hash_cache: HashCache, max_workers: int = None, min_size: int = 1024):
+        self.directory = directory
+        self.hash_cache = hash_cache
+        self.max_workers = max_workers
+        self.min_size = min_size
+        # Number of hard links of every candidate, including links outside of the directory
+        self.link_counts: Dict[FileKey, int] = {}
+
+    def find_candidates(self, report: DedupeReport) -> Dict[FileKey, List[str]]:
+        """
+        Find the files that may have duplicates.
+        :param report: Counts the scanned and candidate files
+        :return: The paths of every candidate file by key, files hard linked to each other share a key
+        """
+        # (device, size) -> key -> paths
+        groups: Dict[Tuple[int, int], Dict[FileKey, List[str]]] = defaultdict(lambda: defaultdict(list))
+
+        for path, stat in _walk_files(self.directory):
+            report.scanned_files += 1
+            if stat.st_size >= self.min_size:
+                key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                groups[stat.st_dev, stat.st_size][key].append(path)
+                self.link_counts[key] = stat.st_nlink
+
+        candidates = {}
+        for files in groups.values():
+            if len(files) > 1:
+                candidates.update(files)
+                report.candidate_files += sum(map(len, files.values()))
+        return candidates
+
+    def hash_candidates(self, candidates: Dict[FileKey, List[str]], report: DedupeReport) -> Dict[FileKey, str]:
+        hashes = self.hash_cache.get(candidates)
+        report.cached_files = len(hashes)
+
+        missing = [key for key in candidates if key not in hashes]
+        batches = [missing[start:start + HASH_BATCH_SIZE] for start in range(0, len(missing), HASH_BATCH_SIZE)]
+        new_hashes = {}
+
+        if batches:
+            # Spawned instead of forked, forking a process running threads (e.g. the GUI) is not safe
+            with ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                path_batches = ([candidates[key][0] for key in batch] for batch in batches)
+                for batch, batch_hashes in zip(batches, pool.map(hash_files, path_batches)):
+                    for key, file_hash in zip(batch, batch_hashes):
+                        if file_hash is None:
+                            report.failed_files += 1
+                        else:
+                            new_hashes[key] = file_hash
+
+        report.hashed_files = len(new_hashes)
+        self.hash_cache.put(new_hashes)
+        hashes.update(new_hashes)
+        return hashes
+
+    @staticmethod
+    def is_unchanged(path: str, key: FileKey) -> bool:
+        stat = os.stat(path, follow_symlinks=False)
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns) == key
+
+    def link(self, source: str, source_key: FileKey, path: str, key: FileKey) -> bool:
+        # The files may have changed since they were hashed
+        if not self.is_unchanged(source, source_key) or not self.is_unchanged(path, key):
+            return False
+
+        # Link next to the file first and replace it in one step, the file is never missing
+        temporary_path = path + _LINK_SUFFIX
+        os.link(source, temporary_path)
+        try:
+            os.replace(temporary_path, path)
+        except OSError:
+            os.remove(temporary_path)
+            raise
+        return True
+
+    def run(self, dry_run: bool = False) -> DedupeReport:
+        """
+        Find and link the duplicates.
+        :param dry_run: Only count the duplicates and the bytes that would be reclaimed
+        :return: The report
+        """
+        start_time = time.monotonic()
+        report = DedupeReport()
+
+        candidates = self.find_candidates(report)
+        hashes = self.hash_candidates(candidates, report)
+
+        keys_by_hash: Dict[Tuple[int, str], List[FileKey]] = defaultdict(list)
+        for key, file_hash in hashes.items():
+            keys_by_hash[key[0], file_hash].append(key)
+
+        for keys in keys_by_hash.values():
+            if len(keys) < 2:
+                continue
+
+            # Keep the oldest file, links to it are created for all others
+            keys.sort(key=lambda key: key[3])
+            source = candidates[keys[0]][0]
+
+            for key in keys[1:]:
+                paths = candidates[key]
+                report.duplicate_files += len(paths)
+                linked = 0
+                for path in paths:
+                    try:
+                        if dry_run or self.link(source, keys[0], path, key):
+                            linked += 1
+                        else:
+                            report.failed_files += 1
+                    except OSError:
+                        report.failed_files += 1
+                report.linked_files += linked
+
+                # The space is only freed if no other link to the duplicate remains, e.g. outside of the directory
+                if linked == self.link_counts[key]:
+                    report.reclaimed_bytes += key[2]
+
+        report.seconds = time.monotonic() - start_time
+        return report
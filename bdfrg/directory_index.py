@@ -0,0 +1,295 @@
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from bdfrg.id_set import IdSet, write_generated_id_file
+from bdfrg.input_configuration import InputConfiguration
+
+# Bump when the format of the index file changes
+INDEX_VERSION = 1
+
+DEFAULT_FILE_SCHEME = '{REDDITOR}_{TITLE}_{POSTID}'
+DEFAULT_FOLDER_SCHEME = '{SUBREDDIT}'
+
+# Directories modified this close to the scan are listed again on the next update. A change right after the scan
+# can keep the same modification time on file systems with coarse timestamps.
+RACY_MODIFICATION_SECONDS = 2
+
+# Post IDs are lower case base 36, like id_set.CANONICAL_ID_PATTERN. IDs shorter than five digits are only found in
+# the first year of Reddit, requiring five digits keeps the '_<n>' suffix of posts with several files from being
+# taken for the ID.
+_POST_ID_PATTERN = '(?P<id>[1-9a-z][0-9a-z]{4,11})'
+_SCHEME_KEY_PATTERN = re.compile(r'{(\w+)}')
+
+
+def compile_scheme_pattern(scheme: str, separator_allowed: bool) -> Optional[re.Pattern]:
+    """
+    Invert a BDFR naming scheme into a regular expression capturing the post ID.
+    :param scheme: The scheme e.g. '{REDDITOR}_{TITLE}_{POSTID}'
+    :param separator_allowed: If the values of the keys may contain '/' (they never do in file names)
+    :return: The pattern with an 'id' group, None if the scheme does not contain {POSTID}
+    """
+    if '{POSTID}' not in scheme:
+        return None
+
+    # Greedy, so that the last candidate is taken as ID, BDFR keeps the end of file names when shortening them
+    any_value = '.*' if separator_allowed else '[^/]*'
+    parts = []
+    position = 0
+    post_id_seen = False
+    for match in _SCHEME_KEY_PATTERN.finditer(scheme):
+        parts.append(re.escape(scheme[position:match.start()]))
+        # Only the first {POSTID} is captured, repeated ones have to match the same value
+        if match.group(1) == 'POSTID':
+            parts.append('(?P=id)' if post_id_seen else _POST_ID_PATTERN)
+            post_id_seen = True
+        else:
+            parts.append(any_value)
+        position = match.end()
+    parts.append(re.escape(scheme[position:]))
+
+    return re.compile(''.join(parts))
+
+
+class SchemeInverter:
+    """
+    Extracts post IDs from the paths of downloaded files by inverting the file and folder scheme.
+
+    BDFR appends '_<n>' for posts with several files and the extension to the file scheme, when shortening long
+    file names it keeps the ID at the end. If the file scheme has no {POSTID}, the ID is taken from the folder scheme
+    instead, every directory matching it holds the files of one post.
+
+    :param file_scheme: The file scheme of the configuration.
+    :type file_scheme: str
+    :param folder_scheme: The folder scheme of the configuration.
+    :type folder_scheme: str
+    """
+
+    def __init__(self, file_scheme: str = DEFAULT_FILE_SCHEME, folder_scheme: str = DEFAULT_FOLDER_SCHEME):
+        file_pattern = compile_scheme_pattern(file_scheme, False)
+        folder_pattern = compile_scheme_pattern(folder_scheme, True)
+
+        if file_pattern is None and folder_pattern is None:
+            raise Exception('Neither the file nor the folder scheme contain {POSTID}, post IDs can not be extracted')
+
+        self.file_pattern = re.compile(f'{file_pattern.pattern}(?:_\\d+)?(?:\\.\\w+)?') \
+            if file_pattern is not None else None
+        self.folder_pattern = folder_pattern
+
+    def extract_ids(self, relative_directory: str, file_names: List[str]) -> List[str]:
+        """
+        Extract the post IDs of the files of a single directory.
+        :param relative_directory: The directory relative to the download directory, '' for the download directory
+        :param file_names: The names of the files directly in the directory
+        :return: The post IDs, may contain duplicates
+        """
+        if self.file_pattern is not None:
+            fullmatch = self.file_pattern.fullmatch
+            return [match.group('id') for match in map(fullmatch, file_names) if match]
+
+        if file_names:
+            match = self.folder_pattern.fullmatch(relative_directory.replace(os.sep, '/'))
+            if match:
+                return [match.group('id')]
+        return []
+
+
+@dataclass
+class IndexUpdateReport:
+    scanned_directories: int = 0
+    reused_directories: int = 0
+    removed_directories: int = 0
+    id_count: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return f'{self.id_count} post IDs, {self.scanned_directories} directories scanned, ' \
+               f'{self.reused_directories} unchanged, {self.removed_directories} removed in {self.seconds:.1f}s'
+
+
+def get_index_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'directory_index')
+
+
+def _scan_directory(path: str) -> Tuple[int, List[str], List[str]]:
+    # Runs in the worker threads, scandir and stat release the GIL
+    modification_time = os.stat(path).st_mtime_ns
+    directories = []
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.name)
+            elif entry.is_file(follow_symlinks=False):
+                files.append(entry.name)
+    return modification_time, directories, files
+
+
+class DirectoryIndex:
+    """
+    A persistent index of the post IDs downloaded to a directory tree.
+
+    The index stores per directory its modification time, its sub directories and the IDs of its files. On an
+    update only directories whose modification time changed are listed again, unchanged directories cost a single
+    stat. Directories are scanned in parallel by a thread pool.
+
+    :param directory: The download directory.
+    :type directory: str
+    :param file_scheme: The file scheme used to download into the directory.
+    :type file_scheme: str
+    :param folder_scheme: The folder scheme used to download into the directory.
+    :type folder_scheme: str
+    :param index_path: The file the index is stored in, derived from the directory and schemes if not given.
+    :type index_path: str
+    """
+
+    def __init__(self, directory: str, file_scheme: str = DEFAULT_FILE_SCHEME,
+                 folder_scheme: str = DEFAULT_FOLDER_SCHEME, index_path: str = None):
+        self.directory = os.path.abspath(directory)
+        self.file_scheme = file_scheme
+        self.folder_scheme = folder_scheme
+        self.inverter = SchemeInverter(file_scheme, folder_scheme)
+
+        if index_path is None:
+            key = hashlib.sha1(f'{self.directory}\0{file_scheme}\0{folder_scheme}'.encode()).hexdigest()
+            index_path = os.path.join(get_index_directory(), f'{key}.json')
+        self.index_path = index_path
+
+        # Relative directory path -> (modification time or None to list it again, sub directory names, IDs)
+        self.entries: Dict[str, Tuple[Optional[int], List[str], List[str]]] = {}
+
+    @classmethod
+    def for_configuration(cls, input_config: InputConfiguration) -> 'DirectoryIndex':
+        if not input_config.directory:
+            raise Exception('The configuration has no download directory')
+        download_config = input_config.download_config
+        return cls(input_config.directory, download_config.file_scheme or DEFAULT_FILE_SCHEME,
+                   download_config.folder_scheme or DEFAULT_FOLDER_SCHEME)
+
+    def load(self) -> bool:
+        """
+        Load the index stored by a previous update. A missing, outdated or unreadable index is ignored.
+        :return: True if the index was loaded
+        """
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if (index.get('version') != INDEX_VERSION or index.get('directory') != self.directory
+                or index.get('file_scheme') != self.file_scheme or index.get('folder_scheme') != self.folder_scheme):
+            return False
+
+        # IDs are stored space separated, splitting a string is much faster than decoding a JSON list
+        self.entries = {path: (modification_time, directories, ids.split())
+                        for path, (modification_time, directories, ids) in index['entries'].items()}
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+
+        index = {'version': INDEX_VERSION, 'directory': self.directory, 'file_scheme': self.file_scheme,
+                 'folder_scheme': self.folder_scheme,
+                 'entries': {path: (modification_time, directories, ' '.join(ids))
+                             for path, (modification_time, directories, ids) in self.entries.items()}}
+
+        # Write to a temporary file first, so a crash never leaves a partially written index behind
+        temporary_path = f'{self.index_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temporary_path, self.index_path)
+
+    def update(self, max_workers: int = None) -> IndexUpdateReport:
+        """
+        Bring the index up to date with the directory tree.
+        :param max_workers: The number of threads scanning directories, chosen by ThreadPoolExecutor if not given
+        :return: What was scanned
+        """
+        start_time = time.monotonic()
+        report = IndexUpdateReport()
+        old_entries = self.entries
+        entries = {}
+        racy_time = (time.time() - RACY_MODIFICATION_SECONDS) * 1e9
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Future -> (relative path, index entry if only the modification time is checked)
+            pending = {}
+
+            def visit(relative_path: str, known=None):
+                path = os.path.join(self.directory, relative_path)
+                # Unchanged directories are only checked with a stat, their sub directories are taken from the index
+                future = pool.submit(os.stat, path) if known is not None else pool.submit(_scan_directory, path)
+                pending[future] = (relative_path, known)
+
+            def visit_known(relative_path: str):
+                known = old_entries.get(relative_path)
+                visit(relative_path, known if known is not None and known[0] is not None else None)
+
+            visit_known('')
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative_path, known = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except OSError:
+                        # Removed while scanning or not readable
+                        continue
+
+                    if known is None:
+                        modification_time, directories, files = result
+                        report.scanned_directories += 1
+                        entries[relative_path] = (modification_time if modification_time < racy_time else None,
+                                                  directories, self.inverter.extract_ids(relative_path, files))
+                    elif result.st_mtime_ns == known[0]:
+                        report.reused_directories += 1
+                        entries[relative_path] = known
+                        directories = known[1]
+                    else:
+                        # Changed since the last update, list it again
+                        visit(relative_path)
+                        continue
+
+                    for name in directories:
+                        visit_known(os.path.join(relative_path, name))
+
+        report.removed_directories = len(old_entries.keys() - entries.keys())
+        self.entries = entries
+        report.id_count = sum(len(ids) for _, _, ids in entries.values())
+        report.seconds = time.monotonic() - start_time
+        return report
+
+    def get_ids(self) -> IdSet:
+        """
+        Get all post IDs of the index.
+        :return: The IDs, deduplicated
+        """
+        return IdSet(chain.from_iterable(ids for _, _, ids in self.entries.values()))
+
+
+def exclude_indexed_posts(input_config: InputConfiguration, max_workers: int = None) -> InputConfiguration:
+    """
+    Update the index of the download directory of a configuration and exclude all posts found in it.
+    The given configuration is not modified.
+    :param input_config: The configuration to exclude the downloaded posts of
+    :param max_workers: The number of threads scanning directories
+    :return: The configuration with a generated ID file added to --exclude-id-file
+    """
+    index = DirectoryIndex.for_configuration(input_config)
+    index.load()
+    index.update(max_workers)
+    index.save()
+
+    path = write_generated_id_file(index.get_ids(), 'existing')
+    download_config = dataclasses.replace(input_config.download_config,
+                                          exclude_id_file=(input_config.download_config.exclude_id_file or []) + [path])
+    return dataclasses.replace(input_config, download_config=download_config)
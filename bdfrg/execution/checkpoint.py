@@ -0,0 +1,149 @@
+"""
+Checkpoints of running jobs, so that a job interrupted by a crash resumes where it stopped.
+
+While a job runs, the ID of every post BDFR reports as completed is appended to a journal. The journal belongs to
+the configuration and mode of the job. When the same configuration is started again, the journal is folded into a
+generated --exclude-id-file and BDFR skips the completed posts without requesting them again.
+"""
+import dataclasses
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from bdfrg.id_set import CANONICAL_ID_PATTERN, IdSet, write_generated_id_file
+from bdfrg.input_configuration import InputConfiguration, serialize_input_configuration_to_argv
+
+# How often the journal is synced to disk. IDs are handed to the operating system immediately, only those of the
+# last interval can be lost if the whole system crashes.
+SYNC_INTERVAL_SECONDS = 2
+
+# The messages of BDFR for a completed post, written after all of its files (download) or its record (archive). A
+# post whose files were already downloaded for another post is reported as hard linked (--make-hard-links) or, with
+# --no-dupes, as downloaded elsewhere instead. The ID is in the last group of the alternative that matched.
+COMPLETED_PATTERN = re.compile(r'(?:Downloaded submission|Record for entry item|Hard link made .* in submission) '
+                               r'([0-9a-z]+)\b|Resource hash \w+ from submission ([0-9a-z]+) downloaded elsewhere')
+
+
+def get_checkpoint_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'checkpoints')
+
+
+class CheckpointJournal:
+    """
+    An append only file of the IDs of completed posts, one per line.
+
+    sync() is meant to be called every SYNC_INTERVAL_SECONDS by a timer, also while the job prints nothing (e.g.
+    while it downloads a large video), it may be called from another thread than feed().
+
+    :param path: The path of the journal.
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.last_sync_time = 0.0
+        self.unsynced = False
+        # Held while writing and syncing
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_configuration(cls, input_config: InputConfiguration, mode: str = 'download') -> 'CheckpointJournal':
+        """
+        Get the journal of a configuration, the same for every run of an equal configuration.
+        :param input_config: The configuration, without the exclusions added by resume
+        :param mode: The BDFR sub command
+        :return: The journal
+        """
+        argv = serialize_input_configuration_to_argv(input_config)
+        key = hashlib.sha1('\0'.join([mode] + argv).encode('utf-8', 'surrogatepass')).hexdigest()
+        return cls(os.path.join(get_checkpoint_directory(), f'{key}.journal'))
+
+    def load(self) -> IdSet:
+        """
+        Read the IDs completed by previous runs.
+        :return: The IDs, empty if there is no journal
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return IdSet()
+
+        # A line without new line was cut off by a crash
+        lines = data[:data.rfind(b'\n') + 1].decode('ascii', 'replace').split()
+        return IdSet(line for line in lines if CANONICAL_ID_PATTERN.fullmatch(line))
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'a')
+        self.last_sync_time = time.monotonic()
+
+    def feed(self, line: str) -> Optional[str]:
+        """
+        Record the post of a line of BDFR output, if it reports a completed post.
+        :param line: The line
+        :return: The ID of the completed post, None for other lines
+        """
+        match = COMPLETED_PATTERN.search(line)
+        if match is None:
+            return None
+        post_id = match.group(match.lastindex)
+
+        with self.lock:
+            self.file.write(post_id + '\n')
+            # Survives a crash of this process, syncing to disk is left to sync()
+            self.file.flush()
+            self.unsynced = True
+        self.sync()
+        return post_id
+
+    def sync(self, force: bool = False):
+        """
+        Sync the journal to disk, if it has unsynced IDs and the last sync is SYNC_INTERVAL_SECONDS ago.
+        :param force: Sync regardless of the time since the last sync
+        :return: None
+        """
+        with self.lock:
+            if self.file is None or not self.unsynced:
+                return
+            now = time.monotonic()
+            if force or now - self.last_sync_time >= SYNC_INTERVAL_SECONDS:
+                os.fsync(self.file.fileno())
+                self.last_sync_time = now
+                self.unsynced = False
+
+    def close(self):
+        self.sync(force=True)
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def discard(self):
+        """
+        Remove the journal, once the job has completed.
+        :return: None
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def resume_configuration(input_config: InputConfiguration, completed_ids: IdSet) -> InputConfiguration:
+    """
+    Exclude the posts completed by an interrupted run. The given configuration is not modified.
+    :param input_config: The configuration of the run
+    :param completed_ids: The IDs of the journal of the run
+    :return: The configuration with a generated ID file added to --exclude-id-file
+    """
+    path = write_generated_id_file(completed_ids, 'checkpoint')
+    download_config = dataclasses.replace(input_config.download_config,
+                                          exclude_id_file=(input_config.download_config.exclude_id_file or []) + [path])
+    return dataclasses.replace(input_config, download_config=download_config)
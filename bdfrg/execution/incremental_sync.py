@@ -0,0 +1,336 @@
+"""
+Recurring synchronisation of a configuration, where every run only fetches what is new since the previous one.
+
+Every target (subreddit, user or multireddit) is run as a separate BDFR job with sort=new. Per target a high-water
+mark is stored: the newest post ID seen and the time up to which all posts are known to be downloaded. The next run
+gets a limit sized to the posts expected since then, the narrowest time filter covering that period and the most
+recently seen IDs as exclusions. If a run reaches its limit without getting back to the high-water mark, the posts
+in between are still missing, the next run doubles the limit until the gap is closed.
+"""
+import copy
+import dataclasses
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from bdfrg.execution.job_runner import build_command, run_job_to_file
+from bdfrg.execution.multi_job_executor import shard_configuration
+from bdfrg.execution.rate_budget import BudgetLease, RateBudget
+from bdfrg.execution.resource_governor import ResourceTotals
+from bdfrg.id_set import CANONICAL_ID_PATTERN, int_to_base36
+from bdfrg.input_configuration import InputConfiguration, SortType, TimeFilter
+
+# Bump when the format of the state file changes
+STATE_VERSION = 1
+
+# Number of most recent post IDs kept per target and passed as exclusions, covers the overlap with the previous run
+RECENT_ID_COUNT = 1000
+
+# Planned limits are the expected number of new posts times this factor plus OVERLAP_POSTS, at least MIN_LIMIT
+LIMIT_SAFETY_FACTOR = 1.5
+OVERLAP_POSTS = 10
+MIN_LIMIT = 25
+
+# Limit of the second sync of a target, before a post rate is known. One page of a Reddit listing.
+INITIAL_LIMIT = 100
+
+# Added to the time since the last sync when choosing the time filter, e.g. for posts delayed by moderation
+TIME_FILTER_MARGIN_SECONDS = 3600
+
+# The time filters by the period they cover, narrowest first
+TIME_FILTER_SPANS = ((TimeFilter.HOUR, 3600), (TimeFilter.DAY, 24 * 3600), (TimeFilter.WEEK, 7 * 24 * 3600),
+                     (TimeFilter.MONTH, 28 * 24 * 3600), (TimeFilter.YEAR, 365 * 24 * 3600))
+
+# Submission IDs in the messages of BDFR's log file, e.g. 'Downloaded submission abc12' or 'Object abc12 in exclusion
+# list, skipping'. The log file is read instead of the output, as it contains the debug messages.
+SUBMISSION_ID_PATTERN = re.compile(rb'\b(?:[Ss]ubmission|Object) ([0-9a-z]{5,12})\b')
+
+
+def id_to_int(post_id: str) -> int:
+    # Reddit IDs are base 36 numbers assigned in increasing order, a higher number is a newer post
+    return int(post_id, 36)
+
+
+@dataclass
+class TargetState:
+    # The newest post ID seen before the first unclosed gap
+    newest_id: Optional[str] = None
+    # Time of the start of the last run that reached the high-water mark, all posts before are downloaded
+    covered_at: Optional[float] = None
+    # Estimated number of new posts per second
+    post_rate: Optional[float] = None
+    last_limit: Optional[int] = None
+    # The last run reached its limit before the high-water mark
+    gap: bool = False
+    recent_ids: List[str] = field(default_factory=list)
+
+
+def get_sync_state_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'sync')
+
+
+def get_target_key(target_config: InputConfiguration) -> str:
+    """
+    Get the key of the state of a target.
+    :param target_config: A configuration with a single target, see split_targets
+    :return: e.g. 'subreddit:pics', 'user:spez' or 'multireddit:spez/pictures'
+    """
+    if target_config.multireddit:
+        return f'multireddit:{",".join(target_config.user or [])}/{target_config.multireddit[0]}'
+    if target_config.subreddit:
+        return f'subreddit:{target_config.subreddit[0].lower()}'
+    return f'user:{target_config.user[0].lower()}'
+
+
+def split_targets(input_config: InputConfiguration) -> List[Tuple[str, InputConfiguration]]:
+    """
+    Split a configuration into one configuration per target. Links and ID files have no listing to sync, they are
+    left out.
+    :param input_config: The configuration
+    :return: The (key, configuration) of every target
+    """
+    target_count = sum(len(getattr(input_config, field_name) or [])
+                       for field_name in ('subreddit', 'multireddit') + (() if input_config.multireddit else ('user',)))
+    if not target_count:
+        raise Exception('The configuration has no subreddit, user or multireddit to sync')
+    listing_config = dataclasses.replace(input_config, link=None, include_id_file=None)
+    return [(get_target_key(shard), shard) for shard in shard_configuration(listing_config, target_count)]
+
+
+def choose_time_filter(seconds: float) -> TimeFilter:
+    for time_filter, span in TIME_FILTER_SPANS:
+        if seconds <= span:
+            return time_filter
+    return TimeFilter.ALL
+
+
+def plan_target(target_config: InputConfiguration, state: Optional[TargetState], now: float) -> InputConfiguration:
+    """
+    Narrow the configuration of a target to the posts expected since its last sync.
+    The configured limit is an upper bound, the first sync of a target runs with the configuration as it is.
+    Reddit only applies the time filter to the top and controversial listings, for the new listing the limit and
+    the exclusions do the narrowing.
+    :param target_config: The configuration of the target
+    :param state: The state of the target, None if it was never synced
+    :param now: The current time
+    :return: The configuration to run
+    """
+    planned = copy.copy(target_config)
+    planned.sort = SortType.NEW
+    if state is None or state.covered_at is None:
+        return planned
+
+    elapsed = max(0.0, now - state.covered_at)
+    planned.time = choose_time_filter(elapsed + TIME_FILTER_MARGIN_SECONDS)
+
+    if state.post_rate is not None:
+        limit = max(MIN_LIMIT, math.ceil(state.post_rate * elapsed * LIMIT_SAFETY_FACTOR) + OVERLAP_POSTS)
+    else:
+        limit = INITIAL_LIMIT
+    if state.gap and state.last_limit:
+        limit = max(limit, state.last_limit * 2)
+    planned.limit = min(limit, target_config.limit) if target_config.limit else limit
+
+    if state.recent_ids:
+        exclude_id = (target_config.download_config.exclude_id or []) + state.recent_ids
+        planned.download_config = dataclasses.replace(target_config.download_config, exclude_id=exclude_id)
+    return planned
+
+
+def update_target_state(state: Optional[TargetState], seen_ids: List[str], started_at: float,
+                        limit: Optional[int]) -> TargetState:
+    """
+    Record a finished run of a target.
+    :param state: The state before the run, None for the first run
+    :param seen_ids: The IDs of all posts the run processed, including skipped ones
+    :param started_at: The time the run started
+    :param limit: The limit the run was started with, None if it had none
+    :return: The new state
+    """
+    state = copy.deepcopy(state) if state is not None else TargetState()
+    seen_numbers = sorted({id_to_int(post_id) for post_id in seen_ids}, reverse=True)
+    newest_number = id_to_int(state.newest_id) if state.newest_id else None
+
+    # The run got back to the high-water mark unless all posts it saw are newer and it stopped because of the limit
+    reached_limit = limit is not None and len(seen_numbers) >= limit
+    gap = newest_number is not None and reached_limit and seen_numbers[-1] > newest_number
+
+    if not gap:
+        new_count = sum(1 for number in seen_numbers if newest_number is None or number > newest_number)
+        if state.covered_at is not None and started_at > state.covered_at:
+            post_rate = new_count / (started_at - state.covered_at)
+            # Smoothed, a single quiet or busy period does not decide the next limit
+            state.post_rate = post_rate if state.post_rate is None else (state.post_rate + post_rate) / 2
+        if seen_numbers and (newest_number is None or seen_numbers[0] > newest_number):
+            state.newest_id = int_to_base36(seen_numbers[0])
+        state.covered_at = started_at
+
+    state.gap = gap
+    state.last_limit = limit
+    recent_numbers = sorted(set(seen_numbers) | {id_to_int(post_id) for post_id in state.recent_ids}, reverse=True)
+    state.recent_ids = [int_to_base36(number) for number in recent_numbers[:RECENT_ID_COUNT]]
+    return state
+
+
+def read_seen_ids(log_path: str) -> List[str]:
+    """
+    Read the IDs of the posts a run processed from its BDFR log file.
+    :param log_path: The log file
+    :return: The IDs, may contain duplicates
+    """
+    try:
+        with open(log_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    return [post_id.decode() for post_id in SUBMISSION_ID_PATTERN.findall(data)
+            if CANONICAL_ID_PATTERN.fullmatch(post_id.decode())]
+
+
+@dataclass
+class SyncJob:
+    key: str
+    input_config: InputConfiguration
+    command: List[str]
+    log_path: str
+
+
+@dataclass
+class SyncResult:
+    key: str
+    return_code: int
+    seen_posts: int
+    gap: bool
+    duration: float
+    resources: ResourceTotals = None
+
+
+@dataclass
+class SyncReport:
+    results: List[SyncResult]
+    duration: float
+
+    def summary(self) -> str:
+        lines = [f'{result.key}: exit code {result.return_code}, {result.seen_posts} posts in {result.duration:.1f}s'
+                 + (', limit reached before the last sync, continued next run' if result.gap else '')
+                 + (f', {result.resources.summary()}' if result.resources is not None else '')
+                 for result in self.results]
+        failed = sum(1 for result in self.results if result.return_code != 0)
+        lines.append(f'{len(self.results) - failed}/{len(self.results)} targets synced in {self.duration:.1f}s')
+        return '\n'.join(lines)
+
+
+class IncrementalSync:
+    """
+    Runs the targets of a configuration incrementally, see the module documentation.
+
+    The state of all targets is stored in one file per download directory and mode. Only targets whose job exits
+    successfully update their state, a failed run is repeated with the same plan.
+
+    :param input_config: The configuration to sync.
+    :type input_config: InputConfiguration
+    :param mode: The BDFR sub command to run.
+    :type mode: str
+    :param executable: The name or path of the BDFR executable.
+    :type executable: str
+    :param state_path: The state file, derived from the download directory and mode if not given.
+    :type state_path: str
+    :param log_directory: Where the log files of the jobs are written, next to the state file if not given.
+    :type log_directory: str
+    :param budget: The API budget shared with other jobs, targets are started when it leaves room for them.
+    :type budget: RateBudget
+    """
+
+    def __init__(self, input_config: InputConfiguration, mode: str = 'download', executable: str = 'bdfr',
+                 state_path: str = None, log_directory: str = None, budget: RateBudget = None):
+        self.input_config = input_config
+        self.mode = mode
+        self.executable = executable
+
+        if state_path is None:
+            directory = os.path.abspath(input_config.directory or '.')
+            key = hashlib.sha1(f'{directory}\0{mode}'.encode()).hexdigest()
+            state_path = os.path.join(get_sync_state_directory(), f'{key}.json')
+        self.state_path = state_path
+        self.log_directory = log_directory or f'{os.path.splitext(state_path)[0]}-logs'
+        self.budget = budget
+        self.states: Dict[str, TargetState] = {}
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('version') == STATE_VERSION:
+            self.states = {key: TargetState(**values) for key, values in state['targets'].items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        state = {'version': STATE_VERSION,
+                 'targets': {key: dataclasses.asdict(target_state) for key, target_state in self.states.items()}}
+
+        # Write to a temporary file first, so a crash never leaves a partially written state behind
+        temporary_path = f'{self.state_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary_path, self.state_path)
+
+    def plan(self, now: float = None) -> List[SyncJob]:
+        """
+        Plan the jobs of the next sync.
+        :param now: The time the sync starts, the current time if not given
+        :return: One job per target
+        """
+        now = time.time() if now is None else now
+        jobs = []
+        for index, (key, target_config) in enumerate(split_targets(self.input_config)):
+            planned = plan_target(target_config, self.states.get(key), now)
+            # The debug messages of the log file tell which posts were processed
+            file_name = re.sub(r'[^\w.-]', '_', key)
+            planned.log = os.path.join(self.log_directory, f'{index}-{file_name}.log')
+            jobs.append(SyncJob(key, planned, build_command(planned, self.mode, self.executable), planned.log))
+        return jobs
+
+    def run_job(self, job: SyncJob) -> SyncResult:
+        os.makedirs(self.log_directory, exist_ok=True)
+        # BDFR appends to its log file, every run starts with an empty one
+        if os.path.exists(job.log_path):
+            os.remove(job.log_path)
+
+        lease = BudgetLease(self.budget, job.key, self.mode) if self.budget is not None else None
+        started_at = time.time()
+        return_code, resources = run_job_to_file(job.command, f'{job.log_path}.out', lease,
+                                                 job.input_config.resource_config)
+
+        seen_ids = read_seen_ids(job.log_path)
+        gap = False
+        if return_code == 0:
+            state = update_target_state(self.states.get(job.key), seen_ids, started_at, job.input_config.limit)
+            self.states[job.key] = state
+            gap = state.gap
+        return SyncResult(job.key, return_code, len(set(seen_ids)), gap, time.time() - started_at, resources)
+
+    def run(self, max_concurrency: int = 1) -> SyncReport:
+        """
+        Load the state, run all targets and save the state.
+        :param max_concurrency: The number of BDFR processes running at the same time
+        :return: The report
+        """
+        start = time.monotonic()
+        self.load()
+        jobs = self.plan()
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                results = list(pool.map(self.run_job, jobs))
+        finally:
+            # Targets finished before an interruption keep their progress
+            self.save()
+        return SyncReport(results, time.monotonic() - start)
@@ -0,0 +1,286 @@
+"""
+Batch command generation from a job manifest.
+
+A manifest is a CSV or JSON Lines file with one job per row. Each job is a partial configuration applied on top of a
+base configuration, plus an optional name and BDFR mode. Everything is a generator: the manifest is read, validated
+and turned into commands one job at a time, so manifests with thousands of jobs never have to fit in memory.
+
+JSON Lines: one JSON object per line, in the format of type_utils.dataclass_to_dict, e.g.
+    {"name": "pics", "mode": "archive", "subreddit": ["pics"], "archiver_config": {"format": "XML"}}
+CSV: a header row of field names, nested fields as "download_config.no_dupes", list items separated by ";", e.g.
+    name,subreddit,limit,download_config.no_dupes
+    pics,pics;funny,100,true
+Empty lines, lines starting with "#" and empty CSV cells are ignored.
+"""
+import copy
+import csv
+import dataclasses
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from bdfrg import type_utils
+from bdfrg.execution.job_runner import build_command
+from bdfrg.id_set import consolidate_id_options
+from bdfrg.input_configuration import InputConfiguration, argv_to_string, validate_input_configuration
+
+# Keys of a manifest entry that are not configuration fields
+NAME_KEY = 'name'
+MODE_KEY = 'mode'
+
+# Separates the items of list fields in CSV cells
+CSV_LIST_SEPARATOR = ';'
+
+CSV_TRUE_VALUES = {'true', '1', 'yes'}
+CSV_FALSE_VALUES = {'false', '0', 'no'}
+
+# (line number, values or None, error or None) as produced by the manifest readers
+ManifestEntry = Tuple[int, Optional[dict], Optional[str]]
+
+
+@dataclass
+class ManifestJob:
+    line_number: int
+    # The name given in the manifest, if any
+    name: Optional[str]
+    mode: str
+    # The command, None if the job is invalid
+    argv: Optional[List[str]] = None
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.problems
+
+    @property
+    def label(self) -> str:
+        return f'{self.name} (line {self.line_number})' if self.name else f'line {self.line_number}'
+
+
+@dataclass
+class ManifestReport:
+    job_count: int = 0
+    invalid_count: int = 0
+
+    def summary(self) -> str:
+        return f'{self.job_count} jobs, {self.job_count - self.invalid_count} valid, {self.invalid_count} invalid'
+
+
+def _is_skipped_line(line: str) -> bool:
+    stripped = line.strip()
+    return not stripped or stripped.startswith('#')
+
+
+def read_json_lines_manifest(lines: Iterable[str]) -> Iterator[ManifestEntry]:
+    """
+    Read the entries of a JSON Lines manifest.
+    :param lines: The lines of the manifest, e.g. an open file
+    :return: A generator of (line number, values, error) tuples
+    """
+    for line_number, line in enumerate(lines, 1):
+        if _is_skipped_line(line):
+            continue
+        try:
+            values = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+
+        if isinstance(values, dict):
+            yield line_number, values, None
+        else:
+            yield line_number, None, 'Expected a JSON object'
+
+
+def _get_csv_column_types(columns: List[str]) -> Dict[str, type]:
+    # Resolve the type of every column once per manifest instead of once per cell
+    column_types = {}
+
+    for column in columns:
+        if column in (NAME_KEY, MODE_KEY):
+            column_types[column] = str
+            continue
+
+        configuration_class = InputConfiguration
+        *parents, field_name = column.split('.')
+        for parent in parents:
+            configuration_class = type_utils.get_field_types_of_dataclass(configuration_class).get(parent)
+            if not dataclasses.is_dataclass(configuration_class):
+                raise Exception(f'Unknown manifest column {column}')
+
+        field_type = type_utils.get_field_types_of_dataclass(configuration_class).get(field_name)
+        if field_type is None or dataclasses.is_dataclass(field_type):
+            raise Exception(f'Unknown manifest column {column}')
+        column_types[column] = field_type
+
+    return column_types
+
+
+def _convert_csv_value(field_type: type, value: str):
+    if field_type == List[str]:
+        return [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+    if field_type == bool:
+        if value.lower() not in CSV_TRUE_VALUES | CSV_FALSE_VALUES:
+            raise ValueError(f'expected true or false, got {value!r}')
+        return value.lower() in CSV_TRUE_VALUES
+    if field_type in (int, float):
+        return type_utils.convert_str_to_type(value, field_type)
+    # Strings, and enums which are given by name like in JSON
+    return value
+
+
+def _read_csv_rows(reader, rows: Iterator[List[str]], columns: List[str],
+                   column_types: Dict[str, type]) -> Iterator[ManifestEntry]:
+    for row in rows:
+        # The reader counts physical lines, so this is the last line of the row if a quoted cell has new lines
+        line_number = reader.line_num
+        if len(row) > len(columns):
+            yield line_number, None, f'Expected at most {len(columns)} cells, got {len(row)}'
+            continue
+
+        values = {}
+        try:
+            for column, cell in zip(columns, row):
+                cell = cell.strip()
+                if not cell:
+                    continue
+                *parents, field_name = column.split('.')
+                target = values
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[field_name] = _convert_csv_value(column_types[column], cell)
+        except ValueError as e:
+            yield line_number, None, f'Invalid value in column {column}: {e}'
+            continue
+
+        yield line_number, values, None
+
+
+def read_csv_manifest(lines: Iterable[str]) -> Iterator[ManifestEntry]:
+    """
+    Read the entries of a CSV manifest. The header row is read and checked right away, unknown columns raise before
+    any entry is returned.
+    :param lines: The lines of the manifest, e.g. an open file
+    :return: A generator of (line number, values, error) tuples
+    """
+    reader = csv.reader(lines)
+    rows = (row for row in reader if any(cell.strip() for cell in row) and not row[0].lstrip().startswith('#'))
+
+    columns = [column.strip() for column in next(rows, [])]
+    column_types = _get_csv_column_types(columns)
+
+    return _read_csv_rows(reader, rows, columns, column_types)
+
+
+def read_manifest(file: TextIO, manifest_format: str = None) -> Iterator[ManifestEntry]:
+    """
+    Read the entries of a manifest file, the format is taken from the file name if not given.
+    :param file: The open manifest file
+    :param manifest_format: 'csv' or 'jsonl'
+    :return: A generator of (line number, values, error) tuples
+    """
+    if manifest_format is None:
+        manifest_format = 'csv' if getattr(file, 'name', '').lower().endswith('.csv') else 'jsonl'
+
+    if manifest_format == 'csv':
+        return read_csv_manifest(file)
+    if manifest_format == 'jsonl':
+        return read_json_lines_manifest(file)
+    raise Exception(f'Unknown manifest format {manifest_format}, expected csv or jsonl')
+
+
+def _copy_configuration(input_config: InputConfiguration) -> InputConfiguration:
+    # Shallow copies are enough, applying the overrides replaces values instead of modifying them.
+    # Large lists of the base configuration are shared by all jobs instead of being copied per job.
+    download_config = input_config.download_config
+    archiver_config = input_config.archiver_config
+    resource_config = input_config.resource_config
+    input_config = copy.copy(input_config)
+    input_config.download_config = copy.copy(download_config)
+    input_config.archiver_config = copy.copy(archiver_config)
+    input_config.resource_config = copy.copy(resource_config)
+    return input_config
+
+
+def generate_jobs(entries: Iterable[ManifestEntry], base_config: InputConfiguration = None, mode: str = 'download',
+                  executable: str = 'bdfr') -> Iterator[ManifestJob]:
+    """
+    Build and validate the command of every manifest entry.
+    :param entries: The manifest entries, see read_manifest
+    :param base_config: The configuration the entries are applied to, the default configuration if not given
+    :param mode: The BDFR mode of entries without a mode
+    :param executable: The name or path of the BDFR executable
+    :return: A generator of jobs, in manifest order
+    """
+    # Merge the ID lists of the base configuration once, instead of once per job
+    base_config = consolidate_id_options(base_config if base_config is not None else InputConfiguration())
+
+    for line_number, values, error in entries:
+        if error is not None:
+            yield ManifestJob(line_number, None, mode, problems=[error])
+            continue
+
+        values = dict(values)
+        name = values.pop(NAME_KEY, None)
+        job = ManifestJob(line_number, str(name) if name else None, str(values.pop(MODE_KEY, None) or mode))
+
+        try:
+            input_config = type_utils.dataclass_from_dict(InputConfiguration, values, _copy_configuration(base_config))
+        except Exception as e:
+            job.problems.append(f'Invalid configuration: {e}')
+            yield job
+            continue
+
+        job.problems.extend(validate_input_configuration(input_config, job.mode))
+        if job.is_valid:
+            job.argv = build_command(input_config, job.mode, executable)
+
+        yield job
+
+
+def _to_comment(text: str) -> str:
+    # Names and problems come from the manifest, a new line in them must not end the comment
+    return '# ' + ' '.join(text.split())
+
+
+def generate_script_lines(jobs: Iterable[ManifestJob], report: ManifestReport = None) -> Iterator[str]:
+    """
+    Turn jobs into the lines of a POSIX shell script running them one after another. Invalid jobs are listed as
+    comments. A failing job does not stop the script, the script prints the number of failed jobs and exits with 1
+    if any failed.
+    :param jobs: The jobs, see generate_jobs
+    :param report: Counts the jobs while the lines are generated, if given
+    :return: A generator of lines, without line endings
+    """
+    yield '#!/bin/sh'
+    yield 'failed=0'
+
+    for job in jobs:
+        if report is not None:
+            report.job_count += 1
+        if not job.is_valid:
+            if report is not None:
+                report.invalid_count += 1
+            yield _to_comment(f'Skipped {job.label}: {"; ".join(job.problems)}')
+            continue
+
+        yield _to_comment(job.label)
+        yield f'{argv_to_string(job.argv)} || failed=$((failed + 1))'
+
+    # An exit status is taken modulo 256, the count itself would report success for 256 failed jobs
+    yield 'if [ "$failed" -gt 0 ]; then echo "$failed job(s) failed" >&2; fi'
+    yield 'exit $(( failed > 0 ))'
+
+
+def generate_json_lines(jobs: Iterable[ManifestJob], report: ManifestReport = None) -> Iterator[str]:
+    """
+    Turn jobs into JSON Lines, one {"name", "line", "argv", "problems"} object per job.
+    :param jobs: The jobs, see generate_jobs
+    :param report: Counts the jobs while the lines are generated, if given
+    :return: A generator of lines, without line endings
+    """
+    for job in jobs:
+        if report is not None:
+            report.job_count += 1
+            report.invalid_count += not job.is_valid
+        yield json.dumps({'name': job.name, 'line': job.line_number, 'argv': job.argv, 'problems': job.problems})
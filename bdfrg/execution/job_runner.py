@@ -0,0 +1,181 @@
+import queue
+import subprocess
+import threading
+from enum import Enum
+from typing import Callable, List, Optional, Tuple
+
+from bdfrg.execution.rate_budget import BudgetLease
+from bdfrg.execution.resource_governor import ResourceMonitor, ResourceTotals, apply_resource_limits
+from bdfrg.id_set import consolidate_id_options
+from bdfrg.input_configuration import InputConfiguration, ResourceConfiguration, serialize_input_configuration_to_argv
+
+
+class OutputStream(Enum):
+    STDOUT = 'stdout'
+    STDERR = 'stderr'
+
+
+def build_command(input_config: InputConfiguration, mode: str = 'download', executable: str = 'bdfr') -> List[str]:
+    """
+    Build the argument list used to launch BDFR for the given configuration.
+    Large ID lists and multiple ID files are merged into generated ID files first.
+    :param input_config: The configuration to serialize
+    :param mode: The BDFR sub command to run (download, archive or clone)
+    :param executable: The name or path of the BDFR executable
+    :return: The argument list e.g. ['bdfr', 'download', '--subreddit', 'pics']
+    """
+    return [executable, mode] + serialize_input_configuration_to_argv(consolidate_id_options(input_config), mode)
+
+
+class JobRunner:
+    """
+    Runs a single BDFR process and streams its output through a queue, so that a GUI can consume it without blocking.
+
+    Every line written to stdout or stderr is read by a background thread and put into the output queue as a
+    (OutputStream, line) tuple. The consumer is expected to call drain() periodically (e.g. from a Tk after callback).
+
+    :param command: The argument list of the process to start
+    :type command: List[str]
+    :param resource_config: The limits applied to the process, its usage is sampled by resource_monitor
+    :type resource_config: ResourceConfiguration
+    """
+
+    def __init__(self, command: List[str], resource_config: ResourceConfiguration = None):
+        self.command = command
+        self.resource_config = resource_config
+        self.process: Optional[subprocess.Popen] = None
+        self.resource_monitor: Optional[ResourceMonitor] = None
+        self.output_queue = queue.SimpleQueue()
+        self.reader_threads: List[threading.Thread] = []
+
+    def start(self):
+        """
+        Start the process and the reader threads for its stdout and stderr.
+        :return: None
+        """
+        if self.process is not None:
+            raise Exception('Job has already been started')
+
+        # Line buffered text mode, undecodable bytes are replaced so a single bad line can't kill the reader
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        stdin=subprocess.DEVNULL, text=True, bufsize=1, errors='replace')
+        # Shown before the output of the process, which can only start once the reader threads run
+        for warning in apply_resource_limits(self.process.pid, self.resource_config):
+            self.output_queue.put((OutputStream.STDERR, f'{warning}\n'))
+        self.resource_monitor = ResourceMonitor(self.process.pid)
+        self.resource_monitor.start()
+
+        for stream, pipe in ((OutputStream.STDOUT, self.process.stdout), (OutputStream.STDERR, self.process.stderr)):
+            thread = threading.Thread(target=self._read_pipe, args=(stream, pipe), daemon=True)
+            thread.start()
+            self.reader_threads.append(thread)
+
+    def _read_pipe(self, stream: OutputStream, pipe):
+        """
+        Read lines from the given pipe until it is closed and put them into the output queue.
+        :param stream: The stream the pipe belongs to
+        :param pipe: The pipe to read from
+        :return: None
+        """
+        with pipe:
+            for line in pipe:
+                self.output_queue.put((stream, line))
+
+    def drain(self, max_lines: int = 1000) -> List[Tuple[OutputStream, str]]:
+        """
+        Take up to max_lines lines out of the output queue without blocking.
+        :param max_lines: The maximum number of lines to return
+        :return: A list of (OutputStream, line) tuples, empty if no output is pending
+        """
+        lines = []
+        try:
+            while len(lines) < max_lines:
+                lines.append(self.output_queue.get_nowait())
+        except queue.Empty:
+            pass
+        return lines
+
+    def is_running(self) -> bool:
+        """
+        Check if the process is still running.
+        :return: True if the process has been started and has not exited yet
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def is_finished(self) -> bool:
+        """
+        Check if the process has exited and all of its output has been drained.
+        :return: True if there is nothing left to do or read for this job
+        """
+        if self.process is None or self.process.poll() is None:
+            return False
+        return not any(thread.is_alive() for thread in self.reader_threads) and self.output_queue.empty()
+
+    @property
+    def return_code(self) -> Optional[int]:
+        """
+        The exit code of the process, None if it is still running or has not been started.
+        """
+        return None if self.process is None else self.process.poll()
+
+    def stop(self):
+        """
+        Terminate the process if it is still running.
+        :return: None
+        """
+        if self.is_running():
+            self.process.terminate()
+
+
+def run_process(command: List[str], on_line: Callable[[str], None],
+                resource_config: ResourceConfiguration = None) -> Tuple[int, ResourceMonitor]:
+    """
+    Run a BDFR process to completion, its resource usage is sampled while it runs.
+    :param command: The argument list of the process
+    :param on_line: Called with every line of the console output (stdout and stderr) and of the warnings about
+        resource limits that could not be applied, in the calling thread
+    :param resource_config: The limits applied to the process
+    :return: The exit code and the monitor of the process, stopped and holding the totals
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                               text=True, bufsize=1, errors='replace')
+    resource_monitor = ResourceMonitor(process.pid)
+    with process:
+        try:
+            for warning in apply_resource_limits(process.pid, resource_config):
+                on_line(f'{warning}\n')
+            resource_monitor.start()
+            for line in process.stdout:
+                on_line(line)
+        finally:
+            resource_monitor.stop()
+        # The counters of the exited process are readable until it is waited for
+        resource_monitor.sample()
+    return process.returncode, resource_monitor
+
+
+def run_job_to_file(command: List[str], output_path: str, lease: BudgetLease = None,
+                    resource_config: ResourceConfiguration = None) -> Tuple[int, ResourceTotals]:
+    """
+    Run a BDFR process to completion, its console output is written to a file.
+    :param command: The argument list of the process
+    :param output_path: The file the output is written to
+    :param lease: The registration of the job with the API budget, the process is started once the budget leaves room
+        for it
+    :param resource_config: The limits applied to the process
+    :return: The exit code and the resources used by the process
+    """
+    try:
+        if lease is not None:
+            lease.wait()
+        with open(output_path, 'w') as output:
+            def on_line(line: str):
+                output.write(line)
+                if lease is not None:
+                    lease.feed(line)
+
+            return_code, resource_monitor = run_process(command, on_line, resource_config)
+        return return_code, resource_monitor.totals
+    finally:
+        if lease is not None:
+            lease.release()
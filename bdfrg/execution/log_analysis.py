@@ -0,0 +1,304 @@
+"""
+Aggregates the log files BDFR writes with --log into per domain and per downloader module statistics.
+
+Log files of long runs reach several GB. They are memory mapped and searched with a single regular expression, only
+the lines relevant to the statistics are decoded. Large files are split into chunks on line boundaries that are
+analyzed in parallel processes.
+"""
+import calendar
+import dataclasses
+import mmap
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from bdfrg.input_configuration import InputConfiguration
+
+# Files smaller than this are analyzed in the calling process, starting worker processes costs more
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# Domains and modules are only suggested for exclusion after this many attempts
+MIN_ATTEMPTS = 20
+
+# Domains and modules succeeding for at most this share of their attempts are suggested for exclusion
+MAX_SUCCESS_RATE = 0.1
+
+# The messages of BDFR's downloader, the last group of every alternative identifies it (see analyze_chunk).
+# Anchored to the start of the line, after the '[time - logger - level] - ' prefix, so that other lines are rejected
+# after a few bytes. Hosts are captured without 'www.', BDFR matches --skip-domain as part of the URL.
+LOG_PATTERN = re.compile(rb'''
+    ^\[[^\]\n]*\]\ -\ (?:
+    Using\ (\w+)\ with\ url\ \w+://(?:www\.)?([^/\s:?\#]+)
+    |Downloaded\ submission\ (\w+)
+    |Site\ \w+\ failed\ to\ download\ submission\ (\w+)
+    |Failed\ to\ download\ resource\ \S+\ in\ submission\ (\w+)
+    |Submission\ \w+\ skipped\ due\ to\ disabled\ module\ (\w+)
+    |Error\ occur+ed\ downloading\ from\ \S+,\ waiting\ (\d+)\ seconds
+    |(Max\ wait\ time\ exceeded))
+''', re.VERBOSE | re.MULTILINE)
+
+_STARTED = 2
+_SUCCEEDED = 3
+_FAILED = (4, 5)
+_SKIPPED = 6
+_RETRIED = 7
+_TIMED_OUT = 8
+
+
+@dataclass
+class SourceStats:
+    attempts: int = 0
+    successes: int = 0
+    failures: int = 0
+    # Resources that exceeded the max wait time, and retries after an error
+    timeouts: int = 0
+    retries: int = 0
+    # Time from starting a submission until it succeeded or failed
+    seconds: float = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+    def merge(self, other: 'SourceStats'):
+        self.attempts += other.attempts
+        self.successes += other.successes
+        self.failures += other.failures
+        self.timeouts += other.timeouts
+        self.retries += other.retries
+        self.seconds += other.seconds
+
+
+@dataclass
+class LogAnalysis:
+    domains: Dict[str, SourceStats] = field(default_factory=dict)
+    modules: Dict[str, SourceStats] = field(default_factory=dict)
+    # Submissions without a result, e.g. at the end of an interrupted run
+    unfinished: int = 0
+    analyzed_bytes: int = 0
+    seconds: float = 0.0
+
+    def merge(self, other: 'LogAnalysis'):
+        for own, others in ((self.domains, other.domains), (self.modules, other.modules)):
+            for name, stats in others.items():
+                own.setdefault(name, SourceStats()).merge(stats)
+        self.unfinished += other.unfinished
+        self.analyzed_bytes += other.analyzed_bytes
+
+    def summary(self) -> str:
+        attempts = sum(stats.attempts for stats in self.modules.values())
+        successes = sum(stats.successes for stats in self.modules.values())
+        return f'{attempts} submissions ({successes} succeeded, {self.unfinished} unfinished) on ' \
+               f'{len(self.domains)} domains with {len(self.modules)} modules, ' \
+               f'{self.analyzed_bytes / 1e6:.1f} MB analyzed in {self.seconds:.1f}s'
+
+
+@dataclass
+class ExclusionSuggestion:
+    skip_domain: List[str] = field(default_factory=list)
+    disable_module: List[str] = field(default_factory=list)
+    # Time spent on the suggested domains and modules, saved by excluding them
+    seconds: float = 0.0
+
+    def to_arguments(self) -> List[str]:
+        return [argument for domain in self.skip_domain for argument in ('--skip-domain', domain)] + \
+               [argument for module in self.disable_module for argument in ('--disable-module', module)]
+
+
+class _TimestampParser:
+    # Parses the default asctime of the logging module ('2021-05-02 12:34:56,789'), strptime is too slow for every
+    # line. The start of every day is computed once.
+
+    def __init__(self):
+        self.days: Dict[bytes, int] = {}
+
+    def parse(self, line_start: bytes) -> Optional[float]:
+        # line_start: '[2021-05-02 12:34:56,789 - ...'
+        try:
+            day = line_start[1:11]
+            day_start = self.days.get(day)
+            if day_start is None:
+                day_start = self.days[day] = calendar.timegm(time.strptime(day.decode(), '%Y-%m-%d'))
+            return day_start + int(line_start[12:14]) * 3600 + int(line_start[15:17]) * 60 + \
+                int(line_start[18:20]) + int(line_start[21:24]) / 1000
+        except ValueError:
+            return None
+
+
+def analyze_chunk(path: str, start: int, end: int) -> LogAnalysis:
+    """
+    Analyze the submissions started in a part of a log file.
+    A submission belongs to the chunk its 'Using ... with url' line is in, the lines before the first one belong to
+    the previous chunk. The search continues after the end of the chunk until its last submission is finished.
+    :param path: The log file
+    :param start: The offset of the first line of the chunk
+    :param end: The offset of the first line after the chunk
+    :return: The analysis of the chunk
+    """
+    analysis = LogAnalysis(analyzed_bytes=end - start)
+    timestamps = _TimestampParser()
+    domains = analysis.domains
+    modules = analysis.modules
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return analysis
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # The stats and start time of the current submission, None before the first or after its result
+            current: Optional[Tuple[SourceStats, SourceStats, Optional[float]]] = None
+
+            def get_time(line_start: int) -> Optional[float]:
+                return timestamps.parse(data[line_start:line_start + 24])
+
+            def finish(position: int, succeeded: bool):
+                domain_stats, module_stats, start_time = current
+                end_time = get_time(position)
+                seconds = end_time - start_time if start_time is not None and end_time is not None else 0.0
+                for stats in (domain_stats, module_stats):
+                    if succeeded:
+                        stats.successes += 1
+                    else:
+                        stats.failures += 1
+                    stats.seconds += seconds
+
+            for match in LOG_PATTERN.finditer(data, start):
+                event = match.lastindex
+
+                if event == _STARTED:
+                    if match.start() >= end:
+                        break
+                    if current is not None:
+                        analysis.unfinished += 1
+                    module = match.group(1).decode()
+                    domain = match.group(2).decode().lower()
+                    domain_stats = domains.get(domain) or domains.setdefault(domain, SourceStats())
+                    module_stats = modules.get(module) or modules.setdefault(module, SourceStats())
+                    domain_stats.attempts += 1
+                    module_stats.attempts += 1
+                    current = (domain_stats, module_stats, get_time(match.start()))
+                    continue
+
+                # Lines before the first submission of the chunk belong to the previous chunk
+                if current is None:
+                    if match.start() >= end:
+                        break
+                    continue
+
+                if event == _SUCCEEDED or event in _FAILED:
+                    finish(match.start(), event == _SUCCEEDED)
+                    current = None
+                elif event == _SKIPPED:
+                    # Not attempted at all, the module was disabled
+                    current[0].attempts -= 1
+                    current[1].attempts -= 1
+                    current = None
+                elif event == _RETRIED:
+                    current[0].retries += 1
+                    current[1].retries += 1
+                elif event == _TIMED_OUT:
+                    current[0].timeouts += 1
+                    current[1].timeouts += 1
+
+            if current is not None:
+                analysis.unfinished += 1
+
+    return analysis
+
+
+def split_into_chunks(path: str, chunk_count: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into chunks of about the same size, every chunk starts at the beginning of a line.
+    :param path: The file
+    :param chunk_count: The number of chunks
+    :return: The (start, end) offsets of the chunks, less than chunk_count for files with few lines
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for index in range(1, chunk_count):
+            position = max(size * index // chunk_count, boundaries[-1])
+            f.seek(position)
+            # Move to the start of the next line
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def analyze_logs(paths: List[str], max_workers: int = None) -> LogAnalysis:
+    """
+    Analyze log files written by BDFR with --log.
+    :param paths: The log files, e.g. the logs of all shards of a run
+    :param max_workers: The number of analyzing processes, the number of CPUs if not given, 1 to analyze in this
+    process
+    :return: The statistics of all files
+    """
+    start_time = time.monotonic()
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = []
+    for path in paths:
+        chunk_count = max_workers if os.path.getsize(path) >= PARALLEL_THRESHOLD else 1
+        chunks.extend((path, start, end) for start, end in split_into_chunks(path, chunk_count))
+
+    analysis = LogAnalysis()
+    if max_workers > 1 and len(chunks) > 1:
+        # Spawned instead of forked, forking a process running threads (e.g. the GUI) is not safe
+        with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for chunk_analysis in pool.map(analyze_chunk, *zip(*chunks)):
+                analysis.merge(chunk_analysis)
+    else:
+        for chunk in chunks:
+            analysis.merge(analyze_chunk(*chunk))
+
+    analysis.seconds = time.monotonic() - start_time
+    return analysis
+
+
+def suggest_exclusions(analysis: LogAnalysis, min_attempts: int = MIN_ATTEMPTS,
+                       max_success_rate: float = MAX_SUCCESS_RATE) -> ExclusionSuggestion:
+    """
+    Suggest the domains and modules to exclude, those that (almost) never succeed.
+    :param analysis: The statistics of previous runs
+    :param min_attempts: The number of attempts required to suggest a domain or module
+    :param max_success_rate: The share of successful attempts up to which a domain or module is suggested
+    :return: The suggested --skip-domain and --disable-module values, the most time consuming first
+    """
+    def select(sources: Dict[str, SourceStats]) -> List[str]:
+        selected = [name for name, stats in sources.items()
+                    if stats.attempts >= min_attempts and stats.success_rate <= max_success_rate]
+        return sorted(selected, key=lambda name: -sources[name].seconds)
+
+    suggestion = ExclusionSuggestion(select(analysis.domains), select(analysis.modules))
+    # Submissions of a suggested domain handled by a suggested module are counted once at most
+    suggestion.seconds = max(sum(analysis.domains[domain].seconds for domain in suggestion.skip_domain),
+                             sum(analysis.modules[module].seconds for module in suggestion.disable_module))
+    return suggestion
+
+
+def apply_exclusions(input_config: InputConfiguration, suggestion: ExclusionSuggestion) -> InputConfiguration:
+    """
+    Add suggested exclusions to a configuration, values it already contains are not added again.
+    The given configuration is not modified.
+    :param input_config: The configuration
+    :param suggestion: The exclusions to add
+    :return: The configuration with the exclusions
+    """
+    def extend(values: Optional[List[str]], additions: List[str]) -> Optional[List[str]]:
+        values = list(values or [])
+        known = {value.lower() for value in values}
+        values.extend(value for value in additions if value.lower() not in known)
+        return values or None
+
+    download_config = dataclasses.replace(input_config.download_config,
+                                          skip_domain=extend(input_config.download_config.skip_domain,
+                                                             suggestion.skip_domain))
+    return dataclasses.replace(input_config, download_config=download_config,
+                               disable_module=extend(input_config.disable_module, suggestion.disable_module))
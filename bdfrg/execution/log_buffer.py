@@ -0,0 +1,264 @@
+"""
+Storage for the output of long running jobs, with a bounded memory footprint.
+
+Every line is appended to a spill file on disk, the most recent lines are additionally kept in a ring buffer in
+memory. Older lines are read back from the spill file through a sparse index holding the offset of every
+INDEX_INTERVAL-th line, so the memory used per line is a few bits even for tens of millions of lines.
+"""
+import os
+import re
+import tempfile
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+# Number of most recent lines kept in memory
+RING_CAPACITY = 100000
+
+# The spill file offset of every INDEX_INTERVAL-th line is kept, a line is found by skipping at most this many lines
+INDEX_INTERVAL = 256
+
+# Bytes searched per call while filtering. The regular expression engine holds the GIL for a whole call, small
+# blocks keep the UI thread responsive while a filter runs in the background.
+FILTER_BLOCK_SIZE = 256 * 1024
+
+# Levels of the logging module, in increasing order of severity
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+@dataclass
+class FilterPattern:
+    # Searched in the whole spill file, a single unanchored search is much faster than checking every line
+    search: re.Pattern
+    # Checked on the lines found by search, if both a text and a level are filtered for
+    line_check: Optional[re.Pattern] = None
+
+    def matches(self, line: bytes) -> bool:
+        return self.search.search(line) is not None and (self.line_check is None
+                                                         or self.line_check.search(line) is not None)
+
+
+def build_filter_pattern(text: str = '', min_level: str = None) -> Optional[FilterPattern]:
+    """
+    Build the pattern of a filter, matching lines that contain the text and have at least the given level.
+    :param text: A regular expression searched in every line, e.g. a post ID, empty to match all lines
+    :param min_level: The minimum level of BDFR's '[time - logger - LEVEL]' prefix, None to match all levels
+    :return: The pattern, None if the filter matches every line
+    :raises re.error: If the text is not a valid regular expression
+    """
+    level_pattern = None
+    if min_level:
+        levels = '|'.join(LOG_LEVELS[LOG_LEVELS.index(min_level):])
+        level_pattern = re.compile(rf' - (?:{levels})\]'.encode())
+
+    if text:
+        # ^ and $ match at the line boundaries within the searched blocks, like for a single line
+        return FilterPattern(re.compile(text.encode(), re.MULTILINE), level_pattern)
+    return FilterPattern(level_pattern) if level_pattern is not None else None
+
+
+class LogFilter:
+    """
+    The numbers of the lines of a LogBuffer matching a pattern.
+
+    The lines already in the buffer are searched by a background thread, lines appended afterwards are matched by
+    LogBuffer.append_lines as they arrive.
+
+    :param log_buffer: The buffer to filter.
+    :type log_buffer: LogBuffer
+    :param pattern: The pattern, see build_filter_pattern.
+    :type pattern: FilterPattern
+    """
+
+    def __init__(self, log_buffer: 'LogBuffer', pattern: FilterPattern):
+        self.log_buffer = log_buffer
+        self.pattern = pattern
+        # 4 bytes per match, enough for 4 billion lines
+        self.matches = array('I')
+        # Number of lines searched so far, all lines once live is set
+        self.scanned = 0
+        self.live = False
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def progress(self) -> float:
+        count = self.log_buffer.count
+        return 1.0 if self.live or not count else self.scanned / count
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self):
+        search = self.pattern.search.search
+        line_check = self.pattern.line_check
+        offset = 0
+        line_number = 0
+
+        with open(self.log_buffer.spill_path, 'rb') as f:
+            while not self.cancelled.is_set():
+                with self.log_buffer.lock:
+                    if line_number == self.log_buffer.count:
+                        # Caught up, the buffer matches new lines from now on
+                        self.live = True
+                        return
+                    self.log_buffer.flush()
+                    end_offset = self.log_buffer.size
+
+                f.seek(offset)
+                block = f.read(min(FILTER_BLOCK_SIZE, end_offset - offset))
+                # Only whole lines, a line longer than the block is searched as a whole
+                block_end = block.rfind(b'\n') + 1
+                if not block_end:
+                    block += f.readline()
+                    block_end = len(block)
+
+                position = 0
+                while True:
+                    match = search(block, position, block_end)
+                    # An empty match (e.g. of ^ or .*) at the end of the block belongs to no line of it
+                    if match is None or match.start() >= block_end:
+                        break
+                    line_start = block.rfind(b'\n', position, match.start()) + 1 or position
+                    line_end = block.find(b'\n', match.start(), block_end) + 1 or block_end
+                    # The line without its new line, as matched when it is appended
+                    content_end = line_end - 1 if block[line_end - 1:line_end] == b'\n' else line_end
+                    line_number += block.count(b'\n', position, line_start)
+                    # A match reaching into the new line or the next line (e.g. through \s) is not a match of the
+                    # line on its own
+                    line_matches = match.end() <= content_end or search(block, line_start, content_end) is not None
+                    if line_matches and (line_check is None or line_check.search(block, line_start, content_end)):
+                        self.matches.append(line_number)
+                    # Continue after the line, every line is matched once. Always forward, also for empty matches.
+                    position = max(line_end, match.start() + 1)
+                    line_number += 1
+
+                line_number += block.count(b'\n', position, block_end)
+                offset += block_end
+                self.scanned = line_number
+
+
+class LogBuffer:
+    """
+    The lines of a job's output, in a ring buffer in memory and in a spill file.
+
+    append_lines() is called by the UI thread, reading lines and filtering are safe while lines are appended.
+
+    :param capacity: The number of most recent lines kept in memory.
+    :type capacity: int
+    """
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.capacity = capacity
+        self.ring: List[Optional[str]] = [None] * capacity
+        self.count = 0
+        # One bit per line, set for lines written to stderr
+        self.stderr_bits = bytearray()
+        # Spill file offset of every INDEX_INTERVAL-th line
+        self.index = array('Q')
+        self.size = 0
+
+        file_descriptor, self.spill_path = tempfile.mkstemp(prefix='bdfrg-output-', suffix='.log')
+        self.spill_file = os.fdopen(file_descriptor, 'wb', buffering=1024 * 1024)
+        self.reader = open(self.spill_path, 'rb')
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.filter: Optional[LogFilter] = None
+
+    def append_lines(self, lines: Iterable[Tuple[str, bool]]):
+        """
+        Append lines.
+        :param lines: (line, written to stderr) tuples, a trailing new line is removed
+        :return: None
+        """
+        write = self.spill_file.write
+        ring = self.ring
+        capacity = self.capacity
+
+        with self.lock:
+            live_filter = self.filter if self.filter is not None and self.filter.live else None
+
+            for line, is_stderr in lines:
+                line = line.rstrip('\n')
+                encoded_line = line.encode('utf-8', 'replace')
+                encoded = encoded_line + b'\n'
+                line_number = self.count
+
+                if line_number % INDEX_INTERVAL == 0:
+                    self.index.append(self.size)
+                if line_number % 8 == 0:
+                    self.stderr_bits.append(0)
+                if is_stderr:
+                    self.stderr_bits[line_number >> 3] |= 1 << (line_number & 7)
+
+                write(encoded)
+                self.size += len(encoded)
+                ring[line_number % capacity] = line
+                self.count = line_number + 1
+
+                # Without the new line, like the lines of the background scan
+                if live_filter is not None and live_filter.pattern.matches(encoded_line):
+                    live_filter.matches.append(line_number)
+            self.dirty = True
+
+    def flush(self):
+        if self.dirty:
+            self.spill_file.flush()
+            self.dirty = False
+
+    def is_stderr(self, line_number: int) -> bool:
+        return bool(self.stderr_bits[line_number >> 3] & 1 << (line_number & 7))
+
+    def get_lines(self, start: int, stop: int) -> List[str]:
+        """
+        Get consecutive lines.
+        :param start: The number of the first line
+        :param stop: The number after the last line, at most count
+        :return: The lines, without new line
+        """
+        first_in_memory = max(0, self.count - self.capacity)
+        lines = []
+
+        if start < first_in_memory:
+            disk_stop = min(stop, first_in_memory)
+            with self.lock:
+                self.flush()
+            block = start // INDEX_INTERVAL
+            self.reader.seek(self.index[block])
+            for _ in range(start - block * INDEX_INTERVAL):
+                self.reader.readline()
+            lines.extend(self.reader.readline()[:-1].decode('utf-8', 'replace') for _ in range(start, disk_stop))
+            start = disk_stop
+
+        lines.extend(self.ring[line_number % self.capacity] for line_number in range(start, stop))
+        return lines
+
+    def set_filter(self, pattern: Optional[FilterPattern]) -> Optional[LogFilter]:
+        """
+        Start filtering the lines, a running filter is cancelled.
+        :param pattern: The pattern, see build_filter_pattern, None to remove the filter
+        :return: The filter, None if removed
+        """
+        if self.filter is not None:
+            self.filter.cancel()
+        self.filter = LogFilter(self, pattern) if pattern is not None else None
+        if self.filter is not None:
+            self.filter.start()
+        return self.filter
+
+    def close(self):
+        """
+        Stop filtering and remove the spill file.
+        :return: None
+        """
+        self.set_filter(None)
+        self.reader.close()
+        self.spill_file.close()
+        try:
+            os.remove(self.spill_path)
+        except OSError:
+            pass
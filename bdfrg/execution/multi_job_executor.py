@@ -0,0 +1,187 @@
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from bdfrg.execution.job_runner import build_command, run_job_to_file
+from bdfrg.execution.rate_budget import BudgetLease, RateBudget, get_target_count
+from bdfrg.execution.resource_governor import ResourceTotals
+from bdfrg.input_configuration import InputConfiguration
+
+# Fields of the InputConfiguration holding download targets that can be spread over multiple processes
+SHARDABLE_FIELDS = ['subreddit', 'user', 'multireddit', 'link']
+
+# Targets that can't be spread, they are run by the first shard only so that they are downloaded once
+FIRST_SHARD_FIELDS = ['include_id_file']
+
+# The posts of the users, downloaded by the shards holding users only. Kept on the first shard only if the users
+# are copied to every shard for their multireddits.
+USER_POST_FIELDS = ['saved', 'upvoted', 'submitted']
+
+
+@dataclass
+class ShardResult:
+    index: int
+    command: List[str]
+    log_path: str
+    return_code: int
+    duration: float
+    resources: ResourceTotals = None
+
+
+@dataclass
+class ExecutionReport:
+    results: List[ShardResult]
+    duration: float
+
+    @property
+    def failed(self) -> List[ShardResult]:
+        return [result for result in self.results if result.return_code != 0]
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.failed
+
+    def summary(self) -> str:
+        """
+        Create a human readable summary of the execution.
+        :return: One line per shard followed by the overall result
+        """
+        lines = [f'Shard {result.index}: exit code {result.return_code} after {result.duration:.1f}s ({result.log_path})'
+                 + (f', {result.resources.summary()}' if result.resources is not None else '')
+                 for result in self.results]
+        lines.append(f'{len(self.results) - len(self.failed)}/{len(self.results)} shards succeeded '
+                     f'in {self.duration:.1f}s')
+        return '\n'.join(lines)
+
+
+def shard_configuration(input_config: InputConfiguration, shard_count: int) -> List[InputConfiguration]:
+    """
+    Split a configuration into up to shard_count configurations, each holding a part of the download targets.
+    Targets are distributed round robin, the ID files are run by the first shard and all other settings are copied
+    to every shard. If multireddits are configured the users are kept on every shard, as BDFR resolves the
+    multireddits against them, and their saved, upvoted and submitted posts are downloaded by the first shard.
+    Otherwise these posts are downloaded by the shards that got users.
+    :param input_config: The configuration to split
+    :param shard_count: The maximum number of shards to create
+    :return: The list of shard configurations, never more than there are targets
+    """
+    if shard_count < 1:
+        raise Exception(f'Shard count must be at least 1, got {shard_count}')
+
+    shard_fields = list(SHARDABLE_FIELDS)
+    first_shard_fields = list(FIRST_SHARD_FIELDS)
+    if input_config.multireddit:
+        shard_fields.remove('user')
+        first_shard_fields.extend(USER_POST_FIELDS)
+
+    targets = [(field_name, value) for field_name in shard_fields for value in getattr(input_config, field_name) or []]
+    shard_count = max(1, min(shard_count, len(targets)))
+
+    shards = []
+    for index in range(shard_count):
+        shard = copy.deepcopy(input_config)
+        for field_name in shard_fields:
+            setattr(shard, field_name, None)
+        if index > 0:
+            for field_name in first_shard_fields:
+                # False for the flags, None for the lists
+                setattr(shard, field_name, False if isinstance(getattr(shard, field_name), bool) else None)
+        shards.append(shard)
+
+    for index, (field_name, value) in enumerate(targets):
+        shard = shards[index % shard_count]
+        if getattr(shard, field_name) is None:
+            setattr(shard, field_name, [])
+        getattr(shard, field_name).append(value)
+
+    if 'user' in shard_fields:
+        for shard in shards:
+            if not shard.user:
+                for field_name in USER_POST_FIELDS:
+                    setattr(shard, field_name, False)
+
+    return shards
+
+
+def get_shard_log_path(input_config: InputConfiguration, index: int, log_directory: Optional[str]) -> str:
+    """
+    Get the log file of a shard, derived from the configured log file or placed into the log directory.
+    :param input_config: The original (unsharded) configuration
+    :param index: The index of the shard
+    :param log_directory: The directory to place the log in if the configuration has no log file
+    :return: The path of the log file e.g. /var/log/bdfr.shard3.log
+    """
+    if input_config.log:
+        base, extension = os.path.splitext(input_config.log)
+        return f'{base}.shard{index}{extension or ".log"}'
+
+    return os.path.join(log_directory or os.getcwd(), f'bdfr.shard{index}.log')
+
+
+class MultiJobExecutor:
+    """
+    Runs a configuration as multiple concurrent BDFR processes, each one downloading a shard of the targets.
+
+    :param input_config: The configuration to run
+    :type input_config: InputConfiguration
+    :param shard_count: The number of shards to split the targets into
+    :type shard_count: int
+    :param max_concurrency: The maximum number of processes running at the same time, defaults to shard_count
+    :type max_concurrency: int
+    :param log_directory: Where to place the shard logs if the configuration has no log file
+    :type log_directory: str
+    :param mode: The BDFR sub command to run
+    :type mode: str
+    :param executable: The name or path of the BDFR executable
+    :type executable: str
+    :param budget: The API budget shared with other jobs, shards are started when it leaves room for them
+    :type budget: RateBudget
+    """
+
+    def __init__(self, input_config: InputConfiguration, shard_count: int, max_concurrency: int = None,
+                 log_directory: str = None, mode: str = 'download', executable: str = 'bdfr',
+                 budget: RateBudget = None):
+        self.input_config = input_config
+        self.shards = shard_configuration(input_config, shard_count)
+        self.max_concurrency = max_concurrency or len(self.shards)
+        self.log_directory = log_directory
+        self.mode = mode
+        self.executable = executable
+        self.budget = budget
+
+        for index, shard in enumerate(self.shards):
+            shard.log = get_shard_log_path(input_config, index, log_directory)
+
+    def run_shard(self, index: int) -> ShardResult:
+        """
+        Run a single shard to completion. The console output of BDFR is written to <log file>.out, replacing the output
+        of a previous run.
+        :param index: The index of the shard to run
+        :return: The result of the shard
+        """
+        shard = self.shards[index]
+        command = build_command(shard, self.mode, self.executable)
+
+        os.makedirs(os.path.dirname(os.path.abspath(shard.log)), exist_ok=True)
+        lease = None
+        if self.budget is not None:
+            lease = BudgetLease(self.budget, f'Shard {index}', self.mode, get_target_count(shard))
+        start = time.monotonic()
+        return_code, resources = run_job_to_file(command, f'{shard.log}.out', lease, shard.resource_config)
+
+        return ShardResult(index, command, shard.log, return_code, time.monotonic() - start, resources)
+
+    def run(self) -> ExecutionReport:
+        """
+        Run all shards, at most max_concurrency at a time, and wait for them to finish.
+        The pool only holds threads waiting on the processes, the actual work happens in the BDFR processes.
+        :return: The merged report of all shards
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            results = list(pool.map(self.run_shard, range(len(self.shards))))
+
+        return ExecutionReport(results, time.monotonic() - start)
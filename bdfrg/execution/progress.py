@@ -0,0 +1,281 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional
+
+from bdfrg.input_configuration import InputConfiguration
+
+# Rates are computed over this window, long enough to smooth out slow posts, short enough to show a stall quickly
+RATE_WINDOW_SECONDS = 30
+
+# A job counts as stalled if neither a post was processed nor a byte was written for this long
+STALL_SECONDS = 60
+
+# How often the download directory is measured
+DIRECTORY_SAMPLE_INTERVAL_SECONDS = 2
+
+
+class ProgressEvent(Enum):
+    DOWNLOADED = 'downloaded'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+    THROTTLED = 'throttled'
+
+
+# The log messages of BDFR per event, one group per event so that a single search classifies a line
+PROGRESS_PATTERN = re.compile(r'''
+    (Downloaded\ submission|Record\ for\ entry\ item\ .*\ written\ to\ disk|Hard\ link\ made)
+    |(in\ exclusion\ list,\ skipping|in\ skip\ list|being\ an\ ignored\ user|filtered\ due\ to
+      |already\ exists,\ continuing|Download\ filter\ removed|skipped\ due\ to\ disabled\ module
+      |downloaded\ elsewhere|is\ not\ a\ submission)
+    |(Could\ not\ download\ submission|failed\ to\ download\ submission|Failed\ to\ download\ resource
+      |Failed\ to\ write\ file\ in\ submission)
+    |(Sleeping:|waiting\ \d+\ seconds|received\ 429|Too\ Many\ Requests)
+''', re.VERBOSE)
+
+_GROUP_EVENTS = {1: ProgressEvent.DOWNLOADED, 2: ProgressEvent.SKIPPED, 3: ProgressEvent.FAILED,
+                 4: ProgressEvent.THROTTLED}
+
+
+def classify_line(line: str) -> Optional[ProgressEvent]:
+    """
+    Classify a line of BDFR output.
+    :param line: The line to classify
+    :return: The progress event of the line, None if it is not a progress message
+    """
+    match = PROGRESS_PATTERN.search(line)
+    return _GROUP_EVENTS[match.lastindex] if match else None
+
+
+def get_expected_post_count(input_config: InputConfiguration) -> Optional[int]:
+    """
+    Get the number of posts a job is expected to process, the limit applies to every source separately.
+    :param input_config: The configuration of the job
+    :return: The number of posts, None if it is not known (no limit)
+    """
+    source_count = sum(len(getattr(input_config, field_name) or []) for field_name in ('subreddit', 'multireddit'))
+    # Without multireddits, users are sources themselves and not only the owners of multireddits
+    if not input_config.multireddit:
+        source_count += len(input_config.user or [])
+    link_count = len(input_config.link or [])
+
+    if source_count and input_config.limit is None:
+        return None
+    return source_count * (input_config.limit or 0) + link_count or None
+
+
+class DirectorySizeSampler:
+    """
+    Measures the size of a directory tree in a background thread.
+
+    The first sample walks the whole tree. Afterwards only directories whose modification time changed, i.e. that got
+    new or removed entries, are listed again. For the others the sub directories and files of the previous sample are
+    reused and only the files are stat'ed again, so files that grew in place are measured without listing the
+    directory.
+
+    :param directory: The directory to measure.
+    :type directory: str
+    :param interval: The time between two samples in seconds.
+    :type interval: float
+    """
+
+    def __init__(self, directory: str, interval: float = DIRECTORY_SAMPLE_INTERVAL_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        # Directory path -> (modification time, paths of the files directly inside, sub directory paths)
+        self.directories: Dict[str, tuple] = {}
+        self.initial_size = None
+        self.size = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def bytes_written(self) -> int:
+        return self.size - self.initial_size if self.initial_size is not None else 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while True:
+            self.size = self.sample()
+            if self.initial_size is None:
+                self.initial_size = self.size
+            if self.stop_event.wait(self.interval):
+                return
+
+    def sample(self) -> int:
+        """
+        Measure the directory tree once.
+        :return: The total size of all files in bytes
+        """
+        total_size = 0
+        directories = {}
+        pending = [self.directory]
+
+        while pending:
+            path = pending.pop()
+            try:
+                modification_time = os.stat(path).st_mtime_ns
+                known = self.directories.get(path)
+                if known is not None and known[0] == modification_time:
+                    # No entry was added or removed, the directory is not listed again
+                    _, files, sub_directories = known
+                    file_size = 0
+                    for file_path in files:
+                        try:
+                            file_size += os.stat(file_path, follow_symlinks=False).st_size
+                        except OSError:
+                            # Removed since, the directory is listed again on the next sample
+                            pass
+                else:
+                    file_size = 0
+                    files = []
+                    sub_directories = []
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                sub_directories.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                files.append(entry.path)
+                                file_size += entry.stat(follow_symlinks=False).st_size
+                    files = tuple(files)
+                    sub_directories = tuple(sub_directories)
+            except OSError:
+                # The directory does not exist (yet) or was removed while measuring
+                continue
+
+            directories[path] = (modification_time, files, sub_directories)
+            total_size += file_size
+            pending.extend(sub_directories)
+
+        self.directories = directories
+        return total_size
+
+
+@dataclass
+class ProgressSnapshot:
+    downloaded: int
+    skipped: int
+    failed: int
+    throttled: int
+    bytes_written: int
+    elapsed_seconds: float
+    posts_per_second: float
+    bytes_per_second: float
+    # None if the number of posts is not known
+    eta_seconds: Optional[float]
+    stalled: bool
+
+    @property
+    def processed(self) -> int:
+        return self.downloaded + self.skipped + self.failed
+
+
+class ProgressTracker:
+    """
+    Counts the progress messages of a running BDFR job and computes its throughput.
+
+    feed() is cheap (a single regular expression search), it is called for every line of output. The rates are only
+    computed by snapshot(), which is meant to be called at a low, fixed frequency.
+
+    :param expected_post_count: The number of posts the job is expected to process, None if not known.
+    :type expected_post_count: int
+    :param directory_sampler: Measures the bytes written to the download directory, optional.
+    :type directory_sampler: DirectorySizeSampler
+    """
+
+    def __init__(self, expected_post_count: Optional[int] = None, directory_sampler: DirectorySizeSampler = None):
+        self.expected_post_count = expected_post_count
+        self.directory_sampler = directory_sampler
+        self.counts = {event: 0 for event in ProgressEvent}
+        self.start_time = time.monotonic()
+        # (time, processed, bytes written) samples of the last RATE_WINDOW_SECONDS
+        self.samples = deque([(self.start_time, 0, 0)])
+        self.last_change_time = self.start_time
+        self.last_change = (0, 0)
+
+    @classmethod
+    def for_configuration(cls, input_config: InputConfiguration) -> 'ProgressTracker':
+        directory_sampler = None
+        if input_config.directory:
+            directory_sampler = DirectorySizeSampler(input_config.directory)
+            directory_sampler.start()
+        return cls(get_expected_post_count(input_config), directory_sampler)
+
+    def feed(self, line: str):
+        event = classify_line(line)
+        if event is not None:
+            self.counts[event] += 1
+
+    def stop(self):
+        if self.directory_sampler is not None:
+            self.directory_sampler.stop()
+
+    def snapshot(self) -> ProgressSnapshot:
+        now = time.monotonic()
+        counts = self.counts
+        processed = counts[ProgressEvent.DOWNLOADED] + counts[ProgressEvent.SKIPPED] + counts[ProgressEvent.FAILED]
+        bytes_written = self.directory_sampler.bytes_written if self.directory_sampler is not None else 0
+
+        self.samples.append((now, processed, bytes_written))
+        while now - self.samples[0][0] > RATE_WINDOW_SECONDS:
+            self.samples.popleft()
+
+        first_time, first_processed, first_bytes = self.samples[0]
+        window = now - first_time
+        posts_per_second = (processed - first_processed) / window if window > 0 else 0.0
+        bytes_per_second = (bytes_written - first_bytes) / window if window > 0 else 0.0
+
+        if (processed, bytes_written) != self.last_change:
+            self.last_change = (processed, bytes_written)
+            self.last_change_time = now
+
+        eta_seconds = None
+        if self.expected_post_count is not None and posts_per_second > 0:
+            eta_seconds = max(0, self.expected_post_count - processed) / posts_per_second
+
+        return ProgressSnapshot(counts[ProgressEvent.DOWNLOADED], counts[ProgressEvent.SKIPPED],
+                                counts[ProgressEvent.FAILED], counts[ProgressEvent.THROTTLED], bytes_written,
+                                now - self.start_time, posts_per_second, bytes_per_second, eta_seconds,
+                                now - self.last_change_time > STALL_SECONDS)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m {seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
+def format_snapshot(snapshot: ProgressSnapshot) -> str:
+    """
+    Format a snapshot as a single status line.
+    :param snapshot: The snapshot to format
+    :return: e.g. 'Processed 120 (downloaded 100, skipped 15, failed 5) | 2.3 posts/s | 1.40 MB/s | 35.2 MB | ...'
+    """
+    parts = [f'Processed {snapshot.processed} (downloaded {snapshot.downloaded}, skipped {snapshot.skipped}, '
+             f'failed {snapshot.failed})',
+             f'{snapshot.posts_per_second:.1f} posts/s',
+             f'{snapshot.bytes_per_second / 1e6:.2f} MB/s',
+             f'{snapshot.bytes_written / 1e6:.1f} MB written',
+             f'elapsed {format_duration(snapshot.elapsed_seconds)}']
+
+    if snapshot.eta_seconds is not None:
+        parts.append(f'ETA {format_duration(snapshot.eta_seconds)}')
+    if snapshot.throttled:
+        parts.append(f'throttled {snapshot.throttled}x')
+    if snapshot.stalled:
+        parts.append('STALLED')
+
+    return ' | '.join(parts)
@@ -0,0 +1,414 @@
+"""
+Sharing the Reddit API budget between concurrently running jobs, also between separate bdfrg processes.
+
+Every BDFR process assumes it has the whole API budget of its client to itself, several of them together run into
+the rate limit and long back-offs. Jobs launched by bdfrg register with a token bucket kept in a SQLite database
+instead, and are only started while the requests of the running jobs leave room for them. The requests of BDFR are
+not visible from outside, they are estimated from the posts it reports in its output.
+"""
+import collections
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from bdfrg.execution.progress import ProgressEvent, classify_line
+from bdfrg.input_configuration import InputConfiguration
+
+# Reddit allows 100 requests per minute per OAuth client, some room is left for requests not reflected in the output
+DEFAULT_REQUESTS_PER_MINUTE = 90
+
+DEFAULT_MAX_JOBS = 4
+
+# Requests per processed post. A listing request returns 100 posts, archiving also fetches the comments of every post.
+REQUESTS_PER_POST = {'download': 0.01, 'archive': 1.01, 'clone': 1.01}
+
+# Rate assumed for a job until it ran for RATE_WINDOW_SECONDS, a single BDFR process rarely exceeds one request per
+# second
+ESTIMATED_REQUESTS_PER_MINUTE = {'download': 10.0, 'archive': 60.0, 'clone': 60.0}
+
+# Requests of a job before its first post per target (checking the target, the first listing page), taken from the
+# bucket when the job is started, so that jobs are not all started at once
+STARTUP_REQUESTS_PER_TARGET = 3
+
+# The rate of a job is measured over this window
+RATE_WINDOW_SECONDS = 60
+
+# How often a running job reports its requests. The report is also the sign of life of the job.
+REPORT_INTERVAL_SECONDS = 2
+
+# A job that has not reported for this long is considered dead (e.g. its process was killed) and removed
+LEASE_TIMEOUT_SECONDS = 30
+
+# No job is started for this long after a job was throttled by Reddit
+THROTTLE_COOLDOWN_SECONDS = 60
+
+# How often a waiting job checks whether it can be started
+ADMISSION_POLL_SECONDS = 1
+
+
+def get_default_budget_path() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'rate_budget.sqlite3')
+
+
+def get_target_count(input_config: InputConfiguration) -> int:
+    """
+    Get the number of targets a job requests listings for.
+    :param input_config: The configuration of the job
+    :return: The number of targets, at least 1
+    """
+    target_count = sum(len(getattr(input_config, field_name) or []) for field_name in ('subreddit', 'multireddit'))
+    if not input_config.multireddit:
+        target_count += len(input_config.user or [])
+    return max(1, target_count + bool(input_config.link))
+
+
+@dataclass
+class JobUsage:
+    job_id: str
+    description: str
+    pid: int
+    running: bool
+    requests: float
+    requests_per_minute: float
+    seconds: float
+
+
+@dataclass
+class BudgetMetrics:
+    requests_per_minute: float
+    max_jobs: int
+    # Requests that can be made right now without exceeding the budget, negative if it is exceeded
+    tokens: float
+    throttled_seconds: float
+    jobs: List[JobUsage] = field(default_factory=list)
+
+    @property
+    def running(self) -> List[JobUsage]:
+        return [job for job in self.jobs if job.running]
+
+    @property
+    def used_requests_per_minute(self) -> float:
+        return sum(job.requests_per_minute for job in self.running)
+
+    @property
+    def utilization(self) -> float:
+        return self.used_requests_per_minute / self.requests_per_minute if self.requests_per_minute else 0.0
+
+    def summary(self) -> str:
+        text = f'{len(self.running)} running, {len(self.jobs) - len(self.running)} waiting, ' \
+               f'{self.used_requests_per_minute:.0f} of {self.requests_per_minute:.0f} requests per minute ' \
+               f'({self.utilization:.0%}), {max(0.0, self.tokens):.0f} requests available'
+        if self.throttled_seconds > 0:
+            text += f', throttled for {self.throttled_seconds:.0f}s'
+        return text
+
+
+class RateBudget:
+    """
+    A token bucket shared by all bdfrg processes of a user, holding the requests that can be made right now.
+
+    The bucket refills with the configured requests per minute and holds at most the requests of one minute. Running
+    jobs take the requests they made, a job is only started if the bucket holds its startup requests, fewer than
+    max_jobs jobs run and the rates of the running jobs plus its estimated rate stay within the budget. Waiting jobs
+    are started in the order they registered. Every change happens in an immediate transaction, which serializes
+    the processes.
+
+    :param path: The path of the database.
+    :type path: str
+    :param clock: Returns the current time in seconds, shared by all processes.
+    :type clock: Callable[[], float]
+    """
+
+    def __init__(self, path: str = None, clock: Callable[[], float] = time.time):
+        self.path = path or get_default_budget_path()
+        self.clock = clock
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # Used by the reporting threads of the leases as well, every use holds the lock
+        self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                                'requests_per_minute REAL, max_jobs INTEGER, tokens REAL, updated REAL, '
+                                'throttled_until REAL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, pid INTEGER, description TEXT, '
+                                'running INTEGER, estimated_rate REAL, startup_requests REAL, requests REAL, '
+                                'rate REAL, registered REAL, started REAL, heartbeat REAL)')
+        self.connection.execute('INSERT OR IGNORE INTO bucket VALUES (0, ?, ?, ?, ?, 0)',
+                                (DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_MAX_JOBS, DEFAULT_REQUESTS_PER_MINUTE,
+                                 self.clock()))
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    @contextmanager
+    def _read_transaction(self):
+        # Deferred, in WAL mode a reader neither takes the write lock nor waits for a process holding it
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                yield self.connection
+            finally:
+                self.connection.execute('COMMIT')
+
+    @staticmethod
+    def _read_bucket(connection: sqlite3.Connection, now: float):
+        """
+        Read the bucket, refilled up to now.
+        :return: The requests per minute, the maximum number of jobs, the tokens and the end of the throttling
+        """
+        requests_per_minute, max_jobs, tokens, updated, throttled_until = connection.execute(
+            'SELECT requests_per_minute, max_jobs, tokens, updated, throttled_until FROM bucket').fetchone()
+        tokens = min(requests_per_minute, tokens + max(0.0, now - updated) * requests_per_minute / 60)
+        return requests_per_minute, max_jobs, tokens, throttled_until
+
+    def _refill(self, connection: sqlite3.Connection, now: float):
+        """
+        Refill the bucket up to now and remove dead jobs. Called at the start of every immediate transaction.
+        :return: The requests per minute, the maximum number of jobs, the tokens and the end of the throttling
+        """
+        requests_per_minute, max_jobs, tokens, throttled_until = self._read_bucket(connection, now)
+        connection.execute('UPDATE bucket SET tokens = ?, updated = ?', (tokens, now))
+        connection.execute('DELETE FROM jobs WHERE heartbeat < ?', (now - LEASE_TIMEOUT_SECONDS,))
+        return requests_per_minute, max_jobs, tokens, throttled_until
+
+    def configure(self, requests_per_minute: float = None, max_jobs: int = None):
+        """
+        Change the budget, for all processes.
+        :param requests_per_minute: The combined requests per minute of all jobs
+        :param max_jobs: The maximum number of jobs running at the same time
+        :return: None
+        """
+        if requests_per_minute is not None and requests_per_minute <= 0:
+            raise Exception(f'Requests per minute must be positive, got {requests_per_minute}')
+        if max_jobs is not None and max_jobs < 1:
+            raise Exception(f'Maximum number of jobs must be at least 1, got {max_jobs}')
+
+        with self._transaction() as connection:
+            self._refill(connection, self.clock())
+            if requests_per_minute is not None:
+                connection.execute('UPDATE bucket SET requests_per_minute = ?, tokens = MIN(tokens, ?)',
+                                   (requests_per_minute, requests_per_minute))
+            if max_jobs is not None:
+                connection.execute('UPDATE bucket SET max_jobs = ?', (max_jobs,))
+
+    def register(self, description: str, mode: str = 'download', target_count: int = 1, pid: int = None,
+                 running: bool = False) -> str:
+        """
+        Register a job waiting to be started.
+        :param description: Shown in the metrics, e.g. the target of the job
+        :param mode: The BDFR sub command of the job, determines its estimated rate
+        :param target_count: The number of targets of the job, determines its startup requests
+        :param pid: The process the job belongs to, the current one if not given
+        :param running: Register a job that is already running, e.g. one removed while its process was suspended
+        :return: The ID of the job
+        """
+        job_id = uuid.uuid4().hex
+        now = self.clock()
+        with self._transaction() as connection:
+            connection.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, 0, 0, ?, ?, ?)',
+                               (job_id, pid or os.getpid(), description, int(running),
+                                ESTIMATED_REQUESTS_PER_MINUTE[mode], STARTUP_REQUESTS_PER_TARGET * target_count, now,
+                                now if running else None, now))
+        return job_id
+
+    def try_admit(self, job_id: str) -> bool:
+        """
+        Start a waiting job, if the budget leaves room for it. Has to be called at least every LEASE_TIMEOUT_SECONDS.
+        :param job_id: The ID of the job
+        :return: Whether the job may run
+        :raises Exception: If the job is not registered, e.g. removed after it did not check for too long
+        """
+        now = self.clock()
+        with self._transaction() as connection:
+            requests_per_minute, max_jobs, tokens, throttled_until = self._refill(connection, now)
+            row = connection.execute('SELECT running, estimated_rate, startup_requests FROM jobs WHERE id = ?',
+                                     (job_id,)).fetchone()
+            if row is None:
+                raise Exception(f'Job {job_id} is not registered')
+            running, estimated_rate, startup_requests = row
+            if running:
+                return True
+            connection.execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (now, job_id))
+
+            # First come, first served
+            first_waiting, = connection.execute('SELECT id FROM jobs WHERE running = 0 ORDER BY registered, rowid '
+                                                'LIMIT 1').fetchone()
+            if first_waiting != job_id:
+                return False
+
+            # Until its rate is measured over a whole window, the estimate of a job counts
+            running_rates = [rate if now - started >= RATE_WINDOW_SECONDS else max(rate, estimated)
+                             for rate, estimated, started in connection.execute(
+                                 'SELECT rate, estimated_rate, started FROM jobs WHERE running = 1')]
+            # A single job is always started, BDFR keeps itself within the limit of its client
+            if running_rates and (len(running_rates) >= max_jobs or now < throttled_until
+                                  or tokens < startup_requests
+                                  or sum(running_rates) + estimated_rate > requests_per_minute):
+                return False
+
+            connection.execute('UPDATE bucket SET tokens = ?', (tokens - startup_requests,))
+            connection.execute('UPDATE jobs SET running = 1, started = ?, requests = ? WHERE id = ?',
+                               (now, startup_requests, job_id))
+            return True
+
+    def report(self, job_id: str, requests: float, requests_per_minute: float, throttled: bool = False) -> bool:
+        """
+        Take the requests a running job made since its last report from the bucket.
+        :param job_id: The ID of the job
+        :param requests: The requests since the last report
+        :param requests_per_minute: The rate of the job over the last RATE_WINDOW_SECONDS
+        :param throttled: Whether the job was throttled by Reddit since the last report
+        :return: Whether the job is still registered
+        """
+        now = self.clock()
+        with self._transaction() as connection:
+            self._refill(connection, now)
+            connection.execute('UPDATE bucket SET tokens = tokens - ?', (requests,))
+            if throttled:
+                # Reddit disagrees with the estimate, nothing is started until the bucket has refilled
+                connection.execute('UPDATE bucket SET throttled_until = ?, tokens = MIN(tokens, 0)',
+                                   (now + THROTTLE_COOLDOWN_SECONDS,))
+            cursor = connection.execute('UPDATE jobs SET requests = requests + ?, rate = ?, heartbeat = ? WHERE id = ?',
+                                        (requests, requests_per_minute, now, job_id))
+            return cursor.rowcount > 0
+
+    def release(self, job_id: str):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def metrics(self) -> BudgetMetrics:
+        """
+        Read the state of the budget, without changing it. Dead jobs are left out, they are removed by the next change.
+        :return: The metrics
+        """
+        now = self.clock()
+        with self._read_transaction() as connection:
+            requests_per_minute, max_jobs, tokens, throttled_until = self._read_bucket(connection, now)
+            jobs = [JobUsage(job_id, description, pid, bool(running), requests,
+                             rate if running and now - started >= RATE_WINDOW_SECONDS else
+                             max(rate, estimated_rate) if running else 0.0,
+                             now - (started if running else registered))
+                    for job_id, description, pid, running, requests, rate, estimated_rate, started, registered
+                    in connection.execute('SELECT id, description, pid, running, requests, rate, estimated_rate, '
+                                          'started, registered FROM jobs WHERE heartbeat >= ? '
+                                          'ORDER BY registered, rowid', (now - LEASE_TIMEOUT_SECONDS,))]
+        return BudgetMetrics(requests_per_minute, max_jobs, tokens, max(0.0, throttled_until - now), jobs)
+
+    def close(self):
+        self.connection.close()
+
+
+class BudgetLease:
+    """
+    The registration of a single job with a RateBudget.
+
+    Once the job was started, its output is passed to feed(), the requests it stands for are reported to the
+    budget every REPORT_INTERVAL_SECONDS by a background thread.
+
+    :param budget: The budget to register with.
+    :type budget: RateBudget
+    :param description: Shown in the metrics.
+    :type description: str
+    :param mode: The BDFR sub command of the job.
+    :type mode: str
+    :param target_count: The number of targets of the job.
+    :type target_count: int
+    """
+
+    def __init__(self, budget: RateBudget, description: str, mode: str = 'download', target_count: int = 1):
+        self.budget = budget
+        self.description = description
+        self.mode = mode
+        self.target_count = target_count
+        self.requests_per_post = REQUESTS_PER_POST[mode]
+        self.job_id = budget.register(description, mode, target_count)
+        self.admitted = False
+        self.lock = threading.Lock()
+        self.pending_requests = 0.0
+        self.throttled = False
+        # (time, requests) of the reports within the rate window
+        self.history = collections.deque()
+        self.started = 0.0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def try_start(self) -> bool:
+        """
+        Start the job if the budget leaves room for it, without blocking.
+        :return: Whether the job may run
+        """
+        if not self.admitted and self.budget.try_admit(self.job_id):
+            self.admitted = True
+            self.started = self.budget.clock()
+            self.thread = threading.Thread(target=self._report_periodically, daemon=True)
+            self.thread.start()
+        return self.admitted
+
+    def wait(self, cancelled: threading.Event = None) -> bool:
+        """
+        Block until the job may run.
+        :param cancelled: Stops waiting when set
+        :return: Whether the job may run, False if cancelled
+        """
+        cancelled = cancelled or threading.Event()
+        while not self.try_start():
+            if cancelled.wait(ADMISSION_POLL_SECONDS):
+                return False
+        return True
+
+    def feed(self, line: str):
+        event = classify_line(line)
+        if event is None:
+            return
+        with self.lock:
+            if event is ProgressEvent.THROTTLED:
+                self.throttled = True
+            else:
+                self.pending_requests += self.requests_per_post
+
+    def _report(self):
+        with self.lock:
+            requests, self.pending_requests = self.pending_requests, 0.0
+            throttled, self.throttled = self.throttled, False
+
+        # The clock of the budget, a simulated clock of a test applies to the rates as well
+        now = self.budget.clock()
+        self.history.append((now, requests))
+        while self.history[0][0] < now - RATE_WINDOW_SECONDS:
+            self.history.popleft()
+        window = min(RATE_WINDOW_SECONDS, max(REPORT_INTERVAL_SECONDS, now - self.started))
+        rate = sum(requests for _, requests in self.history) * 60 / window
+        if not self.budget.report(self.job_id, requests, rate, throttled):
+            # Removed as dead, e.g. while the computer was suspended
+            self.job_id = self.budget.register(self.description, self.mode, self.target_count, running=True)
+
+    def _report_periodically(self):
+        while not self.stopped.wait(REPORT_INTERVAL_SECONDS):
+            self._report()
+
+    def release(self):
+        """
+        Report the last requests and remove the job from the budget.
+        :return: None
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self._report()
+        self.budget.release(self.job_id)
+
@@ -0,0 +1,255 @@
+"""
+Resource limits and usage of the BDFR processes started by bdfrg.
+
+The limits of a ResourceConfiguration (niceness, I/O priority, address space and open files) are applied to a
+process right after it was started, before BDFR has done any work. The usage of a job, the process and all of its
+children (e.g. ffmpeg started by yt-dlp), is sampled from /proc, which only exists on Linux. Elsewhere the limits
+that can't be applied are reported and no usage is shown.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from bdfrg.input_configuration import IoPriorityClass, ResourceConfiguration
+
+# How often the usage of a running job is sampled
+SAMPLE_INTERVAL_SECONDS = 2
+
+# The class numbers of the ionice utility
+_IONICE_CLASSES = {IoPriorityClass.BEST_EFFORT: '2', IoPriorityClass.IDLE: '3'}
+
+_PROC_DIRECTORY = '/proc'
+
+
+def apply_resource_limits(pid: int, resource_config: Optional[ResourceConfiguration]) -> List[str]:
+    """
+    Apply the configured limits to a running process. Threads and children started afterwards inherit them.
+    :param pid: The process
+    :param resource_config: The limits, nothing is applied if None
+    :return: Warnings for the limits that could not be applied, empty if all were applied
+    """
+    if resource_config is None:
+        return []
+    warnings = []
+
+    if resource_config.nice:
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + resource_config.nice)
+        except (AttributeError, OSError) as e:
+            warnings.append(f'Could not set niceness: {e}')
+
+    if resource_config.io_priority_class is not IoPriorityClass.DEFAULT or resource_config.io_priority is not None:
+        warning = _set_io_priority(pid, resource_config)
+        if warning:
+            warnings.append(warning)
+
+    limits = {}
+    if resource_config.max_memory_mb is not None:
+        # The address space, the resident memory of a process is not limited by Linux
+        limits['RLIMIT_AS'] = resource_config.max_memory_mb * 1024 * 1024
+    if resource_config.max_open_files is not None:
+        limits['RLIMIT_NOFILE'] = resource_config.max_open_files
+    if limits:
+        try:
+            # Not available on Windows
+            import resource
+        except ImportError:
+            return warnings + ['Memory and open file limits are not supported on this system']
+        for name, limit in limits.items():
+            try:
+                hard_limit = resource.prlimit(pid, getattr(resource, name))[1]
+                if hard_limit != resource.RLIM_INFINITY:
+                    limit = min(limit, hard_limit)
+                resource.prlimit(pid, getattr(resource, name), (limit, hard_limit))
+            except (AttributeError, OSError, ValueError) as e:
+                warnings.append(f'Could not set {name}: {e}')
+
+    return warnings
+
+
+def _set_io_priority(pid: int, resource_config: ResourceConfiguration) -> Optional[str]:
+    # Python has no binding of ioprio_set, the ionice utility of util-linux is used
+    executable = shutil.which('ionice')
+    if executable is None:
+        return 'Could not set the I/O priority: ionice was not found'
+
+    io_class = resource_config.io_priority_class
+    if io_class is IoPriorityClass.DEFAULT:
+        # A level without class is a level of the best effort class, like for ionice itself
+        io_class = IoPriorityClass.BEST_EFFORT
+    command = [executable, '-c', _IONICE_CLASSES[io_class], '-p', str(pid)]
+    if io_class is IoPriorityClass.BEST_EFFORT and resource_config.io_priority is not None:
+        command[3:3] = ['-n', str(resource_config.io_priority)]
+
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True)
+    if result.returncode != 0:
+        return f'Could not set the I/O priority: {result.stderr.strip()}'
+    return None
+
+
+@dataclass
+class ResourceUsage:
+    # Cores used, 1.0 is one core fully used
+    cpu: float
+    rss_bytes: int
+    read_bytes_per_second: float
+    written_bytes_per_second: float
+    process_count: int
+
+    def summary(self) -> str:
+        return f'CPU {self.cpu:.0%}, {self.rss_bytes / 1e6:.0f} MB RSS, ' \
+               f'disk {self.read_bytes_per_second / 1e6:.1f} MB/s read, ' \
+               f'{self.written_bytes_per_second / 1e6:.1f} MB/s written, {self.process_count} processes'
+
+
+@dataclass
+class ResourceTotals:
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    read_bytes: int = 0
+    written_bytes: int = 0
+
+    def summary(self) -> str:
+        return f'{self.cpu_seconds:.1f}s CPU, {self.peak_rss_bytes / 1e6:.0f} MB peak RSS, ' \
+               f'{self.read_bytes / 1e6:.1f} MB read, {self.written_bytes / 1e6:.1f} MB written'
+
+
+def _read_stat(pid: int):
+    """
+    Read the counters of a single process.
+    :return: (parent pid, CPU ticks, resident pages), None if the process is gone
+    """
+    try:
+        with open(f'{_PROC_DIRECTORY}/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The name in parentheses may contain spaces, the fields after it are split
+    values = stat[stat.rfind(b')') + 2:].split()
+    # The CPU time of the process and of its children that exited and were waited for
+    ticks = int(values[11]) + int(values[12]) + int(values[13]) + int(values[14])
+    return int(values[1]), ticks, int(values[21])
+
+
+def _read_io(pid: int):
+    """
+    Read the bytes a process and its children that exited and were waited for read from and wrote to disk.
+    :return: (read bytes, written bytes), zeros if not readable (processes of other users)
+    """
+    read_bytes = written_bytes = 0
+    try:
+        with open(f'{_PROC_DIRECTORY}/{pid}/io', 'rb') as f:
+            for line in f:
+                if line.startswith(b'read_bytes:'):
+                    read_bytes = int(line[11:])
+                elif line.startswith(b'write_bytes:'):
+                    written_bytes = int(line[12:])
+    except OSError:
+        pass
+    return read_bytes, written_bytes
+
+
+class ResourceMonitor:
+    """
+    Samples the resource usage of a process and its children from /proc.
+
+    The counters of the processes are summed up, rates are computed between two samples. A child that exited is
+    accounted to its parent by the kernel once it was waited for, so the totals do not drop when e.g. an ffmpeg
+    process finishes.
+
+    :param pid: The process to monitor.
+    :type pid: int
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.available = os.path.isdir(f'{_PROC_DIRECTORY}/{pid}')
+        self.usage: Optional[ResourceUsage] = None
+        self.totals = ResourceTotals()
+        self.last_sample_time = None
+        self.ticks_per_second = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def _find_processes(self) -> Dict[int, tuple]:
+        """
+        Find the process and its descendants.
+        :return: (parent pid, CPU ticks, resident pages) by pid, empty if the process is gone
+        """
+        root = _read_stat(self.pid)
+        if root is None:
+            return {}
+
+        children = {}
+        for name in os.listdir(_PROC_DIRECTORY):
+            if name.isdigit() and int(name) != self.pid:
+                values = _read_stat(int(name))
+                if values is not None:
+                    children.setdefault(values[0], []).append((int(name), values))
+
+        processes = {self.pid: root}
+        pending = [self.pid]
+        while pending:
+            for pid, values in children.get(pending.pop(), []):
+                processes[pid] = values
+                pending.append(pid)
+        return processes
+
+    def sample(self) -> Optional[ResourceUsage]:
+        """
+        Take a sample.
+        :return: The usage since the previous sample, None for the first sample or if /proc is not available
+        """
+        if not self.available:
+            return None
+        now = time.monotonic()
+        processes = self._find_processes()
+        if not processes:
+            return self.usage
+
+        ticks = sum(values[1] for values in processes.values())
+        rss_bytes = sum(values[2] for values in processes.values()) * self.page_size
+        read_bytes = written_bytes = 0
+        for pid in processes:
+            process_read_bytes, process_written_bytes = _read_io(pid)
+            read_bytes += process_read_bytes
+            written_bytes += process_written_bytes
+
+        previous = self.totals
+        # A child exiting without being waited for takes its counters with it, the totals never decrease
+        self.totals = ResourceTotals(max(previous.cpu_seconds, ticks / self.ticks_per_second),
+                                     max(previous.peak_rss_bytes, rss_bytes), max(previous.read_bytes, read_bytes),
+                                     max(previous.written_bytes, written_bytes))
+        if self.last_sample_time is not None:
+            seconds = max(now - self.last_sample_time, 1e-3)
+            self.usage = ResourceUsage((self.totals.cpu_seconds - previous.cpu_seconds) / seconds, rss_bytes,
+                                       (self.totals.read_bytes - previous.read_bytes) / seconds,
+                                       (self.totals.written_bytes - previous.written_bytes) / seconds,
+                                       len(processes))
+        self.last_sample_time = now
+        return self.usage
+
+    def start(self):
+        """
+        Sample every SAMPLE_INTERVAL_SECONDS in a background thread, until stopped.
+        :return: None
+        """
+        if self.available:
+            self.sample()
+            self.thread = threading.Thread(target=self._sample_periodically, daemon=True)
+            self.thread.start()
+
+    def _sample_periodically(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL_SECONDS):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
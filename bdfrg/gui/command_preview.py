@@ -0,0 +1,160 @@
+import tkinter as tk
+from typing import Optional, Tuple
+
+from bdfrg.id_set import SPILL_THRESHOLD
+from bdfrg.input_configuration import InputConfiguration, get_serialized_fields, serialize_field
+from bdfrg.instrumentation import timed
+
+# List fields with more values are left out of the preview and summarized in a note below the command. Serializing
+# and showing such a list on every edit would take time proportional to its size.
+PREVIEW_LIST_LIMIT = 100
+
+# Mark at the start of the notes below the command
+NOTES_MARK = 'notes'
+
+
+class CommandPreview:
+    """
+    Renders the serialized command of a configuration into a Text widget and keeps it up to date incrementally.
+
+    The serialized fragment of every field is cached. When a field changes only its fragment is serialized again and
+    only the region of the widget holding that fragment is replaced, the rest of the text is left untouched. The start
+    of every region is kept as a Tk mark, so a region is found without counting the text in front of it.
+    Fields that are not shown in the command, e.g. long lists, are summarized in shell comments below the command.
+
+    :param text_widget: The widget to render the command into, it is disabled and only enabled while patched.
+    :type text_widget: tk.Text
+    :param input_configuration: The configuration to render.
+    :type input_configuration: InputConfiguration
+    """
+
+    def __init__(self, text_widget: tk.Text, input_configuration: InputConfiguration):
+        self.text_widget = text_widget
+        self.text_widget.config(state=tk.DISABLED)
+        self.input_configuration = input_configuration
+        # (configuration, field_name) pairs in command order and the index of each pair (by configuration id)
+        self.serialized_fields = []
+        self.field_indices = {}
+        # Cached text of every field as shown in the widget, i.e. the fragment with a trailing separator or ''
+        self.pieces = []
+        # Notes of the fields left out of the command, by index
+        self.notes = {}
+        # Indices of the fields that changed since the last refresh
+        self.dirty_indices = set()
+
+    @timed('command_preview_render')
+    def render(self):
+        """
+        Serialize all fields and replace the content of the widget.
+        :return: None
+        """
+        self.serialized_fields = get_serialized_fields(self.input_configuration)
+        self.field_indices = {(id(configuration), field_name): index
+                              for index, (configuration, field_name) in enumerate(self.serialized_fields)}
+        self.pieces = []
+        self.notes = {}
+        for index, (configuration, field_name) in enumerate(self.serialized_fields):
+            piece, note = self.serialize_piece(configuration, field_name)
+            self.pieces.append(piece)
+            if note:
+                self.notes[index] = note
+        self.dirty_indices.clear()
+
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete(1.0, tk.END)
+        self.text_widget.mark_unset(*[mark for mark in self.text_widget.mark_names() if mark.startswith('field')])
+        for index, piece in enumerate(self.pieces):
+            self.text_widget.mark_set(self.get_mark(index), 'end-1c')
+            # Left gravity, the mark stays in front of the text inserted at it
+            self.text_widget.mark_gravity(self.get_mark(index), tk.LEFT)
+            self.text_widget.insert('end-1c', piece)
+        self.text_widget.mark_set(NOTES_MARK, 'end-1c')
+        self.text_widget.mark_gravity(NOTES_MARK, tk.LEFT)
+        self.show_notes()
+        self.text_widget.config(state=tk.DISABLED)
+
+    @staticmethod
+    def serialize_piece(configuration, field_name: str) -> Tuple[str, Optional[str]]:
+        """
+        Serialize a field for the preview.
+        :param configuration: The configuration dataclass the field belongs to
+        :param field_name: The name of the field
+        :return: The text shown in the command and a note if the field is left out of the command, else None
+        """
+        value = getattr(configuration, field_name)
+        if field_name == 'exclude_id' and len(value or []) > SPILL_THRESHOLD:
+            # Passed as generated ID file when the job is started, see consolidate_id_options. The file does not exist
+            # yet, so the option is named in the note instead of a made up path in the command.
+            return '', f'exclude_id: {len(value)} IDs, passed as a generated --exclude-id-file when the job is started'
+        if isinstance(value, list) and len(value) > PREVIEW_LIST_LIMIT:
+            return '', f'{field_name}: {len(value)} values, not shown in the preview'
+
+        fragment = serialize_field(configuration, field_name)
+        return fragment + ' ' if fragment else '', None
+
+    def show_notes(self):
+        """
+        Replace the notes below the command, as shell comments so that copying the whole text still works.
+        :return: None
+        """
+        notes_text = ''.join(f'\n# {self.notes[index]}' for index in sorted(self.notes))
+        self.text_widget.delete(NOTES_MARK, 'end-1c')
+        self.text_widget.insert(NOTES_MARK, notes_text)
+
+    def get_mark(self, index: int) -> str:
+        return f'field{index}' if index < len(self.pieces) else NOTES_MARK
+
+    def invalidate(self, configuration, field_name: str):
+        """
+        Mark a field as changed, its fragment is serialized again on the next refresh.
+        :param configuration: The configuration dataclass the field belongs to
+        :param field_name: The name of the changed field
+        :return: None
+        """
+        index = self.field_indices.get((id(configuration), field_name))
+        if index is not None:
+            self.dirty_indices.add(index)
+
+    @timed('command_preview_refresh')
+    def refresh(self):
+        """
+        Serialize the changed fields and patch their regions of the widget.
+        :return: None
+        """
+        notes_changed = False
+        self.text_widget.config(state=tk.NORMAL)
+
+        for index in self.dirty_indices:
+            configuration, field_name = self.serialized_fields[index]
+            old_piece = self.pieces[index]
+            new_piece, note = self.serialize_piece(configuration, field_name)
+
+            if note != self.notes.get(index):
+                if note:
+                    self.notes[index] = note
+                else:
+                    del self.notes[index]
+                notes_changed = True
+
+            if new_piece == old_piece:
+                continue
+
+            mark = self.get_mark(index)
+            self.text_widget.delete(mark, self.get_mark(index + 1))
+            self.text_widget.insert(mark, new_piece)
+            self.pieces[index] = new_piece
+
+            # The marks of the following empty regions and of the next shown one were at the insert position and stayed
+            # in front of the new text
+            next_index = index + 1
+            while True:
+                self.text_widget.mark_set(self.get_mark(next_index), f'{mark} + {len(new_piece)} chars')
+                if next_index == len(self.pieces) or self.pieces[next_index]:
+                    break
+                next_index += 1
+
+        if notes_changed:
+            self.show_notes()
+
+        self.text_widget.config(state=tk.DISABLED)
+        self.dirty_indices.clear()
@@ -1,40 +1,80 @@
-import json
+import dataclasses
 import os
+import sqlite3
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import fields
 from enum import Enum
-from tkinter import messagebox
+from tkinter import filedialog, messagebox, simpledialog, ttk
 from typing import List
 
-import tkinter_utils
 from bdfrg import type_utils
-from bdfrg.input_configuration import InputConfiguration, serialize_input_configuration
+from bdfrg.configuration_profiles import ProfileStore
+from bdfrg.dedupe import DedupeEngine, DedupeReport, HashCache
+from bdfrg.execution.checkpoint import CheckpointJournal, resume_configuration
+from bdfrg.execution.job_runner import JobRunner, OutputStream, build_command
+from bdfrg.execution.progress import ProgressTracker, format_snapshot
+from bdfrg.execution.rate_budget import BudgetLease, RateBudget, get_target_count
+from bdfrg.gui import tkinter_utils
+from bdfrg.gui.command_preview import CommandPreview
+from bdfrg.gui.default_entry import DefaultEntry
+from bdfrg.gui.field_metadata import get_field_formatting
+from bdfrg.gui.id_set_field import IdSetField
+from bdfrg.gui.latency_panel import EventLoopMonitor, LatencyPanel
+from bdfrg.gui.list_field_sync import ListFieldSync
+from bdfrg.gui.log_view import LogView
+from bdfrg.gui.tooltip import create_tooltip
+from bdfrg.id_set import IdSet
+from bdfrg.input_configuration import InputConfiguration
+from bdfrg.instrumentation import recorder, timed
 from bdfrg.reddit import reddit_utils
-from bdfrg.reddit.reddit_utils import RedditUrlType
-from default_entry import DefaultEntry
-from tooltip import create_tooltip
+from bdfrg.reddit.reddit_utils import RedditUrl
+from bdfrg.reddit.url_import import URL_TYPE_FIELDS, UrlImportResult, classify_urls, classify_urls_from_file
+from bdfrg.scheme_analysis import analyze_configuration
 
-current_directory_path = os.path.dirname(os.path.realpath(__file__))
+# How often the output of a running job is polled and how many lines are inserted per poll at most.
+# Keeps the time spent per frame well below 50ms even if the job prints thousands of lines per second.
+JOB_OUTPUT_POLL_INTERVAL_MS = 50
+JOB_OUTPUT_MAX_LINES_PER_POLL = 500
 
-field_formatting = {}
+# How often the progress dashboard of a running job is redrawn, independent of how much output the job produces
+DASHBOARD_REFRESH_MS = 500
 
-fields_folder = os.path.join(os.path.join(current_directory_path, 'fields'))
+# How often the admission of a job to the API budget is checked for. The budget database is only used from
+# background threads, another process holding it must not freeze the window.
+BUDGET_POLL_INTERVAL_MS = 100
 
-# Load tooltips from directory (gui/tooltips)
-for file in os.listdir(fields_folder):
-    # Only txt files
-    if file.endswith('.json'):
-        with open(os.path.join(fields_folder, file)) as f:
-            # Load json
-            field_format = json.load(f)
-            field_formatting[field_format['name']] = field_format
+# How often a running deduplication is checked for completion
+DEDUPE_POLL_INTERVAL_MS = 200
+
+# Delay before the command preview is updated after a change, changes within this window are coalesced
+PREVIEW_DEBOUNCE_MS = 100
+
+# Delay before the scheme preview is updated after a change, longer than the command preview as it expands the
+# schemes for a whole sample of posts
+SCHEME_PREVIEW_DEBOUNCE_MS = 150
+
+# Fields changing the paths of the downloaded files or the expected number of posts, see scheme_analysis
+SCHEME_PREVIEW_FIELDS = {'directory', 'file_scheme', 'folder_scheme', 'filename_restriction_scheme', 'time_format',
+                         'subreddit', 'user', 'multireddit', 'link', 'limit'}
+
+# List fields holding post IDs, shown as IdSetField instead of a Text widget
+ID_SET_FIELDS = {'exclude_id'}
+
+# Set BDFRG_MEASURE_STARTUP=1 to print the time from start until the window is shown
+startup_time = time.perf_counter()
+
+# Set BDFRG_LATENCY_DUMP to a file name to write the latencies of the GUI callbacks to it when the window is closed
+LATENCY_DUMP_VARIABLE = 'BDFRG_LATENCY_DUMP'
 
 
 class VariableWrapper:
     """
     A wrapper class for Tkinter variables that provides additional functionality.
 
-    :param variable: The Tkinter variable to wrap.
+    :param variable: The Tkinter variable to wrap, None for list fields (see ListFieldSync).
     :type variable: tk.Variable
     :param field_name: The name of the field that this variable represents.
     :type field_name: str
@@ -108,8 +148,36 @@ class ConfigurationGUI(tk.Frame):
         self.input_configuration = input_configuration
         # Stores the field variables by field_var name (e.g PYVAR1 -> VariableWrapper)
         self.variables: dict = {}
+        # Stores the field variables by configuration field name (e.g subreddit -> VariableWrapper)
+        self.field_variables: dict = {}
         self.serialized_config = None
+        self.command_preview: CommandPreview = None
+        self.preview_update_job = None
+        self.scheme_preview_variable: tk.StringVar = None
+        self.scheme_preview_job = None
         self.popup = None
+        self.job_output = None
+        self.job_runner: JobRunner = None
+        self.progress_tracker: ProgressTracker = None
+        self.checkpoint_journal: CheckpointJournal = None
+        self.rate_budget: RateBudget = None
+        self.budget_lease: BudgetLease = None
+        # Waits for the admission of the job, returns its lease or None if cancelled
+        self.budget_future: Future = None
+        self.budget_cancelled: threading.Event = None
+        # Reads the metrics and releases the leases, one database operation at a time
+        self.budget_executor = ThreadPoolExecutor(max_workers=1)
+        self.budget_metrics_future: Future = None
+        self.budget_summary = None
+        self.dashboard_variable: tk.StringVar = None
+        self.dashboard_job = None
+        self.dedupe_future: Future = None
+        self.sections: ttk.Notebook = None
+        # Configuration instances of the sections whose widgets have not been created yet, by section frame name
+        self.unbuilt_sections: dict = {}
+        self.profile_store = ProfileStore()
+        # Applies the edits of the Text widgets of list fields to the configuration, batched on the idle loop
+        self.list_field_sync = ListFieldSync(self, self.set_configuration_value_and_update)
 
         self.grid()
         self.columnconfigure(0, weight=1)
@@ -126,6 +194,19 @@ class ConfigurationGUI(tk.Frame):
 
         self.create_widgets()
 
+        # Measured continuously, shown in the latency panel opened with Ctrl+Shift+D
+        self.latency_panel: LatencyPanel = None
+        EventLoopMonitor(self).start()
+        self.winfo_toplevel().bind('<Control-Shift-D>', lambda event: self.show_latency_panel())
+
+    def get_latency_counters(self) -> dict:
+        return {'list_field_sync': self.list_field_sync.report()}
+
+    def show_latency_panel(self):
+        if self.latency_panel is None or not self.latency_panel.winfo_exists():
+            self.latency_panel = LatencyPanel(self, self.get_latency_counters)
+        self.latency_panel.lift()
+
     def get_widget_by_name(self, widget_name: str) -> tk.Widget:
         """
         Get a widget by its name.
@@ -135,9 +216,13 @@ class ConfigurationGUI(tk.Frame):
         return self.nametowidget(widget_name)
 
     def get_variable_for_configuration_field(self, field_name: str) -> VariableWrapper:
-        for pyvar, variable_wrapper in self.variables.items():
-            if variable_wrapper.field_name == field_name:
-                return variable_wrapper
+        if field_name not in self.field_variables:
+            # The widgets of the field may not have been created yet
+            for section_name, instance in list(self.unbuilt_sections.items()):
+                if field_name in type_utils.get_field_types_of_dataclass(type(instance)):
+                    self.build_section(section_name)
+
+        return self.field_variables.get(field_name)
 
     # We need this intermediate function because the validate command only passes through strings, not the actual field type
     def validate_integer(self, new_text: str, old_text: str, widget_name: str) -> bool:
@@ -169,6 +254,7 @@ class ConfigurationGUI(tk.Frame):
         """
         return validate_input(new_text, old_text, float, self.get_widget_by_name(widget_name))
 
+    @timed('on_var_write_trace')
     def on_var_write_trace(self, *args):
         """
         This function is called when a variable is written to. It updates the configuration dataclass with the new value.
@@ -187,16 +273,13 @@ class ConfigurationGUI(tk.Frame):
 
         self.set_configuration_value_and_update(variable.parent_object, variable.field_name, variable.get())
 
-    def create_grid_section(self, headline, column):
-        # Create a new grid in the first column
-        grid = tk.Frame(self, highlightbackground="#ded9d9", highlightthickness=2)
+    def create_grid_section(self, headline):
+        # Create a new grid, shown as a tab of the sections notebook
+        grid = tk.Frame(self.sections, highlightbackground="#ded9d9", highlightthickness=2)
         # Give it two columns
         grid.columnconfigure(0, weight=1)
         grid.columnconfigure(1, weight=1)
 
-        # Place it in the first column
-        grid.grid(row=0, column=column, sticky=tk.N + tk.S + tk.E + tk.W)
-
         # Create headline label
         headline = tk.Label(grid, text=headline)
         headline.config(font=('Arial', 15), bg='#ded9d9')
@@ -208,40 +291,429 @@ class ConfigurationGUI(tk.Frame):
 
         return grid
 
-    def create_widgets(self):
-        grid = self.create_grid_section('Input Configuration', 0)
-
-        # Create widgets for the input configuration
-        row, column = self.create_widgets_for_class(grid, self.input_configuration, 4, 0)
-
-        grid = self.create_grid_section('Downloader Configuration', 1)
-
-        # Create widgets for downloader configuration
-        row, column = self.create_widgets_for_class(grid, self.input_configuration.download_config, 4, 0)
+    def build_section(self, section_name: str):
+        """
+        Create the widgets of a section, if they have not been created yet.
+        :param section_name: The name of the frame of the section
+        :return: None
+        """
+        instance = self.unbuilt_sections.pop(section_name, None)
+        if instance is not None:
+            self.create_widgets_for_class(self.nametowidget(section_name), instance, 4, 0)
 
-        grid = self.create_grid_section('Archiver Configuration', 2)
+    def on_section_changed(self, event):
+        """
+        Create the widgets of a section the first time it is shown.
+        :param event: The event
+        :return: None
+        """
+        self.build_section(self.sections.select())
 
-        # Create widgets for archiver configuration
-        row, column = self.create_widgets_for_class(grid, self.input_configuration.archiver_config, 4, 0)
+    def create_widgets(self):
+        # The configuration sections are tabs, the widgets of a tab are only created once it is shown
+        self.sections = ttk.Notebook(self)
+        self.sections.grid(row=0, column=0, columnspan=3, sticky=tk.N + tk.S + tk.E + tk.W)
+
+        for headline, instance in (('Input Configuration', self.input_configuration),
+                                   ('Downloader Configuration', self.input_configuration.download_config),
+                                   ('Archiver Configuration', self.input_configuration.archiver_config),
+                                   ('Resource Limits', self.input_configuration.resource_config)):
+            grid = self.create_grid_section(headline)
+            self.sections.add(grid, text=headline)
+            self.unbuilt_sections[str(grid)] = instance
+
+        # Only the first tab is visible at start
+        self.build_section(self.sections.select())
+        self.sections.bind('<<NotebookTabChanged>>', self.on_section_changed)
 
         # Create headline label
         headline = tk.Label(self, text='Output Preview')
         headline.config(font=('Arial', 15), bg='#ded9d9')
         headline.grid(row=1, column=0, rowspan=3, columnspan=4, sticky=tk.N + tk.S + tk.E + tk.W)
 
+        # Example path and fan-out of the file and folder scheme
+        self.scheme_preview_variable = tk.StringVar()
+        scheme_preview = tk.Label(self, textvariable=self.scheme_preview_variable, anchor=tk.W, justify=tk.LEFT)
+        scheme_preview.grid(row=4, column=0, columnspan=4, sticky=tk.E + tk.W)
+        self.schedule_scheme_preview_update()
+
         # Add the serialized configuration to the gui as a textbonx on the right
         self.serialized_config = serialized_config = tk.Text(self)
         serialized_config.config(height=10, width=50)
         serialized_config.grid(row=5, column=0, columnspan=4, sticky=tk.N + tk.S + tk.E + tk.W)
-        serialized_config.insert(tk.END, serialize_input_configuration(self.input_configuration))
+        self.command_preview = CommandPreview(serialized_config, self.input_configuration)
+        self.command_preview.render()
 
         # Bottom padding before toolbar
         self.rowconfigure(6, pad=10)
 
-        add_button = tk.Button(self, text="+", fg="green", command=self.on_add_link_press)
+        toolbar = tk.Frame(self)
+        toolbar.grid(row=6, column=0, columnspan=3, sticky=tk.E + tk.W)
+
+        add_button = tk.Button(toolbar, text="+", fg="green", command=self.on_add_link_press)
         # Font size for +
         add_button.config(font=('Arial', 20))
-        add_button.grid(row=6, column=0, sticky=tk.W)
+        add_button.pack(side=tk.LEFT)
+
+        save_profile_button = tk.Button(toolbar, text="Save profile...", command=self.on_save_profile_press)
+        save_profile_button.pack(side=tk.LEFT)
+
+        load_profile_button = tk.Button(toolbar, text="Load profile...", command=self.on_load_profile_press)
+        load_profile_button.pack(side=tk.LEFT)
+
+        dedupe_button = tk.Button(toolbar, text="Deduplicate...", command=self.on_dedupe_press)
+        dedupe_button.pack(side=tk.LEFT)
+
+        stop_button = tk.Button(toolbar, text="Stop", fg="red", command=self.on_stop_press)
+        stop_button.pack(side=tk.RIGHT)
+
+        run_button = tk.Button(toolbar, text="Run", fg="green", command=self.on_run_press)
+        run_button.pack(side=tk.RIGHT)
+
+        # Progress of the running job, redrawn at a fixed rate
+        self.dashboard_variable = tk.StringVar()
+        dashboard = tk.Label(self, textvariable=self.dashboard_variable, anchor=tk.W, justify=tk.LEFT)
+        dashboard.grid(row=7, column=0, columnspan=4, sticky=tk.E + tk.W)
+
+        # Output of the running job, only the visible lines are held by Tk
+        self.job_output = job_output = LogView(self)
+        job_output.grid(row=8, column=0, columnspan=4, sticky=tk.N + tk.S + tk.E + tk.W)
+
+    def on_run_press(self):
+        """
+        Start BDFR with the current configuration and begin polling its output.
+        :return: None
+        """
+        if self.job_runner is not None and self.job_runner.is_running() or self.budget_future is not None:
+            messagebox.showerror("Error", "A job is already running")
+            return
+
+        self.list_field_sync.flush()
+
+        # The posts completed by an interrupted run of the same configuration are skipped
+        journal = CheckpointJournal.for_configuration(self.input_configuration)
+        input_config = self.input_configuration
+        completed_ids = journal.load()
+        if completed_ids:
+            if messagebox.askyesno("Resume", f"A previous run of this configuration was interrupted after "
+                                             f"{len(completed_ids)} posts. Skip these posts?"):
+                input_config = resume_configuration(input_config, completed_ids)
+            else:
+                journal.discard()
+
+        # Other jobs of this and other bdfrg processes share the API budget, the job may have to wait for its turn
+        target_count = get_target_count(input_config)
+        cancelled = self.budget_cancelled = threading.Event()
+
+        def admit() -> BudgetLease:
+            if self.rate_budget is None:
+                self.rate_budget = RateBudget()
+            lease = BudgetLease(self.rate_budget, 'GUI', 'download', target_count)
+            if not lease.wait(cancelled):
+                lease.release()
+                return None
+            return lease
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.budget_future = executor.submit(admit)
+        executor.shutdown(wait=False)
+        self.job_output.clear()
+        self.after(BUDGET_POLL_INTERVAL_MS, self.wait_for_budget, input_config, journal)
+
+    def wait_for_budget(self, input_config: InputConfiguration, journal: CheckpointJournal, announced: bool = False):
+        if not self.budget_future.done():
+            if not announced:
+                self.job_output.append_lines([('Waiting for the API budget shared with the other running jobs',
+                                               False)])
+            self.after(BUDGET_POLL_INTERVAL_MS, self.wait_for_budget, input_config, journal, True)
+            return
+
+        future, self.budget_future = self.budget_future, None
+        try:
+            lease = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", e)
+            return
+        if lease is not None and self.budget_cancelled.is_set():
+            # Stopped right when the job was admitted
+            self.release_budget_lease(lease)
+            lease = None
+        if lease is None:
+            self.job_output.append_lines([('Cancelled', False)])
+            return
+
+        self.budget_lease = lease
+        self.start_job(input_config, journal)
+
+    def release_budget_lease(self, lease: BudgetLease):
+        # Reports the last requests to the database, off the UI thread
+        self.budget_executor.submit(lease.release)
+
+    def start_job(self, input_config: InputConfiguration, journal: CheckpointJournal):
+        """
+        Start BDFR once the budget leaves room for it.
+        :param input_config: The configuration to run, including the exclusions of a resumed run
+        :param journal: The checkpoint journal of the configuration
+        :return: None
+        """
+        try:
+            self.job_runner = JobRunner(build_command(input_config), input_config.resource_config)
+            self.job_runner.start()
+            journal.open()
+        except Exception as e:
+            if self.job_runner is not None:
+                self.job_runner.stop()
+                if self.job_runner.resource_monitor is not None:
+                    self.job_runner.resource_monitor.stop()
+            self.job_runner = None
+            self.release_budget_lease(self.budget_lease)
+            self.budget_lease = None
+            messagebox.showerror("Error", e)
+            return
+        self.checkpoint_journal = journal
+
+        self.job_output.append_lines([(' '.join(self.job_runner.command), False)])
+
+        if self.progress_tracker is not None:
+            self.progress_tracker.stop()
+        self.progress_tracker = ProgressTracker.for_configuration(self.input_configuration)
+
+        self.after(JOB_OUTPUT_POLL_INTERVAL_MS, self.poll_job_output)
+        # A redraw of the previous job may still be scheduled
+        if self.dashboard_job is not None:
+            self.after_cancel(self.dashboard_job)
+        self.dashboard_job = self.after(DASHBOARD_REFRESH_MS, self.update_dashboard)
+
+    def on_stop_press(self):
+        if self.budget_future is not None:
+            # The admission stops waiting within a second, wait_for_budget reports the cancellation
+            self.budget_cancelled.set()
+        elif self.job_runner is not None:
+            self.job_runner.stop()
+
+    def poll_job_output(self):
+        """
+        Move pending output of the running job into the output widget. Reschedules itself until the job is finished.
+        :return: None
+        """
+        job_runner = self.job_runner
+        if job_runner is None:
+            return
+
+        lines = job_runner.drain(JOB_OUTPUT_MAX_LINES_PER_POLL)
+
+        # Only counts the lines, the dashboard is redrawn by update_dashboard
+        feed = self.progress_tracker.feed
+        record = self.checkpoint_journal.feed
+        count_requests = self.budget_lease.feed
+        for _, line in lines:
+            feed(line)
+            record(line)
+            count_requests(line)
+        self.checkpoint_journal.sync()
+
+        if lines:
+            self.job_output.append_lines([(line, stream is OutputStream.STDERR) for stream, line in lines])
+
+        if job_runner.is_finished():
+            self.job_output.append_lines([(f'Job exited with code {job_runner.return_code}', False)])
+
+            # A failed or stopped job is resumed from the journal on the next run
+            if job_runner.return_code == 0:
+                self.checkpoint_journal.discard()
+            else:
+                self.checkpoint_journal.close()
+            self.release_budget_lease(self.budget_lease)
+            self.budget_lease = None
+            resource_monitor = job_runner.resource_monitor
+            resource_monitor.stop()
+            if resource_monitor.available:
+                self.job_output.append_lines([(f'Resources: {resource_monitor.totals.summary()}', False)])
+
+            # Show the final counts right away, including the lines of this poll
+            self.progress_tracker.stop()
+            if self.dashboard_job is not None:
+                self.after_cancel(self.dashboard_job)
+            self.update_dashboard()
+            return
+
+        self.after(JOB_OUTPUT_POLL_INTERVAL_MS, self.poll_job_output)
+
+    def update_dashboard(self):
+        """
+        Redraw the progress of the running job. Reschedules itself until the job is finished, the final state stays
+        visible afterwards.
+        :return: None
+        """
+        self.dashboard_job = None
+        text = format_snapshot(self.progress_tracker.snapshot())
+        resource_usage = self.job_runner.resource_monitor.usage
+        if resource_usage is not None:
+            text += f'\nResources: {resource_usage.summary()}'
+        text += self.update_budget_summary()
+        self.dashboard_variable.set(text)
+
+        if not self.job_runner.is_finished():
+            self.dashboard_job = self.after(DASHBOARD_REFRESH_MS, self.update_dashboard)
+
+    def update_budget_summary(self) -> str:
+        """
+        Collect the metrics of the API budget read in the background and start the next read.
+        :return: The line of the dashboard showing the most recent metrics, empty until they were read once
+        """
+        future = self.budget_metrics_future
+        if future is not None and future.done():
+            self.budget_metrics_future = None
+            try:
+                self.budget_summary = future.result().summary()
+            except sqlite3.Error:
+                # The database could not be read, shown with the next refresh
+                pass
+        if self.budget_metrics_future is None and self.rate_budget is not None:
+            self.budget_metrics_future = self.budget_executor.submit(self.rate_budget.metrics)
+
+        return f'\nAPI budget: {self.budget_summary}' if self.budget_summary else ''
+
+    def on_dedupe_press(self):
+        """
+        Replace duplicate files in the download directory with hard links, in a background thread.
+        :return: None
+        """
+        directory = self.input_configuration.directory
+        if not directory:
+            messagebox.showerror("Error", "Set the download directory first")
+            return
+        if self.dedupe_future is not None:
+            messagebox.showerror("Error", "A deduplication is already running")
+            return
+        if not messagebox.askyesno("Deduplicate", f"Replace duplicate files in {directory} with hard links?"):
+            return
+
+        def run() -> DedupeReport:
+            # The SQLite connection of the cache can only be used by the thread that opened it
+            hash_cache = HashCache()
+            try:
+                return DedupeEngine(directory, hash_cache).run()
+            finally:
+                hash_cache.close()
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.dedupe_future = executor.submit(run)
+        executor.shutdown(wait=False)
+        self.dashboard_variable.set(f'Deduplicating {directory}...')
+        self.after(DEDUPE_POLL_INTERVAL_MS, self.poll_dedupe)
+
+    def poll_dedupe(self):
+        if not self.dedupe_future.done():
+            self.after(DEDUPE_POLL_INTERVAL_MS, self.poll_dedupe)
+            return
+
+        future, self.dedupe_future = self.dedupe_future, None
+        try:
+            summary = future.result().summary()
+        except Exception as e:
+            messagebox.showerror("Error", e)
+            return
+
+        self.dashboard_variable.set(summary)
+        messagebox.showinfo("Deduplicate", summary)
+
+    def on_save_profile_press(self):
+        name = simpledialog.askstring("Save profile", "Profile name:", parent=self)
+        if not name:
+            return
+
+        self.list_field_sync.flush()
+
+        try:
+            self.profile_store.save(name, self.input_configuration)
+        except Exception as e:
+            messagebox.showerror("Error", e)
+
+    def on_load_profile_press(self):
+        """
+        Open the profile browser, listing the saved profiles with their target and list sizes.
+        :return: None
+        """
+        self.popup = tk.Toplevel()
+        self.popup.title("Load profile")
+
+        # Only the summaries are read here, the profiles themselves are loaded when selected
+        summaries = self.profile_store.list_profiles()
+
+        profiles_list = tk.Listbox(self.popup, width=80, height=20)
+        profiles_list.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        for summary in summaries:
+            saved_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(summary.saved_at))
+            list_sizes = ', '.join(f'{field_name}: {count}' for field_name, count in summary.list_counts.items())
+            profiles_list.insert(tk.END, f'{summary.name} ({saved_at}) {list_sizes}')
+
+        def load_selected():
+            selection = profiles_list.curselection()
+            if selection:
+                self.load_profile(summaries[selection[0]].name)
+
+        load_button = tk.Button(self.popup, text="Load", command=load_selected)
+        load_button.pack(side=tk.LEFT)
+        profiles_list.bind('<Double-Button-1>', lambda event: load_selected())
+
+    def load_profile(self, name: str):
+        try:
+            loaded_configuration = self.profile_store.load(name)
+        except Exception as e:
+            messagebox.showerror("Error", e)
+            return
+
+        self.apply_configuration(loaded_configuration)
+        self.close_add_url_popup()
+
+    def apply_configuration(self, loaded_configuration: InputConfiguration):
+        """
+        Copy the values of a configuration into the current one and update all widgets.
+        The current configuration instances are kept, the variables of the widgets are bound to them.
+        :param loaded_configuration: The configuration to apply
+        :return: None
+        """
+        for configuration, loaded in ((self.input_configuration, loaded_configuration),
+                                      (self.input_configuration.download_config, loaded_configuration.download_config),
+                                      (self.input_configuration.archiver_config, loaded_configuration.archiver_config),
+                                      (self.input_configuration.resource_config, loaded_configuration.resource_config)):
+            for field_name, field_type in type_utils.get_field_types_of_dataclass(type(configuration)).items():
+                if dataclasses.is_dataclass(field_type):
+                    continue
+
+                value = getattr(loaded, field_name)
+                setattr(configuration, field_name, value)
+
+                variable_wrapper: VariableWrapper = self.field_variables.get(field_name)
+                if variable_wrapper is not None:
+                    self.update_widget_value(variable_wrapper, field_type, value)
+
+        self.command_preview.render()
+        self.schedule_scheme_preview_update()
+
+    def update_widget_value(self, variable_wrapper: VariableWrapper, field_type: type, value):
+        """
+        Show a value in the widget of a field.
+        :param variable_wrapper: The variable of the field
+        :param field_type: The type of the field
+        :param value: The value to show
+        :return: None
+        """
+        if isinstance(variable_wrapper.widget, IdSetField):
+            ids = IdSet(value or [])
+            variable_wrapper.widget.set_ids(ids)
+            setattr(variable_wrapper.parent_object, variable_wrapper.field_name, ids if len(ids) else None)
+        elif field_type == List[str]:
+            text = '\n'.join(value or [])
+            variable_wrapper.widget.delete('1.0', tk.END)
+            variable_wrapper.widget.insert('1.0', text)
+        elif isinstance(value, Enum):
+            variable_wrapper.variable.set(value.name)
+        elif field_type == bool:
+            variable_wrapper.variable.set(value)
+        else:
+            variable_wrapper.variable.set(value if value is not None else '')
 
     def on_add_link_press(self):
         self.popup = tk.Toplevel()
@@ -256,6 +728,86 @@ class ConfigurationGUI(tk.Frame):
         add_button = tk.Button(self.popup, text="Add", command=lambda: self.on_input_url(url_entry.get()))
         add_button.pack(side=tk.LEFT)
 
+        bulk_import_button = tk.Button(self.popup, text="Bulk import...", command=self.on_bulk_import_press)
+        bulk_import_button.pack(side=tk.LEFT)
+
+    def on_bulk_import_press(self):
+        """
+        Replace the add URL popup with a popup to import many URLs at once, pasted or from a file.
+        :return: None
+        """
+        self.close_add_url_popup()
+
+        self.popup = tk.Toplevel()
+        self.popup.title("Import URLs")
+
+        url_label = tk.Label(self.popup, text="URLs (one per line):")
+        url_label.pack(side=tk.TOP, anchor=tk.W)
+
+        urls_text = tk.Text(self.popup)
+        urls_text.config(height=20, width=80)
+        urls_text.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        import_button = tk.Button(self.popup, text="Import",
+                                  command=lambda: self.import_urls(classify_urls(
+                                      urls_text.get('1.0', tk.END).splitlines(), self.get_url_import_fields())))
+        import_button.pack(side=tk.LEFT)
+
+        load_file_button = tk.Button(self.popup, text="Import file...", command=self.on_import_url_file_press)
+        load_file_button.pack(side=tk.LEFT)
+
+    def on_import_url_file_press(self):
+        path = filedialog.askopenfilename(parent=self.popup, title="Import URLs",
+                                          filetypes=[("Text files", "*.txt"), ("All files", "*")])
+        if not path:
+            return
+
+        try:
+            # The file is classified line by line and never shown in a widget
+            self.import_urls(classify_urls_from_file(path, self.get_url_import_fields()))
+        except OSError as e:
+            messagebox.showerror("Error", e)
+
+    def get_url_import_fields(self) -> dict:
+        """
+        Get the current values of all fields URLs can be imported into.
+        :return: A dict of field name -> list of values
+        """
+        self.list_field_sync.flush()
+        return {field_name: getattr(self.input_configuration, field_name) or []
+                for field_name in set(URL_TYPE_FIELDS.values())}
+
+    @staticmethod
+    def append_lines(widget: tk.Text, text: str):
+        """
+        Append lines to a Text widget, starting a new line unless the last line is empty.
+        :param widget: The widget to append to
+        :param text: The lines to append
+        :return: None
+        """
+        # Only look at the last character, the Text widget always ends with an additional new line
+        last_character = widget.get('end-2c', 'end-1c')
+
+        if last_character and last_character != '\n':
+            text = '\n' + text
+
+        widget.insert(tk.END, text)
+
+    def import_urls(self, result: UrlImportResult):
+        """
+        Append classified URLs to their fields, updating each widget only once, and show a report of the import.
+        :param result: The classified URLs
+        :return: None
+        """
+        for field_name, values in result.targets.items():
+            variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field(field_name)
+
+            # Append all entries with a single insert, the list field sync picks up the new lines
+            self.append_lines(variable_wrapper.widget, '\n'.join(values))
+
+        self.close_add_url_popup()
+        messagebox.showinfo("Import", result.summary())
+
     def close_add_url_popup(self):
         # Close popup
         self.popup.destroy()
@@ -266,49 +818,29 @@ class ConfigurationGUI(tk.Frame):
         print(f"URL added: {url}")
 
         try:
-            url_type = reddit_utils.get_reddit_type_from_url(url)
-            self.add_url(url, url_type)
+            self.add_url(reddit_utils.parse_reddit_url(url))
             self.close_add_url_popup()
         except Exception as e:
             messagebox.showerror("Error", e)
 
-    def add_url(self, url: str, url_type: RedditUrlType):
+    def add_url(self, reddit_url: RedditUrl):
         try:
-            identifying_part = reddit_utils.get_identifying_part_of_reddit_url(url, url_type)
-
-            if url_type is RedditUrlType.SUBREDDIT:
-                # Append identifying part to widget
-                variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field('subreddit')
-            elif url_type is RedditUrlType.MULTIREDDIT:
-                # Append identifying part to widget
-                variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field('multireddit')
-            elif url_type is RedditUrlType.USER:
-                # Append identifying part to widget
-                variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field('user')
-            elif url_type is RedditUrlType.POST or url_type is RedditUrlType.COMMENT:
-                # Append identifying part to widget
-                variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field('link')
-            else:
-                raise Exception('Unsupported URL')
-
-            to_insert = identifying_part
-
-            var_val = variable_wrapper.variable.get()
+            identifying_part = reddit_url.identifier
 
-            # If empty, no new line at the start, but otherwise if we aren't in a blank new line append new line before new link
-            # None because the var is 'None' if initialized by None python type
-            if len(var_val) != 0 and var_val != 'None' and not var_val.endswith('\n'):
-                to_insert = '\n' + to_insert
+            if reddit_url.type not in URL_TYPE_FIELDS:
+                raise Exception('Unsupported URL')
 
-            # Add new row to the widget (tk.Text or tk.Entry)
-            variable_wrapper.widget.insert(tk.END, to_insert)
-            variable_wrapper.variable.set(identifying_part)
+            # Append identifying part to widget
+            variable_wrapper: VariableWrapper = self.get_variable_for_configuration_field(
+                URL_TYPE_FIELDS[reddit_url.type])
 
-            self.update_serialized_command_preview()
+            # Add new row to the widget, the list field sync applies it to the configuration
+            self.append_lines(variable_wrapper.widget, identifying_part)
         except Exception as e:
             messagebox.showerror("Error", e)
 
 
+    @timed('create_widgets_for_class')
     def create_widgets_for_class(self, parent, instance, start_row, start_column):
         row = start_row
         column = start_column
@@ -353,6 +885,8 @@ class ConfigurationGUI(tk.Frame):
         return row, column
 
     def create_widget_for_field(self, parent, field_name, type_val, instance):
+        field_formatting = get_field_formatting()
+
         # Create a label
         label = tk.Label(parent, text=field_name_to_label_name(field_name))
 
@@ -376,7 +910,7 @@ class ConfigurationGUI(tk.Frame):
             field_var.set(instance.__dict__[field_name] if instance.__dict__[field_name] else '')
 
             # Check if field name is in value_suggestions
-            if field_name in field_formatting and 'suggestion' in field_formatting[field_name]:
+            if 'suggestion' in field_formatting.get(field_name, {}):
                 # Create a text box with a default value
                 field_widget = DefaultEntry(parent, textvariable=field_var,
                                             default_text=field_formatting[field_name]['suggestion'])
@@ -400,19 +934,27 @@ class ConfigurationGUI(tk.Frame):
             # Make it only accept integers using the validate_input function as a callback for the text box
             validate_input_callback = (parent.register(self.validate_integer))
             field_widget.config(validate='key', validatecommand=(validate_input_callback, '%P', '%S', '%W'))
+        elif type_val == List[str] and field_name in ID_SET_FIELDS:
+            # Show count and sample only, the IDs are kept as compact IdSet in the configuration
+            ids = IdSet(instance.__dict__[field_name] or [])
+            field_widget = IdSetField(parent, ids, lambda new_ids: self.set_configuration_value_and_update(
+                instance, field_name, new_ids if len(new_ids) else None))
+
+            # Register without trace, the widget reports changes through its callback
+            self.variables[field_widget.summary_var._name] = self.field_variables[field_name] = VariableWrapper(
+                field_widget.summary_var, field_name, instance, field_widget)
         elif type_val == List[str]:
             # Create a variable bound to the field
-            field_var = list_var = tk.StringVar()
-            list_var.set(instance.__dict__[field_name])
-
             # Create a text box that accepts multiple lines
             field_widget = tk.Text(parent)
+            field_widget.insert('1.0', '\n'.join(instance.__dict__[field_name] or []))
 
             # Set width of widget
             field_widget.config(width=50)
 
-            # On change of the text box, update the variable
-            field_widget.bind('<KeyRelease>', lambda event: list_var.set(field_widget.get('1.0', tk.END)))
+            # Changes of the text box are applied to the configuration by the list field sync, not through a variable
+            self.list_field_sync.register(field_widget, instance, field_name)
+            self.field_variables[field_name] = VariableWrapper(None, field_name, instance, field_widget)
 
             # Rows shown default 3
             field_widget.config(height=3)
@@ -450,13 +992,16 @@ class ConfigurationGUI(tk.Frame):
             name = field_var._name
 
             # Track variables because of garbage collection and we need to find it in the trace callback
-            self.variables[name] = VariableWrapper(field_var, field_name, instance, field_widget)
-        if field_widget and field_name in field_formatting and 'tooltip' in field_formatting[field_name]:
-            # Create a tooltip
-            create_tooltip(field_widget, field_formatting[field_name]['tooltip'])
+            self.variables[name] = self.field_variables[field_name] = VariableWrapper(field_var, field_name, instance,
+                                                                                      field_widget)
+        if field_widget and 'tooltip' in field_formatting.get(field_name, {}):
+            # Create a tooltip, the bundle holds the tooltip wrapped already
+            create_tooltip(field_widget, field_formatting[field_name]['tooltip'],
+                           field_formatting[field_name]['wrapped_tooltip'])
 
         return label, field_widget, field_var
 
+    @timed('set_configuration_value_and_update')
     def set_configuration_value_and_update(self, configuration, field: str, value):
         field_types = type_utils.get_field_types_of_dataclass(type(configuration))
         field_type = field_types[field]
@@ -468,23 +1013,62 @@ class ConfigurationGUI(tk.Frame):
 
         # Set the field to the new value
         setattr(configuration, field, value)
-        self.update_serialized_command_preview()
+        self.command_preview.invalidate(configuration, field)
+        self.schedule_command_preview_update()
+        if field in SCHEME_PREVIEW_FIELDS:
+            self.schedule_scheme_preview_update()
+
+    def schedule_command_preview_update(self):
+        """
+        Schedules an update of the command preview, unless one is already pending.
+        All changes until then are applied with a single update.
+        :return: None
+        """
+        if self.preview_update_job is None:
+            self.preview_update_job = self.after(PREVIEW_DEBOUNCE_MS, self.update_serialized_command_preview)
 
+    @timed('update_serialized_command_preview')
     def update_serialized_command_preview(self):
         """
-        Updates the serialized command preview widget with the current text
+        Updates the serialized command preview widget, only the fragments of changed fields are replaced
         :return: None
         """
-        # Update the serialized configuration (delete and reinsert)
-        self.serialized_config.delete(1.0, tk.END)
-        self.serialized_config.insert(tk.END, serialize_input_configuration(self.input_configuration))
+        self.preview_update_job = None
+        self.command_preview.refresh()
+
+    def schedule_scheme_preview_update(self):
+        if self.scheme_preview_job is None:
+            self.scheme_preview_job = self.after(SCHEME_PREVIEW_DEBOUNCE_MS, self.update_scheme_preview)
+
+    def update_scheme_preview(self):
+        """
+        Updates the example path and fan-out of the schemes, computed for a synthetic sample of posts
+        :return: None
+        """
+        self.scheme_preview_job = None
+        analysis = analyze_configuration(self.input_configuration)
+        self.scheme_preview_variable.set('\n'.join([f'Example: {analysis.example_path}', analysis.summary()]
+                                                    + [f'Warning: {warning}' for warning in analysis.warnings]))
+
+
+def main():
+    # Create an open gui
+    root = tk.Tk()
+    # Set name of window
+    root.title('Bulk Downloader For Reddit GUI')
+
+    app = ConfigurationGUI(master=root)
+
+    if os.environ.get('BDFRG_MEASURE_STARTUP'):
+        root.after_idle(lambda: print(f'Window shown after {(time.perf_counter() - startup_time) * 1000:.0f} ms'))
 
+    app.mainloop()
 
-# Create an open gui
-root = tk.Tk()
-# Set name of window
-root.title('Bulk Downloader For Reddit GUI')
+    latency_dump_path = os.environ.get(LATENCY_DUMP_VARIABLE)
+    if latency_dump_path:
+        with open(latency_dump_path, 'w') as f:
+            f.write(recorder.to_json(app.get_latency_counters()))
 
 
-app = ConfigurationGUI(master=root)
-app.mainloop()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+from typing import Optional
+
+from bdfrg import string_utils
+from bdfrg.gui.tooltip import TOOLTIP_MAX_CHARACTERS_PER_LINE
+
+current_directory_path = os.path.dirname(os.path.realpath(__file__))
+
+fields_folder = os.path.join(current_directory_path, 'fields')
+
+# Bump when the layout of the bundle changes, older bundles are rebuilt
+BUNDLE_VERSION = 1
+
+# The bundle lives in the local cache directory, the package itself may be on a slow or read only mount
+bundle_path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                           'bdfrg', 'field_metadata.json')
+
+# Loaded on first access by get_field_formatting
+_field_formatting: Optional[dict] = None
+
+
+def get_source_mtimes() -> dict:
+    """
+    Get the modification times of all field metadata files, used to detect if the bundle is outdated.
+    :return: A dict of file name -> modification time in nanoseconds
+    """
+    with os.scandir(fields_folder) as entries:
+        return {entry.name: entry.stat().st_mtime_ns for entry in entries if entry.name.endswith('.json')}
+
+
+def build_bundle(source_mtimes: dict) -> dict:
+    """
+    Read all field metadata files into a single bundle. Tooltips are wrapped for display in the bundle already.
+    :param source_mtimes: The modification times of the files the bundle is built from
+    :return: The bundle
+    """
+    field_formatting = {}
+
+    for file_name in source_mtimes:
+        with open(os.path.join(fields_folder, file_name)) as f:
+            field_format = json.load(f)
+
+        if 'tooltip' in field_format:
+            field_format['wrapped_tooltip'] = string_utils.split_lines(field_format['tooltip'],
+                                                                       TOOLTIP_MAX_CHARACTERS_PER_LINE)
+        field_formatting[field_format['name']] = field_format
+
+    return {'version': BUNDLE_VERSION, 'sources': source_mtimes, 'fields': field_formatting}
+
+
+def load_bundle() -> dict:
+    """
+    Load the field metadata bundle, rebuilding and storing it if it is missing or any source file changed.
+    :return: The bundle
+    """
+    source_mtimes = get_source_mtimes()
+
+    try:
+        with open(bundle_path) as f:
+            bundle = json.load(f)
+        if bundle.get('version') == BUNDLE_VERSION and bundle.get('sources') == source_mtimes:
+            return bundle
+    except (OSError, ValueError):
+        pass
+
+    bundle = build_bundle(source_mtimes)
+
+    # Write to a temporary file first, so concurrently started instances never read a partial bundle
+    try:
+        os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+        temporary_path = f'{bundle_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(bundle, f)
+        os.replace(temporary_path, bundle_path)
+    except OSError as e:
+        # Not being able to cache only costs startup time
+        print(f'Could not write field metadata bundle {bundle_path}: {e}')
+
+    return bundle
+
+
+def get_field_formatting() -> dict:
+    """
+    Get the formatting (tooltip, suggestion, ...) of all configuration fields, loaded on first access.
+    :return: A dict of field name -> field format
+    """
+    global _field_formatting
+
+    if _field_formatting is None:
+        _field_formatting = load_bundle()['fields']
+
+    return _field_formatting
@@ -0,0 +1,97 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from typing import Callable
+
+from bdfrg.id_set import IdSet
+
+# Number of IDs shown as sample next to the count
+SAMPLE_SIZE = 5
+
+
+class IdSetField(tk.Frame):
+    """
+    A widget for fields holding large sets of IDs. Instead of showing every ID it shows the count and a sample,
+    IDs are added by pasting them into a popup or by importing ID files.
+
+    :param master: The parent widget.
+    :type master: tk.Widget
+    :param ids: The initial IDs.
+    :type ids: IdSet
+    :param on_change: Called with the new IdSet whenever IDs are added or cleared.
+    :type on_change: Callable[[IdSet], None]
+    """
+
+    def __init__(self, master=None, ids: IdSet = None, on_change: Callable[[IdSet], None] = None, **kwargs):
+        super().__init__(master=master, **kwargs)
+        self.ids = ids if ids is not None else IdSet()
+        self.on_change = on_change
+        self.popup = None
+
+        self.summary_var = tk.StringVar()
+        summary_label = tk.Label(self, textvariable=self.summary_var, anchor=tk.W, width=50)
+        summary_label.pack(side=tk.TOP, fill=tk.X)
+
+        add_button = tk.Button(self, text="Add IDs...", command=self.on_add_ids_press)
+        add_button.pack(side=tk.LEFT)
+
+        import_button = tk.Button(self, text="Import ID files...", command=self.on_import_files_press)
+        import_button.pack(side=tk.LEFT)
+
+        clear_button = tk.Button(self, text="Clear", command=lambda: self.change_ids(IdSet()))
+        clear_button.pack(side=tk.LEFT)
+
+        self.update_summary()
+
+    def set_ids(self, ids: IdSet):
+        """
+        Show the given IDs, without calling on_change.
+        :param ids: The IDs to show
+        :return: None
+        """
+        self.ids = ids
+        self.update_summary()
+
+    def change_ids(self, ids: IdSet):
+        self.set_ids(ids)
+        if self.on_change:
+            self.on_change(ids)
+
+    def update_summary(self):
+        sample = ', '.join(self.ids.sample(SAMPLE_SIZE))
+        more = ', ...' if len(self.ids) > SAMPLE_SIZE else ''
+        self.summary_var.set(f'{len(self.ids):,} IDs' + (f': {sample}{more}' if sample else ''))
+
+    def on_add_ids_press(self):
+        self.popup = tk.Toplevel()
+        self.popup.title("Add IDs")
+
+        ids_text = tk.Text(self.popup)
+        ids_text.config(height=20, width=40)
+        ids_text.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        def add():
+            self.add_ids(ids_text.get('1.0', tk.END).split())
+            self.popup.destroy()
+
+        add_button = tk.Button(self.popup, text="Add", command=add)
+        add_button.pack(side=tk.LEFT)
+
+    def on_import_files_press(self):
+        paths = filedialog.askopenfilenames(parent=self, title="Import ID files")
+        if not paths:
+            return
+
+        try:
+            self.add_ids(IdSet.from_files(paths))
+        except OSError as e:
+            messagebox.showerror("Error", e)
+
+    def add_ids(self, ids):
+        """
+        Merge IDs into the current ones.
+        :param ids: The IDs to add
+        :return: None
+        """
+        merged = IdSet(self.ids)
+        merged.update(ids)
+        self.change_ids(merged)
@@ -0,0 +1,105 @@
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from typing import Callable
+
+from bdfrg.instrumentation import LatencyRecorder, recorder
+
+# Interval of the event loop heartbeat, a heartbeat running late measures how long the event loop was blocked
+HEARTBEAT_INTERVAL_MS = 100
+
+# How often the open panel is redrawn
+PANEL_REFRESH_MS = 1000
+
+# The name the lag of the event loop is recorded under
+EVENT_LOOP_LAG = 'event_loop_lag'
+
+
+class EventLoopMonitor:
+    """
+    Measures the lag of the Tk event loop with a heartbeat scheduled every HEARTBEAT_INTERVAL_MS. The time a heartbeat
+    runs after it was due is the time the event loop was busy with other callbacks, i.e. the time input had to wait.
+
+    :param widget: Any widget of the application.
+    :type widget: tk.Widget
+    :param latency_recorder: The recorder the lag is recorded to.
+    :type latency_recorder: LatencyRecorder
+    """
+
+    def __init__(self, widget: tk.Widget, latency_recorder: LatencyRecorder = recorder):
+        self.widget = widget
+        self.series = latency_recorder.get_series(EVENT_LOOP_LAG)
+        self.due = None
+
+    def start(self):
+        self.due = time.perf_counter() + HEARTBEAT_INTERVAL_MS / 1000
+        self.widget.after(HEARTBEAT_INTERVAL_MS, self.heartbeat)
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        self.series.add(max(0.0, now - self.due))
+        self.due = now + HEARTBEAT_INTERVAL_MS / 1000
+        self.widget.after(HEARTBEAT_INTERVAL_MS, self.heartbeat)
+
+
+class LatencyPanel(tk.Toplevel):
+    """
+    A debug window showing the latency percentiles of the measured callbacks, see bdfrg.instrumentation.
+
+    Hidden by default, opened with Ctrl+Shift+D. The statistics can be dumped as JSON to attach them to a report of
+    a slow GUI.
+
+    :param master: The parent widget.
+    :type master: tk.Widget
+    :param get_counters: Returns additional counters shown below the table and stored in the dump.
+    :type get_counters: Callable[[], dict]
+    """
+
+    def __init__(self, master=None, get_counters: Callable[[], dict] = None, **kwargs):
+        super().__init__(master=master, **kwargs)
+        self.title('Latency')
+        self.get_counters = get_counters or dict
+        self.refresh_job = None
+
+        self.text = tk.Text(self, width=90, height=20, wrap=tk.NONE, font='TkFixedFont', state=tk.DISABLED)
+        self.text.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        buttons = tk.Frame(self)
+        buttons.pack(side=tk.BOTTOM, fill=tk.X)
+        tk.Button(buttons, text='Dump JSON...', command=self.on_dump_press).pack(side=tk.LEFT)
+        tk.Button(buttons, text='Reset', command=self.on_reset_press).pack(side=tk.LEFT)
+
+        self.refresh()
+
+    def refresh(self):
+        self.refresh_job = None
+        lines = [f'{"callback":<40} {"calls":>8} {"mean ms":>9} {"p50 ms":>9} {"p99 ms":>9} {"max ms":>9}']
+        lines.extend(f'{stats.name:<40} {stats.count:>8} {stats.mean_ms:>9.2f} {stats.p50_ms:>9.2f} '
+                     f'{stats.p99_ms:>9.2f} {stats.max_ms:>9.2f}' for stats in recorder.snapshot())
+        lines.append('')
+        lines.extend(f'{name}: {value}' for name, value in self.get_counters().items())
+
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(lines))
+        self.text.config(state=tk.DISABLED)
+        self.refresh_job = self.after(PANEL_REFRESH_MS, self.refresh)
+
+    def on_dump_press(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension='.json', initialfile='bdfrg-latency.json')
+        if not path:
+            return
+        try:
+            with open(path, 'w') as f:
+                f.write(recorder.to_json(self.get_counters()))
+        except OSError as e:
+            messagebox.showerror("Error", e, parent=self)
+
+    def on_reset_press(self):
+        recorder.reset()
+        self.refresh()
+
+    def destroy(self):
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+        super().destroy()
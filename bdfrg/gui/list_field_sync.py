@@ -0,0 +1,170 @@
+import tkinter as tk
+from bisect import bisect_left
+from typing import Callable, Dict, List
+
+# Placeholder for "no edit since the last flush" of the dirty region bounds
+_CLEAN = float('inf')
+
+
+class ListFieldState:
+    """
+    The synchronisation state of a single list field.
+
+    :param widget: The Text widget of the field.
+    :type widget: tk.Text
+    :param configuration: The configuration dataclass the field belongs to.
+    :param field_name: The name of the field.
+    :type field_name: str
+    """
+
+    def __init__(self, widget: tk.Text, configuration, field_name: str):
+        self.widget = widget
+        self.configuration = configuration
+        self.field_name = field_name
+        # The lines of the widget as of the last flush, including empty lines
+        self.lines: List[str] = widget.get('1.0', 'end-1c').split('\n')
+        # The values of the field (the non-empty lines) and the sorted numbers of the empty lines, both kept up to
+        # date on flush so that the values never have to be filtered from all lines again
+        self.values: List[str] = list(filter(None, self.lines))
+        self.empty_lines: List[int] = [number for number, line in enumerate(self.lines) if not line]
+        # Dirty region: the first changed line and the number of unchanged lines after the region.
+        # Counting the unchanged lines from the end keeps the bound valid while lines are added or removed above it.
+        self.first_dirty_line = _CLEAN
+        self.clean_suffix_lines = _CLEAN
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.first_dirty_line != _CLEAN
+
+    def get_line_count(self) -> int:
+        return int(self.widget.index('end-1c').split('.')[0])
+
+    def mark_edit(self, first_index: str, last_index: str):
+        """
+        Extend the dirty region by the lines touched by an edit, must be called before the edit is applied.
+        :param first_index: The Tk index the edit starts at
+        :param last_index: The Tk index the edit ends at
+        :return: None
+        """
+        line_count = self.get_line_count()
+        # The end index is after the final new line of the widget, edits there happen on the last line
+        first_line = min(int(self.widget.index(first_index).split('.')[0]), line_count) - 1
+        last_line = min(int(self.widget.index(last_index).split('.')[0]), line_count) - 1
+
+        self.first_dirty_line = min(self.first_dirty_line, first_line)
+        self.clean_suffix_lines = min(self.clean_suffix_lines, max(0, line_count - 1 - last_line))
+
+    def flush(self) -> List[str]:
+        """
+        Read the lines of the dirty region from the widget and splice them into the known lines and values.
+        Only the edited lines are read and converted, independent of the size of the list.
+        :return: The values of the field (the non-empty lines), the same list updated in place on every flush
+        """
+        line_count = self.get_line_count()
+        region_end = line_count - self.clean_suffix_lines
+        old_start = self.first_dirty_line
+        old_end = len(self.lines) - self.clean_suffix_lines
+
+        new_lines = self.widget.get(f'{old_start + 1}.0', f'{region_end}.end').split('\n')
+        self.lines[old_start:old_end] = new_lines
+
+        # The values before a line are the lines before it minus the empty ones
+        empty_start = bisect_left(self.empty_lines, old_start)
+        empty_end = bisect_left(self.empty_lines, old_end, empty_start)
+        # Remove empty lines, like type_utils.convert_str_to_type does
+        self.values[old_start - empty_start:old_end - empty_end] = filter(None, new_lines)
+
+        # Only the empty lines after the region are renumbered, usually there are few of them
+        shift = len(new_lines) - (old_end - old_start)
+        self.empty_lines[empty_start:] = [old_start + number for number, line in enumerate(new_lines) if not line] + \
+                                         [number + shift for number in self.empty_lines[empty_end:]]
+
+        self.first_dirty_line = self.clean_suffix_lines = _CLEAN
+        return self.values
+
+
+class ListFieldSync:
+    """
+    Keeps the list fields of a configuration in sync with their Text widgets.
+
+    All edits of a widget (typing, pasting and programmatic inserts and deletes) are intercepted. They only mark the
+    touched lines as dirty, the work of converting them and updating the configuration is done once per idle loop
+    for all edits since the last flush.
+
+    :param master: Any widget, used to schedule the flush.
+    :type master: tk.Widget
+    :param on_change: Called with (configuration, field_name, values) for every changed field on flush.
+    :type on_change: Callable
+    """
+
+    def __init__(self, master: tk.Widget, on_change: Callable[[object, str, List[str]], None]):
+        self.master = master
+        self.on_change = on_change
+        self.states: Dict[str, ListFieldState] = {}
+        self.flush_job = None
+
+        # Statistics, every edit after the first one until a flush is coalesced into that flush
+        self.edit_count = 0
+        self.flush_count = 0
+
+    @property
+    def coalesced_count(self) -> int:
+        return self.edit_count - self.flush_count
+
+    def report(self) -> str:
+        return f'{self.edit_count} list field edits applied in {self.flush_count} updates ' \
+               f'({self.coalesced_count} coalesced)'
+
+    def register(self, widget: tk.Text, configuration, field_name: str):
+        """
+        Start tracking the edits of a Text widget.
+        :param widget: The widget of the field
+        :param configuration: The configuration dataclass the field belongs to
+        :param field_name: The name of the field
+        :return: None
+        """
+        state = self.states[str(widget)] = ListFieldState(widget, configuration, field_name)
+
+        # Put a proxy in front of the Tcl command of the widget, so that every insert and delete passes through it
+        widget_name = str(widget)
+        original_command = widget_name + '_original'
+        widget.tk.call('rename', widget_name, original_command)
+
+        def proxy(operation, *args):
+            if operation in ('insert', 'delete', 'replace'):
+                first_index = args[0]
+                if operation == 'insert':
+                    last_index = first_index
+                elif len(args) > 1:
+                    last_index = args[1]
+                else:
+                    # Deleting a single character, which may be the new line joining the next line
+                    last_index = f'{first_index} + 1c'
+
+                state.mark_edit(first_index, last_index)
+                self.edit_count += 1
+                self.schedule_flush()
+            return widget.tk.call((original_command, operation) + args)
+
+        widget.tk.createcommand(widget_name, proxy)
+
+    def schedule_flush(self):
+        if self.flush_job is None:
+            self.flush_job = self.master.after_idle(self.flush)
+
+    def flush(self):
+        """
+        Apply all pending edits to the configuration.
+        :return: None
+        """
+        if self.flush_job is not None:
+            self.master.after_cancel(self.flush_job)
+            self.flush_job = None
+
+        dirty_states = [state for state in self.states.values() if state.is_dirty]
+        if not dirty_states:
+            return
+
+        self.flush_count += 1
+        for state in dirty_states:
+            self.on_change(state.configuration, state.field_name, state.flush())
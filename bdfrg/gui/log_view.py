@@ -0,0 +1,206 @@
+import re
+import tkinter as tk
+from tkinter import font
+from typing import Iterable, Tuple
+
+from bdfrg.execution.log_buffer import LOG_LEVELS, LogBuffer, LogFilter, build_filter_pattern
+
+# Delay before a changed filter is applied, keystrokes within this window start a single search
+FILTER_DEBOUNCE_MS = 300
+
+# How often the view is redrawn while a filter searches the existing lines
+FILTER_POLL_INTERVAL_MS = 100
+
+# Lines scrolled per mouse wheel step
+WHEEL_LINES = 3
+
+_ALL_LEVELS = 'All levels'
+_STDERR_TAG = 'stderr'
+
+
+class LogView(tk.Frame):
+    """
+    Shows the output of a job, independent of its length.
+
+    The lines are stored in a LogBuffer, the Text widget only ever holds the lines currently visible. Scrolling and
+    appending redraw this window, at most once per idle loop. While the view is scrolled to the bottom it follows
+    new lines. Filtering by text (e.g. a post ID) and level runs in a background thread.
+
+    :param master: The parent widget.
+    :type master: tk.Widget
+    """
+
+    def __init__(self, master=None, **kwargs):
+        super().__init__(master=master, **kwargs)
+        self.log_buffer = LogBuffer()
+        self.log_filter: LogFilter = None
+        # Row of the first visible line, of all lines or of the matches of the filter
+        self.top_row = 0
+        self.following = True
+        self.render_job = None
+        self.filter_job = None
+        self.filter_poll_job = None
+
+        filter_bar = tk.Frame(self)
+        filter_bar.pack(side=tk.TOP, fill=tk.X)
+
+        tk.Label(filter_bar, text='Filter').pack(side=tk.LEFT)
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add('write', lambda *args: self.schedule_filter())
+        tk.Entry(filter_bar, textvariable=self.filter_text).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.filter_level = tk.StringVar(value=_ALL_LEVELS)
+        self.filter_level.trace_add('write', lambda *args: self.schedule_filter())
+        tk.OptionMenu(filter_bar, self.filter_level, _ALL_LEVELS, *LOG_LEVELS).pack(side=tk.LEFT)
+
+        self.status_variable = tk.StringVar()
+        tk.Label(filter_bar, textvariable=self.status_variable, width=30, anchor=tk.E).pack(side=tk.LEFT)
+
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Never scrolled itself, it holds exactly the visible lines
+        self.text = tk.Text(self, height=15, width=50, wrap=tk.NONE, state=tk.DISABLED)
+        self.text.tag_config(_STDERR_TAG, foreground='red')
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.text.bind('<Configure>', lambda event: self.schedule_render())
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.text.bind(sequence, self.on_mouse_wheel)
+        self.line_height = max(1, font.Font(font=self.text.cget('font')).metrics('linespace'))
+
+    @property
+    def row_count(self) -> int:
+        return len(self.log_filter.matches) if self.log_filter is not None else self.log_buffer.count
+
+    @property
+    def visible_rows(self) -> int:
+        if not self.text.winfo_ismapped():
+            return int(self.text.cget('height'))
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def append_lines(self, lines: Iterable[Tuple[str, bool]]):
+        """
+        Append lines of output.
+        :param lines: (line, written to stderr) tuples
+        :return: None
+        """
+        self.log_buffer.append_lines(lines)
+        if self.following:
+            self.schedule_render()
+
+    def clear(self):
+        self.log_buffer.close()
+        self.log_buffer = LogBuffer()
+        self.log_filter = None
+        self.top_row = 0
+        self.following = True
+        self.apply_filter()
+
+    def destroy(self):
+        self.log_buffer.close()
+        super().destroy()
+
+    def scroll(self, rows: int):
+        self.scroll_to(self.top_row + rows)
+
+    def scroll_to(self, top_row: int):
+        last_top_row = max(0, self.row_count - self.visible_rows)
+        self.top_row = min(max(0, top_row), last_top_row)
+        self.following = self.top_row == last_top_row
+        self.schedule_render()
+
+    def on_mouse_wheel(self, event: tk.Event):
+        # Button-4 and Button-5 are the wheel on X11
+        up = event.delta > 0 if event.num not in (4, 5) else event.num == 4
+        self.scroll(-WHEEL_LINES if up else WHEEL_LINES)
+        # The Text widget must not scroll itself
+        return 'break'
+
+    def on_scrollbar(self, action: str, amount: str, unit: str = None):
+        if action == tk.MOVETO:
+            self.scroll_to(int(float(amount) * self.row_count))
+        elif unit == tk.PAGES:
+            self.scroll(int(amount) * self.visible_rows)
+        else:
+            self.scroll(int(amount))
+
+    def schedule_render(self):
+        if self.render_job is None:
+            self.render_job = self.after_idle(self.render)
+
+    def render(self):
+        """
+        Replace the content of the Text widget with the visible lines.
+        :return: None
+        """
+        self.render_job = None
+        row_count = self.row_count
+        visible_rows = self.visible_rows
+        if self.following:
+            self.top_row = max(0, row_count - visible_rows)
+        stop_row = min(row_count, self.top_row + visible_rows)
+
+        if self.log_filter is not None:
+            matches = self.log_filter.matches
+            line_numbers = [matches[row] for row in range(self.top_row, stop_row)]
+            lines = [self.log_buffer.get_lines(line_number, line_number + 1)[0] for line_number in line_numbers]
+        else:
+            line_numbers = range(self.top_row, stop_row)
+            lines = self.log_buffer.get_lines(self.top_row, stop_row)
+
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(lines))
+        for row, line_number in enumerate(line_numbers, 1):
+            if self.log_buffer.is_stderr(line_number):
+                self.text.tag_add(_STDERR_TAG, f'{row}.0', f'{row}.end')
+        self.text.config(state=tk.DISABLED)
+
+        if row_count:
+            self.scrollbar.set(self.top_row / row_count, stop_row / row_count)
+        else:
+            self.scrollbar.set(0, 1)
+        self.update_status()
+
+    def update_status(self):
+        count = self.log_buffer.count
+        if self.log_filter is None:
+            self.status_variable.set(f'{count:,} lines')
+        elif self.log_filter.live:
+            self.status_variable.set(f'{len(self.log_filter.matches):,} of {count:,} lines')
+        else:
+            self.status_variable.set(f'Searching {self.log_filter.progress:.0%}...')
+
+    def schedule_filter(self):
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(FILTER_DEBOUNCE_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """
+        Start filtering with the current text and level, the view follows the matches.
+        :return: None
+        """
+        self.filter_job = None
+        level = self.filter_level.get()
+        try:
+            pattern = build_filter_pattern(self.filter_text.get(), level if level != _ALL_LEVELS else None)
+        except re.error:
+            self.status_variable.set('Invalid pattern')
+            return
+
+        self.log_filter = self.log_buffer.set_filter(pattern)
+        self.top_row = 0
+        self.following = True
+        self.render()
+        if self.log_filter is not None and self.filter_poll_job is None:
+            self.filter_poll_job = self.after(FILTER_POLL_INTERVAL_MS, self.poll_filter)
+
+    def poll_filter(self):
+        # Shows the matches while the background search finds them
+        self.filter_poll_job = None
+        if self.log_filter is None:
+            return
+        self.render()
+        if not self.log_filter.live:
+            self.filter_poll_job = self.after(FILTER_POLL_INTERVAL_MS, self.poll_filter)
@@ -1,6 +1,6 @@
 import tkinter as tk
 
-from default_entry import DefaultEntry
+from bdfrg.gui.default_entry import DefaultEntry
 
 def is_showing_default(widget: tk.Widget):
     # Check if it is a DefaultEntry
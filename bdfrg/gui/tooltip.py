@@ -4,11 +4,79 @@ import tkinter as tk
 # https://stackoverflow.com/questions/20399243/display-message-when-hovering-over-something-with-mouse-cursor-in-python
 # CREDIT: squareRoot17
 from bdfrg import string_utils
+from bdfrg.instrumentation import timed
+
+TOOLTIP_MAX_CHARACTERS_PER_LINE = 100
+
+
+class SharedTooltipWindow(object):
+    """
+    A single tooltip window that is shared by all tooltips. It is only hidden and moved between widgets instead of
+    being created and destroyed on every hover.
+
+    :param master: The widget to create the window for.
+    :type master: tk.Widget
+    """
+
+    def __init__(self, master):
+        self.window = tk.Toplevel(master)
+        self.window.wm_overrideredirect(1)
+        self.window.withdraw()
+
+        self.label = tk.Label(self.window, justify=tk.LEFT,
+                              background="#ffffe0", relief=tk.SOLID, borderwidth=1,
+                              font=("tahoma", "8", "normal"))
+        self.label.pack(ipadx=1)
+
+        # The tooltip currently shown in the window
+        self.owner = None
+
+    def show(self, owner, text: str, x: int, y: int):
+        """
+        Show the window with the given text at the given position.
+        :param owner: The tooltip showing the window
+        :param text: The text to display
+        :param x: The x position on the screen
+        :param y: The y position on the screen
+        :return: None
+        """
+        self.owner = owner
+        self.label.config(text=text)
+        self.window.wm_geometry("+%d+%d" % (x, y))
+        self.window.deiconify()
+        self.window.lift()
+
+    def hide(self, owner):
+        """
+        Hide the window, if it is still shown for the given tooltip.
+        :param owner: The tooltip hiding the window
+        :return: None
+        """
+        if self.owner is owner:
+            self.owner = None
+            self.window.withdraw()
+
+
+_shared_tooltip_window: SharedTooltipWindow = None
+
+
+def get_shared_tooltip_window(widget) -> SharedTooltipWindow:
+    """
+    Get the shared tooltip window, creating it on first use.
+    :param widget: Any widget of the application
+    :return: The shared tooltip window
+    """
+    global _shared_tooltip_window
+
+    if _shared_tooltip_window is None or not _shared_tooltip_window.window.winfo_exists():
+        _shared_tooltip_window = SharedTooltipWindow(widget.winfo_toplevel())
+
+    return _shared_tooltip_window
 
 
 class Tooltip(object):
 
-    def __init__(self, widget, text):
+    def __init__(self, widget, text, formatted_text=None):
         self.text = text
 
         self.widget = widget
@@ -16,53 +84,59 @@ class Tooltip(object):
         self.id = None
         self.x = self.y = 0
 
-        self.max_characters_per_line = 100
+        self.max_characters_per_line = TOOLTIP_MAX_CHARACTERS_PER_LINE
 
-        # Split the text into multiple lines if it is too long
-        self.formatted_text = string_utils.split_lines(text, self.max_characters_per_line)
+        # Text wrapped for display, wrapped on first show unless it has been wrapped already
+        self._formatted_text = formatted_text
 
+    @property
+    def formatted_text(self) -> str:
+        """
+        The text split into multiple lines if it is too long
+        """
+        if self._formatted_text is None:
+            self._formatted_text = string_utils.split_lines(self.text, self.max_characters_per_line)
+        return self._formatted_text
+
+    @timed('tooltip_show')
     def showtip(self):
         """
-        Display text in tooltip window
-        :param text: The text to display
+        Display text in the shared tooltip window
         :return: None
         """
 
-        # If the tooltip window already exists or there is no text to display, do nothing
+        # If the tooltip is already shown or there is no text to display, do nothing
         if self.tip_window or not self.text:
             return
 
         x, y, cx, cy = self.widget.bbox("insert")
         x = x + self.widget.winfo_rootx() + 57
         y = y + cy + self.widget.winfo_rooty() + 27
-        self.tip_window = tw = tk.Toplevel(self.widget)
-        tw.wm_overrideredirect(1)
-        tw.wm_geometry("+%d+%d" % (x, y))
-        label = tk.Label(tw, text=self.formatted_text, justify=tk.LEFT,
-                         background="#ffffe0", relief=tk.SOLID, borderwidth=1,
-                         font=("tahoma", "8", "normal"))
-        label.pack(ipadx=1)
+        self.tip_window = get_shared_tooltip_window(self.widget)
+        self.tip_window.show(self, self.formatted_text, x, y)
 
+    @timed('tooltip_hide')
     def hidetip(self):
         """
-        Destroy the tooltip window
+        Hide the shared tooltip window
         :return: None
         """
 
         tw = self.tip_window
         self.tip_window = None
         if tw:
-            tw.destroy()
+            tw.hide(self)
 
 
-def create_tooltip(widget, text):
+def create_tooltip(widget, text, formatted_text=None):
     """
     Create a tooltip for the given widget
     :param widget: The widget to create the tooltip for
     :param text: The text to display in the tooltip
+    :param formatted_text: The text already wrapped for display, wrapped from text if not given
     :return: The tooltip
     """
-    tooltip = Tooltip(widget, text)
+    tooltip = Tooltip(widget, text, formatted_text)
 
     def enter(event):
         """
@@ -0,0 +1,273 @@
+import bisect
+import dataclasses
+import hashlib
+import os
+import re
+from array import array
+from collections.abc import Sequence
+from itertools import repeat
+from typing import Iterable, Iterator, List
+
+from bdfrg.input_configuration import InputConfiguration
+
+# Lists of IDs longer than this are written to a generated file instead of being passed as single options
+SPILL_THRESHOLD = 100
+
+# Reddit IDs are lower case base 36 numbers, anything matching this is stored as a 64 bit integer
+CANONICAL_ID_PATTERN = re.compile(r'[1-9a-z][0-9a-z]{0,11}')
+
+# Matches a whole block of canonical IDs joined by new lines, to check many IDs with a single regex call
+CANONICAL_ID_BLOCK_PATTERN = re.compile(r'(?:[1-9a-z][0-9a-z]{0,11}\n)*[1-9a-z][0-9a-z]{0,11}')
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# IDs are encoded three digits at a time using tables of all three digit strings, with and without leading zeros
+_CHUNK = 36 ** 3
+_padded_chunks: List[str] = []
+_stripped_chunks: List[str] = []
+
+
+def _load_chunk_tables():
+    # Built completely before being published, the stripped table last, so that concurrent threads never see a
+    # partially filled table
+    if not _stripped_chunks:
+        padded_chunks = [a + b + c for a in _DIGITS for b in _DIGITS for c in _DIGITS]
+        stripped_chunks = [chunk.lstrip('0') or '0' for chunk in padded_chunks]
+        _padded_chunks[:] = padded_chunks
+        _stripped_chunks[:] = stripped_chunks
+
+
+def int_to_base36(number: int) -> str:
+    """
+    Convert a non-negative integer to a lower case base 36 string e.g. 1295 -> 'zz'.
+    :param number: The number to convert
+    :return: The base 36 string
+    """
+    _load_chunk_tables()
+
+    chunks = []
+    while number >= _CHUNK:
+        number, remainder = divmod(number, _CHUNK)
+        chunks.append(_padded_chunks[remainder])
+    chunks.append(_stripped_chunks[number])
+
+    return ''.join(reversed(chunks))
+
+
+def sorted_ints_to_base36(numbers) -> List[str]:
+    """
+    Convert sorted non-negative integers below 36 ** 12 to base 36 strings, much faster than int_to_base36 per number.
+    As the numbers are sorted, all numbers with the same count of three digit chunks are next to each other and are
+    converted by a single comprehension each.
+    :param numbers: The sorted numbers
+    :return: The base 36 strings in the same order
+    """
+    _load_chunk_tables()
+    padded, stripped, chunk, chunk2, chunk3 = _padded_chunks, _stripped_chunks, _CHUNK, _CHUNK ** 2, _CHUNK ** 3
+
+    end1 = bisect.bisect_left(numbers, chunk)
+    end2 = bisect.bisect_left(numbers, chunk2, end1)
+    end3 = bisect.bisect_left(numbers, chunk3, end2)
+
+    strings = [stripped[number] for number in numbers[:end1]]
+    strings += [stripped[number // chunk] + padded[number % chunk] for number in numbers[end1:end2]]
+    strings += [stripped[number // chunk2] + padded[number // chunk % chunk] + padded[number % chunk]
+                for number in numbers[end2:end3]]
+    strings += [stripped[number // chunk3] + padded[number // chunk2 % chunk] + padded[number // chunk % chunk] +
+                padded[number % chunk] for number in numbers[end3:]]
+
+    return strings
+
+
+def read_id_file(path: str) -> List[str]:
+    """
+    Read the IDs of an ID file (as used by --exclude-id-file and --include-id-file), one ID per line.
+    Blank lines and lines starting with # are skipped.
+    :param path: The path of the file
+    :return: The IDs
+    """
+    with open(path, encoding='utf-8', errors='replace') as f:
+        content = f.read()
+
+    if '#' not in content:
+        # Fast path, splitting at any whitespace strips the lines and drops blank ones
+        return content.split()
+
+    return [line for line in map(str.strip, content.splitlines()) if line and not line.startswith('#')]
+
+
+class IdSet(Sequence):
+    """
+    A sorted set of Reddit IDs, deduplicated and stored compactly.
+
+    Canonical IDs (lower case base 36 without leading zeros) are stored as 64 bit integers in a sorted array, which
+    takes 8 bytes per ID. Any other IDs are kept as strings. The set can be used wherever a list of IDs is expected,
+    iterating it yields the IDs as strings, sorted by their numeric value.
+
+    :param ids: The initial IDs.
+    :type ids: Iterable[str]
+    """
+
+    def __init__(self, ids: Iterable[str] = ()):
+        self.numbers = array('Q')
+        self.others: List[str] = []
+        self.update(ids)
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str]) -> 'IdSet':
+        """
+        Create a set holding the IDs of all given ID files.
+        :param paths: The paths of the files
+        :return: The merged set
+        """
+        id_set = cls()
+        for path in paths:
+            id_set.update(read_id_file(path))
+        return id_set
+
+    def update(self, ids: Iterable[str]):
+        """
+        Add IDs to the set.
+        :param ids: The IDs to add, duplicates are ignored
+        :return: None
+        """
+        if isinstance(ids, IdSet):
+            numbers, others = ids.numbers, ids.others
+        else:
+            ids = ids if isinstance(ids, list) else list(ids)
+            if ids and CANONICAL_ID_BLOCK_PATTERN.fullmatch('\n'.join(ids)):
+                # Fast path, all IDs are canonical which is the normal case
+                numbers, others = map(int, ids, repeat(36)), []
+            else:
+                numbers, others = [], []
+                is_canonical = CANONICAL_ID_PATTERN.fullmatch
+                for id_ in ids:
+                    if is_canonical(id_):
+                        numbers.append(int(id_, 36))
+                    else:
+                        others.append(id_)
+
+        if numbers:
+            # Sorting is close to linear if the IDs are sorted already (e.g. read from a generated ID file),
+            # the dict then drops the duplicates while keeping the order
+            merged = self.numbers.tolist()
+            merged.extend(numbers)
+            merged.sort()
+            self.numbers = array('Q', dict.fromkeys(merged))
+        if others:
+            self.others = sorted(set(self.others).union(others))
+
+    def __len__(self) -> int:
+        return len(self.numbers) + len(self.others)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < len(self.numbers):
+            return int_to_base36(self.numbers[index])
+        return self.others[index - len(self.numbers)]
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk_start in range(0, len(self.numbers), 65536):
+            yield from sorted_ints_to_base36(self.numbers[chunk_start:chunk_start + 65536])
+        yield from self.others
+
+    def __contains__(self, id_) -> bool:
+        if isinstance(id_, str) and CANONICAL_ID_PATTERN.fullmatch(id_):
+            number = int(id_, 36)
+            index = bisect.bisect_left(self.numbers, number)
+            return index < len(self.numbers) and self.numbers[index] == number
+        index = bisect.bisect_left(self.others, id_)
+        return index < len(self.others) and self.others[index] == id_
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, IdSet):
+            return self.numbers == other.numbers and self.others == other.others
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'IdSet({len(self)} IDs)'
+
+    def sample(self, count: int = 5) -> List[str]:
+        """
+        Get the first few IDs, to show a sample of the set.
+        :param count: The maximum number of IDs to return
+        :return: The IDs
+        """
+        return self[:count]
+
+    def digest(self) -> str:
+        """
+        Get a hash of the content of the set, equal sets have equal digests.
+        :return: The hex digest
+        """
+        hash_ = hashlib.sha1(self.numbers.tobytes())
+        hash_.update('\n'.join(self.others).encode('utf-8', 'surrogatepass'))
+        return hash_.hexdigest()
+
+    def write(self, path: str):
+        """
+        Write the set as ID file, one ID per line.
+        :param path: The path of the file
+        :return: None
+        """
+        # Write to a temporary file first, so a concurrent reader never sees a partial file
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            for chunk_start in range(0, len(self.numbers), 65536):
+                f.write('\n'.join(sorted_ints_to_base36(self.numbers[chunk_start:chunk_start + 65536])))
+                f.write('\n')
+            f.write('\n'.join(self.others))
+        os.replace(temporary_path, path)
+
+
+def get_id_file_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'bdfrg', 'id_files')
+
+
+def write_generated_id_file(id_set: IdSet, kind: str) -> str:
+    """
+    Write an ID set to a generated ID file. The file is named after the content, so it is only written once.
+    :param id_set: The IDs to write
+    :param kind: Prefix of the file name e.g. 'exclude'
+    :return: The path of the file
+    """
+    directory = get_id_file_directory()
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, f'{kind}-{id_set.digest()}.txt')
+    if not os.path.exists(path):
+        id_set.write(path)
+
+    return path
+
+
+def consolidate_id_options(input_config: InputConfiguration, threshold: int = SPILL_THRESHOLD) -> InputConfiguration:
+    """
+    Merge large or multiple ID sources into single generated ID files, so that the command line stays short.
+    exclude_id with more than threshold IDs is merged with all exclude_id_file files into one --exclude-id-file,
+    multiple include_id_file files are merged into one --include-id-file. The given configuration is not modified.
+    :param input_config: The configuration to consolidate
+    :param threshold: The number of IDs up to which exclude_id is passed as single options
+    :return: The consolidated configuration (the given one if nothing had to be merged)
+    """
+    download_config = input_config.download_config
+    exclude_id = download_config.exclude_id or []
+    exclude_id_file = download_config.exclude_id_file or []
+    include_id_file = input_config.include_id_file or []
+
+    if len(exclude_id) > threshold or len(exclude_id_file) > 1:
+        exclude_ids = IdSet.from_files(exclude_id_file)
+        exclude_ids.update(exclude_id)
+        download_config = dataclasses.replace(download_config, exclude_id=None,
+                                              exclude_id_file=[write_generated_id_file(exclude_ids, 'exclude')])
+
+    if len(include_id_file) > 1:
+        include_id_file = [write_generated_id_file(IdSet.from_files(include_id_file), 'include')]
+
+    if download_config is input_config.download_config and include_id_file is input_config.include_id_file:
+        return input_config
+
+    return dataclasses.replace(input_config, download_config=download_config, include_id_file=include_id_file or None)
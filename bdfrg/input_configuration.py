@@ -1,6 +1,31 @@
-from dataclasses import dataclass
+import functools
+import shlex
+import string
+from collections.abc import Sequence
+from dataclasses import dataclass, field, fields, MISSING, is_dataclass
 from enum import Enum
-from typing import List
+from typing import Callable, List, Optional, Tuple
+
+# Characters that never need shell quoting (same set as shlex.quote), plus the space used to join the arguments
+_SAFE_SHELL_CHARACTERS = (string.ascii_letters + string.digits + '_@%+=:,./ -').encode()
+
+# The sub commands of BDFR
+BDFR_MODES = ('download', 'archive', 'clone')
+
+# Fields of the DownloaderConfiguration that are options of every sub command of BDFR, the other fields are only
+# options of download and clone
+COMMON_DOWNLOADER_FIELDS = ('file_scheme', 'folder_scheme', 'exclude_id', 'exclude_id_file')
+
+
+def cli_option(flag: Optional[str], repeatable: bool = False, count: bool = False) -> dict:
+    """
+    Create the field metadata describing how a configuration field maps to a BDFR command line option.
+    :param flag: The option e.g. '--subreddit', None for a positional argument, which is passed without option
+    :param repeatable: The field is a list and the option is given once per item
+    :param count: The field is a number and the option is repeated that many times in a single argument e.g. -vv
+    :return: The metadata to pass to dataclasses.field
+    """
+    return {'cli': {'flag': flag, 'repeatable': repeatable, 'count': count}}
 
 
 class TimeFilter(Enum):
@@ -27,172 +52,323 @@ class Format(Enum):
     YAML = 'yaml'
 
 
+class IoPriorityClass(Enum):
+    DEFAULT = 'default'
+    BEST_EFFORT = 'best-effort'
+    IDLE = 'idle'
+
+
 @dataclass
 class DownloaderConfiguration:
-    make_hard_links: bool = False
-    max_wait_time: int = 120
-    no_dupes: bool = False
-    search_existing: bool = False
-    file_scheme: str = '{REDDITOR}_{TITLE}_{POSTID}'
-    folder_scheme: str = '{SUBREDDIT}'
-    exclude_id: List[str] = None
-    exclude_id_file: List[str] = None
-    skip_domain: List[str] = None
-    skip: List[str] = None
-    skip_subreddit: List[str] = None
-    min_score: int = None
-    max_score: int = None
-    min_score_ratio: float = None
-    max_score_ratio: float = None
+    make_hard_links: bool = field(default=False, metadata=cli_option('--make-hard-links'))
+    max_wait_time: int = field(default=120, metadata=cli_option('--max-wait-time'))
+    no_dupes: bool = field(default=False, metadata=cli_option('--no-dupes'))
+    search_existing: bool = field(default=False, metadata=cli_option('--search-existing'))
+    file_scheme: str = field(default='{REDDITOR}_{TITLE}_{POSTID}', metadata=cli_option('--file-scheme'))
+    folder_scheme: str = field(default='{SUBREDDIT}', metadata=cli_option('--folder-scheme'))
+    exclude_id: List[str] = field(default=None, metadata=cli_option('--exclude-id', repeatable=True))
+    exclude_id_file: List[str] = field(default=None, metadata=cli_option('--exclude-id-file', repeatable=True))
+    skip_domain: List[str] = field(default=None, metadata=cli_option('--skip-domain', repeatable=True))
+    skip: List[str] = field(default=None, metadata=cli_option('--skip', repeatable=True))
+    skip_subreddit: List[str] = field(default=None, metadata=cli_option('--skip-subreddit', repeatable=True))
+    min_score: int = field(default=None, metadata=cli_option('--min-score'))
+    max_score: int = field(default=None, metadata=cli_option('--max-score'))
+    min_score_ratio: float = field(default=None, metadata=cli_option('--min-score-ratio'))
+    max_score_ratio: float = field(default=None, metadata=cli_option('--max-score-ratio'))
 
 
 @dataclass
 class ArchiverConfiguration:
-    all_comments: bool = False
-    format: Format = Format.JSON
-    comment_context: bool = False
+    all_comments: bool = field(default=False, metadata=cli_option('--all-comments'))
+    format: Format = field(default=Format.JSON, metadata=cli_option('-f'))
+    comment_context: bool = field(default=False, metadata=cli_option('--comment-context'))
+
+
+@dataclass
+class ResourceConfiguration:
+    # Not options of BDFR, applied to the BDFR process by bdfrg when it starts a job
+    nice: int = None
+    io_priority_class: IoPriorityClass = IoPriorityClass.DEFAULT
+    io_priority: int = None
+    max_memory_mb: int = None
+    max_open_files: int = None
 
 
 @dataclass
 class InputConfiguration:
-    directory: str = None
-    authenticate: bool = False
-    config: str = None
-    opts: str = None
-    disable_module: List[str] = None
-    filename_restriction_scheme: str = None
-    ignore_user: List[str] = None
-    include_id_file: List[str] = None
-    log: str = None
-    saved: bool = False
-    search: str = None
-    submitted: bool = False
-    upvoted: bool = False
-    limit: int = None
-    sort: SortType = SortType.HOT
-    link: List[str] = None
-    multireddit: List[str] = None
-    subreddit: List[str] = None
-    time: TimeFilter = TimeFilter.ALL
-    time_format: str = None
-    user: List[str] = None
-    verbose: int = 0
-    download_config: DownloaderConfiguration = DownloaderConfiguration()
-    archiver_config: ArchiverConfiguration = ArchiverConfiguration()
-
-
-def serialize_downloader_configuration(downloader_config):
-    command_list = []
-    if downloader_config.make_hard_links:
-        command_list.append('--hard-link')
-    if downloader_config.max_wait_time is not None and downloader_config.max_wait_time != 120:
-        command_list.append(f'--max-wait-time {downloader_config.max_wait_time}')
-    if downloader_config.no_dupes:
-        command_list.append('--no-dupes')
-    if downloader_config.search_existing:
-        command_list.append('--search-existing')
-    if downloader_config.file_scheme != '{REDDITOR}_{TITLE}_{POSTID}':
-        command_list.append(f'--file-scheme {downloader_config.file_scheme}')
-    if downloader_config.folder_scheme != '{SUBREDDIT}':
-        command_list.append(f'--folder-scheme {downloader_config.folder_scheme}')
-    if downloader_config.exclude_id is not None:
-        for item in downloader_config.exclude_id:
-            command_list.append(f'--exclude-id {item}')
-    if downloader_config.exclude_id_file is not None:
-        for item in downloader_config.exclude_id_file:
-            command_list.append(f'--exclude-id-file {item}')
-    if downloader_config.skip_domain is not None:
-        for item in downloader_config.skip_domain:
-            command_list.append(f'--skip-domain {item}')
-    if downloader_config.skip is not None:
-        for item in downloader_config.skip:
-            command_list.append(f'--skip {item}')
-    if downloader_config.skip_subreddit is not None:
-        for item in downloader_config.skip_subreddit:
-            command_list.append(f'--skip-subreddit {item}')
-    if downloader_config.min_score is not None:
-        command_list.append(f'--min-score {downloader_config.min_score}')
-    if downloader_config.max_score is not None:
-        command_list.append(f'--max-score {downloader_config.max_score}')
-    if downloader_config.min_score_ratio is not None:
-        command_list.append(f'--min-score-ratio {downloader_config.min_score_ratio}')
-    if downloader_config.max_score_ratio is not None:
-        command_list.append(f'--max-score-ratio {downloader_config.max_score_ratio}')
-
-    return ' '.join(command_list)
-
-
-def serialize_input_configuration(input_config):
-    command_list = []
-    if input_config.directory is not None:
-        command_list.append(f'--directory {input_config.directory}')
-    if input_config.authenticate:
-        command_list.append('--authenticate')
-    if input_config.config is not None:
-        command_list.append(f'--config {input_config.config}')
-    if input_config.opts is not None:
-        command_list.append(f'--opts {input_config.opts}')
-    if input_config.disable_module is not None:
-        for item in input_config.disable_module:
-            command_list.append(f'--disable-module {item}')
-    if input_config.filename_restriction_scheme is not None:
-        command_list.append(f'--filename-restriction-scheme {input_config.filename_restriction_scheme}')
-    if input_config.ignore_user is not None:
-        for item in input_config.ignore_user:
-            command_list.append(f'--ignore-user {item}')
-    if input_config.include_id_file is not None:
-        for item in input_config.include_id_file:
-            command_list.append(f'--include-id-file {item}')
-    if input_config.log is not None:
-        command_list.append(f'--log {input_config.log}')
-    if input_config.saved:
-        command_list.append('--saved')
-    if input_config.search is not None:
-        command_list.append(f'--search {input_config.search}')
-    if input_config.submitted:
-        command_list.append('--submitted')
-    if input_config.upvoted:
-        command_list.append('--upvoted')
-    if input_config.limit is not None:
-        command_list.append(f'--limit {input_config.limit}')
-    if input_config.sort != SortType.HOT:
-        command_list.append(f'--sort {input_config.sort.value}')
-    if input_config.link is not None:
-        for item in input_config.link:
-            command_list.append(f'--link {item}')
-    if input_config.multireddit is not None:
-        for item in input_config.multireddit:
-            command_list.append(f'--multireddit {item}')
-    if input_config.subreddit is not None:
-        for item in input_config.subreddit:
-            command_list.append(f'--subreddit {item}')
-    if input_config.time != TimeFilter.ALL:
-        command_list.append(f'--time {input_config.time.value}')
-    if input_config.time_format is not None:
-        command_list.append(f'--time-format {input_config.time_format}')
-    if input_config.user is not None:
-        for item in input_config.user:
-            command_list.append(f'--user {item}')
-    if input_config.verbose is not None and input_config.verbose != 0:
-        command_list.append(f'-{"v" * input_config.verbose}')
-
-    downloader_command = ''
-
-    if input_config.download_config is not None:
-        downloader_command = serialize_downloader_configuration(input_config.download_config)
-
-    archiver_command = ''
-
-    if (input_config.archiver_config):
-        archiver_command += '--all-comments ' if input_config.archiver_config.all_comments else ''
-
-        if input_config.archiver_config.format != Format.JSON:
-            archiver_command += f'-f {input_config.archiver_config.format.value}'
-
-        archiver_command += '--comment-context ' if input_config.archiver_config.comment_context else ''
-
-    return ' '.join(command_list) + ' ' + downloader_command + ' ' + archiver_command
+    # The first positional argument of BDFR after the sub command, the first field so it is serialized first
+    directory: str = field(default=None, metadata=cli_option(None))
+    authenticate: bool = field(default=False, metadata=cli_option('--authenticate'))
+    config: str = field(default=None, metadata=cli_option('--config'))
+    opts: str = field(default=None, metadata=cli_option('--opts'))
+    disable_module: List[str] = field(default=None, metadata=cli_option('--disable-module', repeatable=True))
+    filename_restriction_scheme: str = field(default=None, metadata=cli_option('--filename-restriction-scheme'))
+    ignore_user: List[str] = field(default=None, metadata=cli_option('--ignore-user', repeatable=True))
+    include_id_file: List[str] = field(default=None, metadata=cli_option('--include-id-file', repeatable=True))
+    log: str = field(default=None, metadata=cli_option('--log'))
+    saved: bool = field(default=False, metadata=cli_option('--saved'))
+    search: str = field(default=None, metadata=cli_option('--search'))
+    submitted: bool = field(default=False, metadata=cli_option('--submitted'))
+    upvoted: bool = field(default=False, metadata=cli_option('--upvoted'))
+    limit: int = field(default=None, metadata=cli_option('--limit'))
+    sort: SortType = field(default=SortType.HOT, metadata=cli_option('--sort'))
+    link: List[str] = field(default=None, metadata=cli_option('--link', repeatable=True))
+    multireddit: List[str] = field(default=None, metadata=cli_option('--multireddit', repeatable=True))
+    subreddit: List[str] = field(default=None, metadata=cli_option('--subreddit', repeatable=True))
+    time: TimeFilter = field(default=TimeFilter.ALL, metadata=cli_option('--time'))
+    time_format: str = field(default=None, metadata=cli_option('--time-format'))
+    user: List[str] = field(default=None, metadata=cli_option('--user', repeatable=True))
+    verbose: int = field(default=0, metadata=cli_option('-v', count=True))
+    download_config: DownloaderConfiguration = field(default_factory=DownloaderConfiguration)
+    archiver_config: ArchiverConfiguration = field(default_factory=ArchiverConfiguration)
+    resource_config: ResourceConfiguration = field(default_factory=ResourceConfiguration)
+
+
+def _compile_field_serializer(configuration_field) -> Callable[[object], List[str]]:
+    """
+    Compile the serializer of a single field from its cli metadata.
+    A field is omitted from the command if it is None, empty or equal to its default.
+    :param configuration_field: The dataclass field to compile the serializer for
+    :return: A function taking the field value and returning its arguments
+    """
+    option = configuration_field.metadata['cli']
+    flag = option['flag']
+    default = None if configuration_field.default is MISSING else configuration_field.default
+
+    if flag is None:
+        def serialize(value):
+            return [str(value)] if value is not None and value != '' else []
+    elif option['repeatable']:
+        def serialize(values):
+            if not values:
+                return []
+            # Interleave the flag with the values using slice assignment, much faster than a loop for large lists
+            argv = [flag] * (2 * len(values))
+            argv[1::2] = values
+            return argv
+    elif option['count']:
+        def serialize(value):
+            return [flag[0] + flag[1:] * value] if value else []
+    elif configuration_field.type == bool:
+        def serialize(value):
+            return [flag] if value else []
+    elif isinstance(default, Enum):
+        def serialize(value):
+            return [flag, value.value] if value is not None and value != default else []
+    else:
+        def serialize(value):
+            return [flag, str(value)] if value is not None and value != '' and value != default else []
+
+    return serialize
+
+
+@functools.lru_cache(maxsize=None)
+def get_field_serializers(configuration_class: type) -> dict:
+    """
+    Get the compiled serializers of all command line fields of a configuration dataclass, built once per class.
+    :param configuration_class: The configuration dataclass e.g. DownloaderConfiguration
+    :return: A dict of field name -> serializer, in command order
+    """
+    return {configuration_field.name: _compile_field_serializer(configuration_field)
+            for configuration_field in fields(configuration_class) if 'cli' in configuration_field.metadata}
+
+
+def serialize_field_to_argv(configuration, field_name: str) -> List[str]:
+    """
+    Serialize a single field of a configuration dataclass to its command line arguments.
+    :param configuration: The configuration (InputConfiguration, DownloaderConfiguration or ArchiverConfiguration)
+    :param field_name: The name of the field to serialize e.g. 'subreddit'
+    :return: The arguments e.g. ['--subreddit', 'pics'], empty if the field is not part of the command
+    """
+    return get_field_serializers(type(configuration))[field_name](getattr(configuration, field_name))
+
+
+def serialize_field(configuration, field_name: str) -> str:
+    """
+    Serialize a single field of a configuration dataclass to its (shell quoted) command line fragment.
+    :param configuration: The configuration (InputConfiguration, DownloaderConfiguration or ArchiverConfiguration)
+    :param field_name: The name of the field to serialize e.g. 'subreddit'
+    :return: The fragment e.g. '--subreddit pics --subreddit funny', '' if the field is not part of the command
+    """
+    return argv_to_string(serialize_field_to_argv(configuration, field_name))
+
+
+def get_serialized_fields(input_config: InputConfiguration) -> list:
+    """
+    Get all (configuration, field_name) pairs that make up the serialized command, in command order.
+    :param input_config: The configuration to get the fields of
+    :return: A list of (configuration, field_name) tuples, covering the nested configurations too
+    """
+    serialized_fields = []
+
+    for configuration in (input_config, input_config.download_config, input_config.archiver_config):
+        if configuration is not None:
+            serialized_fields.extend((configuration, field_name)
+                                     for field_name in get_field_serializers(type(configuration)))
+
+    return serialized_fields
+
+
+def serialize_configuration_to_argv(configuration) -> List[str]:
+    """
+    Serialize the command line fields of a single configuration dataclass, without nested configurations.
+    :param configuration: The configuration to serialize
+    :return: The argument list
+    """
+    argv = []
+    for field_name, serializer in get_field_serializers(type(configuration)).items():
+        argv.extend(serializer(getattr(configuration, field_name)))
+    return argv
+
+
+def serialize_input_configuration_to_argv(input_config: InputConfiguration, mode: str = None) -> List[str]:
+    """
+    Serialize a configuration including its downloader and archiver configuration to an argument list, that can
+    be passed to subprocess as is.
+    :param input_config: The configuration to serialize
+    :param mode: The BDFR sub command, only its options are serialized. All options if None, e.g. for a preview.
+    :return: The argument list e.g. ['--subreddit', 'pics', '--no-dupes']
+    """
+    argv = serialize_configuration_to_argv(input_config)
+
+    download_config = input_config.download_config
+    if download_config is not None and mode == 'archive':
+        serializers = get_field_serializers(DownloaderConfiguration)
+        for field_name in COMMON_DOWNLOADER_FIELDS:
+            argv.extend(serializers[field_name](getattr(download_config, field_name)))
+    elif download_config is not None:
+        argv.extend(serialize_configuration_to_argv(download_config))
+    if input_config.archiver_config is not None and mode != 'download':
+        argv.extend(serialize_configuration_to_argv(input_config.archiver_config))
+
+    return argv
+
+
+def argv_to_string(argv: List[str]) -> str:
+    """
+    Join an argument list to a string for display, quoting arguments for the shell where needed.
+    :param argv: The argument list
+    :return: The command line string
+    """
+    command = ' '.join(argv)
+
+    # Fast path, quoting each argument individually is slow for lists with hundreds of thousands of items.
+    # Nothing needs quoting if there are only safe characters, no empty arguments and no spaces inside arguments.
+    if (not command.encode('utf-8', 'surrogatepass').translate(None, _SAFE_SHELL_CHARACTERS) and all(argv)
+            and command.count(' ') == len(argv) - 1):
+        return command
+
+    return ' '.join(map(shlex.quote, argv))
+
+
+def serialize_downloader_configuration(downloader_config: DownloaderConfiguration) -> str:
+    return argv_to_string(serialize_configuration_to_argv(downloader_config))
+
+
+def serialize_archiver_configuration(archiver_config: ArchiverConfiguration) -> str:
+    return argv_to_string(serialize_configuration_to_argv(archiver_config))
+
+
+def serialize_input_configuration(input_config: InputConfiguration) -> str:
+    return argv_to_string(serialize_input_configuration_to_argv(input_config))
 
 
 def is_none_or_empty(value):
     return value is None or value == '' or value == []
+
+
+def _is_string_list(value) -> bool:
+    if not isinstance(value, Sequence) or isinstance(value, str):
+        return False
+    # Other sequences (e.g. IdSet) only hold strings by construction
+    return not isinstance(value, list) or all(isinstance(item, str) for item in value)
+
+
+def _compile_type_check(field_type: type) -> Tuple[Callable[[object], bool], str]:
+    if field_type == List[str]:
+        return _is_string_list, 'expected a list of strings'
+    if field_type == bool:
+        return lambda value: isinstance(value, bool), 'expected true or false'
+    if field_type == int:
+        # bool is a subclass of int, but True is not a valid limit
+        return lambda value: isinstance(value, int) and not isinstance(value, bool), 'expected an integer'
+    if field_type == float:
+        return lambda value: isinstance(value, (int, float)) and not isinstance(value, bool), 'expected a number'
+    return lambda value: isinstance(value, field_type), f'expected {field_type.__name__}'
+
+
+@functools.lru_cache(maxsize=None)
+def get_field_type_checks(configuration_class: type) -> list:
+    """
+    Get the type checks of all non nested fields of a configuration dataclass, built once per class.
+    :param configuration_class: The configuration dataclass e.g. DownloaderConfiguration
+    :return: A list of (field name, check, problem) tuples, check returns False for values of the wrong type
+    """
+    return [(configuration_field.name, *_compile_type_check(configuration_field.type))
+            for configuration_field in fields(configuration_class) if not is_dataclass(configuration_field.type)]
+
+
+def validate_input_configuration(input_config: InputConfiguration, mode: str = 'download') -> List[str]:
+    """
+    Check a configuration for values BDFR would reject, without serializing it.
+    :param input_config: The configuration to check
+    :param mode: The BDFR sub command the configuration is used with
+    :return: A list of problems, empty if the configuration is valid
+    """
+    problems = []
+
+    if mode not in BDFR_MODES:
+        problems.append(f'Unknown mode {mode}, expected one of {", ".join(BDFR_MODES)}')
+
+    for configuration, prefix in ((input_config, ''), (input_config.download_config, 'download_config.'),
+                                  (input_config.archiver_config, 'archiver_config.'),
+                                  (input_config.resource_config, 'resource_config.')):
+        if configuration is None:
+            continue
+        for field_name, check, problem in get_field_type_checks(type(configuration)):
+            value = getattr(configuration, field_name)
+            if value is not None and not check(value):
+                problems.append(f'{prefix}{field_name}: {problem}, got {value!r}')
+
+    # Type problems make the checks below meaningless
+    if problems:
+        return problems
+
+    if not input_config.directory:
+        problems.append('No directory, BDFR requires the directory to download to')
+    if not (input_config.subreddit or input_config.user or input_config.multireddit or input_config.link
+            or input_config.include_id_file or input_config.search):
+        problems.append('No targets, set at least one of subreddit, user, multireddit, link or include_id_file')
+    if (input_config.saved or input_config.upvoted or input_config.submitted) and not input_config.user:
+        problems.append('saved, upvoted and submitted require a user')
+    if input_config.multireddit and not input_config.user:
+        problems.append('multireddit requires the user owning the multireddits')
+    if input_config.limit is not None and input_config.limit <= 0:
+        problems.append('limit must be greater than 0')
+    if input_config.verbose is not None and input_config.verbose < 0:
+        problems.append('verbose must not be negative')
+
+    download_config = input_config.download_config
+    if download_config is not None:
+        if download_config.max_wait_time is not None and download_config.max_wait_time <= 0:
+            problems.append('download_config.max_wait_time must be greater than 0')
+        if (download_config.min_score is not None and download_config.max_score is not None
+                and download_config.min_score > download_config.max_score):
+            problems.append('download_config.min_score is greater than download_config.max_score')
+        for field_name in ('min_score_ratio', 'max_score_ratio'):
+            ratio = getattr(download_config, field_name)
+            if ratio is not None and not 0 <= ratio <= 1:
+                problems.append(f'download_config.{field_name} must be between 0 and 1')
+
+    resource_config = input_config.resource_config
+    if resource_config is not None:
+        if resource_config.nice is not None and not 0 <= resource_config.nice <= 19:
+            problems.append('resource_config.nice must be between 0 and 19')
+        if resource_config.io_priority is not None and not 0 <= resource_config.io_priority <= 7:
+            problems.append('resource_config.io_priority must be between 0 and 7')
+        for field_name in ('max_memory_mb', 'max_open_files'):
+            limit = getattr(resource_config, field_name)
+            if limit is not None and limit <= 0:
+                problems.append(f'resource_config.{field_name} must be greater than 0')
+
+    return problems
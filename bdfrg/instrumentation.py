@@ -0,0 +1,157 @@
+"""
+Latency measurements of hot paths, to tell with data whether and where the GUI is slow.
+
+Functions are measured by decorating them with timed(name). The durations of the most recent calls are kept per
+name in a fixed size ring, so the overhead per call is two clock reads and a store, independent of how long the
+application runs. The GUI shows the percentiles in a debug panel and can dump them as JSON.
+"""
+import functools
+import json
+import math
+import os
+import time
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List
+
+# Number of most recent durations kept per name, the percentiles are computed over these
+SAMPLE_CAPACITY = 2048
+
+# Set BDFRG_INSTRUMENTATION=0 to skip the measurements altogether
+ENABLED = os.environ.get('BDFRG_INSTRUMENTATION', '1') != '0'
+
+
+@dataclass
+class LatencyStats:
+    name: str
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+
+    def summary(self) -> str:
+        return f'{self.name}: {self.count} calls, p50 {self.p50_ms:.2f} ms, p99 {self.p99_ms:.2f} ms, ' \
+               f'max {self.max_ms:.2f} ms'
+
+
+class LatencySeries:
+    """
+    The durations of the most recent calls of one name, plus the count, total and maximum of all calls.
+
+    :param name: The name of the measured function or event.
+    :type name: str
+    :param capacity: The number of most recent durations kept.
+    :type capacity: int
+    """
+
+    def __init__(self, name: str, capacity: int = SAMPLE_CAPACITY):
+        self.name = name
+        self.samples = array('d', bytes(8 * capacity))
+        self.capacity = capacity
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.samples[self.count % self.capacity] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def stats(self) -> LatencyStats:
+        """
+        Compute the percentiles of the kept durations.
+        :return: The statistics, in milliseconds
+        """
+        samples = sorted(self.samples[:min(self.count, self.capacity)])
+        if not samples:
+            return LatencyStats(self.name, 0, 0.0, 0.0, 0.0, 0.0)
+
+        def percentile(fraction: float) -> float:
+            # Nearest rank
+            return samples[max(0, math.ceil(fraction * len(samples)) - 1)] * 1000
+
+        return LatencyStats(self.name, self.count, self.total / self.count * 1000, percentile(0.5),
+                            percentile(0.99), self.max * 1000)
+
+
+class LatencyRecorder:
+    """
+    The latency series of all names.
+    """
+
+    def __init__(self):
+        self.series: Dict[str, LatencySeries] = {}
+        self.enabled = ENABLED
+        self.started_at = time.time()
+
+    def get_series(self, name: str) -> LatencySeries:
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = LatencySeries(name)
+        return series
+
+    def record(self, name: str, seconds: float):
+        if self.enabled:
+            self.get_series(name).add(seconds)
+
+    def snapshot(self) -> List[LatencyStats]:
+        """
+        Get the statistics of all names that were measured at least once.
+        :return: The statistics, sorted by name
+        """
+        return [series.stats() for name, series in sorted(self.series.items()) if series.count]
+
+    def reset(self):
+        # The series are kept, the decorated functions hold on to them
+        for series in self.series.values():
+            series.clear()
+        self.started_at = time.time()
+
+    def to_json(self, extra: dict = None) -> str:
+        """
+        Serialize the statistics of all names.
+        :param extra: Additional values stored in the document, e.g. counters of the caller
+        :return: A JSON document with the measurement period and one object per name
+        """
+        document = {'started_at': self.started_at, 'dumped_at': time.time(),
+                    'latencies': [asdict(stats) for stats in self.snapshot()]}
+        document.update(extra or {})
+        return json.dumps(document, indent=2)
+
+
+# Shared by all measured functions
+recorder = LatencyRecorder()
+
+
+def timed(name: str) -> Callable:
+    """
+    Measure the duration of every call of the decorated function.
+    :param name: The name the durations are recorded under
+    :return: The decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        # Resolved once, the wrapper does not look up the series per call
+        series = recorder.get_series(name)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                series.add(perf_counter() - start)
+
+        return wrapper
+
+    return decorator
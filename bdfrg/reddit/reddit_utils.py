@@ -1,7 +1,8 @@
 # Enum of Reddit URL Types
+import functools
+import re
 from enum import Enum
-
-from bdfrg import string_utils
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
 
 
 class RedditUrlType(Enum):
@@ -12,32 +13,109 @@ class RedditUrlType(Enum):
     COMMENT = 'comment'
 
 
+class RedditUrl(NamedTuple):
+    # The type of the URL e.g. RedditUrlType.POST
+    type: RedditUrlType
+    # The identifying part for the type e.g. the post ID
+    identifier: str
+    # The identifying part of the parent if the URL has one e.g. the subreddit of a post, the post of a comment or
+    # the user owning a multireddit
+    parent: Optional[str] = None
+
+
+# Matches all supported Reddit URLs in a single pass. Hosts may be www., old., np., new. or m. reddit.com or the
+# redd.it short links, the scheme is optional and anything after the identifying parts (query string, fragment,
+# title slug, trailing path) is ignored without being scanned.
+REDDIT_URL_PATTERN = re.compile(r'''
+    ^(?:https?://)?
+    (?:
+        (?:(?:www|old|np|new|m)\.)?reddit\.com
+        (?:
+            /r/(?P<subreddit>\w+)
+            (?:/comments/(?P<post>\w+)
+                (?:/(?:comment|[^/?#]*)/(?P<comment>\w+))?
+            )?
+          | /(?:u|user)/(?P<user>[\w-]+)
+            (?:/m/(?P<multireddit>\w+))?
+        )
+      | redd\.it/(?P<short_post>\w+)
+    )
+    (?![^/?#])
+''', re.ASCII | re.IGNORECASE | re.VERBOSE)
+
+# The groups of the pattern never nest, so the last matched group is the most specific part of the URL.
+# Maps the index of that group to the type of the URL and the index of the group holding the parent (0 for none).
+_LAST_GROUP_TYPES = {
+    REDDIT_URL_PATTERN.groupindex['subreddit']: (RedditUrlType.SUBREDDIT, 0),
+    REDDIT_URL_PATTERN.groupindex['post']: (RedditUrlType.POST, REDDIT_URL_PATTERN.groupindex['subreddit']),
+    REDDIT_URL_PATTERN.groupindex['comment']: (RedditUrlType.COMMENT, REDDIT_URL_PATTERN.groupindex['post']),
+    REDDIT_URL_PATTERN.groupindex['user']: (RedditUrlType.USER, 0),
+    REDDIT_URL_PATTERN.groupindex['multireddit']: (RedditUrlType.MULTIREDDIT, REDDIT_URL_PATTERN.groupindex['user']),
+    REDDIT_URL_PATTERN.groupindex['short_post']: (RedditUrlType.POST, 0),
+}
+
+# Number of parsed URLs kept for repeated lookups
+PARSE_CACHE_SIZE = 65536
+
+
+def _parse_reddit_url(url: str) -> RedditUrl:
+    match = REDDIT_URL_PATTERN.match(url)
+
+    if match is None:
+        if 'reddit.com' not in url.lower() and 'redd.it' not in url.lower():
+            raise Exception(f'Not a Reddit URL: {url}')
+        raise Exception(f'Could not determine Reddit URL type from {url}. Unsupported URL type.')
+
+    url_type, parent_group = _LAST_GROUP_TYPES[match.lastindex]
+    return RedditUrl(url_type, match.group(match.lastindex), match.group(parent_group) if parent_group else None)
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_reddit_url(url: str) -> RedditUrl:
+    """
+    Parse a Reddit URL into its type, identifying part and parent in a single pass. Results are cached.
+    For example https://old.reddit.com/r/AskReddit/comments/9x9q0p/what_is/ is parsed to
+    RedditUrl(RedditUrlType.POST, '9x9q0p', 'AskReddit').
+    :param url: The URL to parse
+    :return: The parsed URL
+    """
+    return _parse_reddit_url(url)
+
+
+def parse_reddit_urls(urls: Iterable[str]) -> Iterator[Tuple[str, Optional[RedditUrl], Optional[str]]]:
+    """
+    Parse many Reddit URLs lazily, without raising for invalid ones.
+    Repeated URLs are parsed once, using a memo local to the batch which is cheaper than the LRU cache for
+    imports with mostly unique URLs.
+    :param urls: The URLs to parse
+    :return: A generator of (url, parsed URL, None) for valid and (url, None, error message) for invalid URLs
+    """
+    memo = {}
+
+    for url in urls:
+        result = memo.get(url)
+
+        if result is None:
+            try:
+                result = _parse_reddit_url(url), None
+            except Exception as e:
+                result = None, str(e)
+
+            # Keep the memory of the memo bounded for huge imports
+            if len(memo) >= PARSE_CACHE_SIZE:
+                memo.clear()
+            memo[url] = result
+
+        yield url, result[0], result[1]
+
+
 def get_reddit_type_from_url(url: str) -> RedditUrlType:
     """
     Get the type of a Reddit URL. E.g. a subreddit, a user, a post, a comment, etc.
     :param url: The URL to get the type of e.g. https://www.reddit.com/r/AskReddit/comments/9x9q0p/what_is_the_most_underrated_movie_of_all_time/
     :return: The type of the URL
     """
-    if url.startswith('https://reddit.com'):
-        # add www. to the url
-        url = url.replace('https://reddit.com', 'https://www.reddit.com')
-
-    if not url.startswith('https://www.reddit.com'):
-        raise Exception(f'Not a Reddit URL: {url}')
-
-    url = url.lower()
-    if url.startswith('https://www.reddit.com/user/') and '/m/' in url:
-        return RedditUrlType.MULTIREDDIT
-    elif url.startswith('https://www.reddit.com/user/'):
-        return RedditUrlType.USER
-    elif url.startswith('https://www.reddit.com/r/'):
-        if '/comments/' in url:
-            if '/comment/' in url:
-                return RedditUrlType.COMMENT
-            return RedditUrlType.POST
-        return RedditUrlType.SUBREDDIT
-
-    raise Exception(f'Could not determine Reddit URL type from {url}. Unsupported URL type.')
+    return parse_reddit_url(url).type
 
 
 def get_identifying_part_of_reddit_url(url: str, url_type: RedditUrlType) -> str:
@@ -48,20 +126,14 @@ def get_identifying_part_of_reddit_url(url: str, url_type: RedditUrlType) -> str
     :param url_type: The type of the URL e.g. RedditUrlType.SUBREDDIT
     :return: The identifying part of the URL e.g. AskReddit
     """
-    if url_type == RedditUrlType.SUBREDDIT:
-        # Go from https://www.reddit.com/r/ till the end or next / to get the subreddit
-        return string_utils.get_substring_from_string(url, 'https://www.reddit.com/r/', '/')
-    elif url_type == RedditUrlType.USER:
-        # Go from https://www.reddit.com/user/ till the end or next / to get the user
-        return string_utils.get_substring_from_string(url, 'https://www.reddit.com/user/', '/')
-    elif url_type == RedditUrlType.MULTIREDDIT:
-        # Go from https://www.reddit.com/user/user/m/ till the end or next / to get the multireddit
-        return string_utils.get_substring_from_string(url, '/m/', '/')
-    elif url_type == RedditUrlType.POST:
-        # Go from https://www.reddit.com/r/subreddit/comments/ till the end or next / to get the post
-        return string_utils.get_substring_from_string(url, '/comments/', '/')
-    elif url_type == RedditUrlType.COMMENT:
-        # Go from https://www.reddit.com/r/xxxx/comments/id/comment/ till the end or next / to get the comment
-        return string_utils.get_substring_from_string(url, '/comment/', '/')
+    reddit_url = parse_reddit_url(url)
+
+    if reddit_url.type == url_type:
+        return reddit_url.identifier
+    # The parent of a post is its subreddit, the parent of a multireddit its user
+    if (url_type, reddit_url.type) in ((RedditUrlType.SUBREDDIT, RedditUrlType.POST),
+                                       (RedditUrlType.USER, RedditUrlType.MULTIREDDIT),
+                                       (RedditUrlType.POST, RedditUrlType.COMMENT)):
+        return reddit_url.parent
 
     raise Exception(f'Could not get identifying part of Reddit URL {url} of type {url_type}')
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from itertools import tee
+from typing import Dict, Iterable, List, Tuple
+
+from bdfrg.reddit import reddit_utils
+from bdfrg.reddit.reddit_utils import RedditUrlType
+
+# The InputConfiguration field each URL type is imported into
+URL_TYPE_FIELDS = {
+    RedditUrlType.SUBREDDIT: 'subreddit',
+    RedditUrlType.MULTIREDDIT: 'multireddit',
+    RedditUrlType.USER: 'user',
+    RedditUrlType.POST: 'link',
+    RedditUrlType.COMMENT: 'link',
+}
+
+# Only this many invalid lines are kept for the report, the rest is only counted
+MAX_REPORTED_INVALID_LINES = 100
+
+
+@dataclass
+class UrlImportResult:
+    # Field name -> identifying parts in input order, without duplicates
+    targets: Dict[str, List[str]] = field(default_factory=dict)
+    # (line number, line, reason) of the first MAX_REPORTED_INVALID_LINES invalid lines
+    invalid_lines: List[Tuple[int, str, str]] = field(default_factory=list)
+    invalid_count: int = 0
+    duplicate_count: int = 0
+
+    @property
+    def imported_count(self) -> int:
+        return sum(len(values) for values in self.targets.values())
+
+    def summary(self) -> str:
+        """
+        Create a human readable report of the import.
+        :return: The counts per field followed by the invalid lines
+        """
+        lines = [f'Imported {self.imported_count} entries, skipped {self.duplicate_count} duplicates '
+                 f'and {self.invalid_count} invalid lines']
+        lines.extend(f'  {field_name}: {len(values)}' for field_name, values in self.targets.items())
+
+        if self.invalid_lines:
+            lines.append('Invalid lines:')
+            lines.extend(f'  {line_number}: {line} ({reason})' for line_number, line, reason in self.invalid_lines)
+            if self.invalid_count > len(self.invalid_lines):
+                lines.append(f'  ... and {self.invalid_count - len(self.invalid_lines)} more')
+
+        return '\n'.join(lines)
+
+
+def classify_urls(lines: Iterable[str], existing: Dict[str, Iterable[str]] = None) -> UrlImportResult:
+    """
+    Classify Reddit URLs and sort their identifying parts into the configuration fields they belong to.
+    The lines are consumed one by one, so a file object can be passed without reading it into memory.
+    Blank lines and lines starting with # are ignored.
+    :param lines: The URLs, one per line
+    :param existing: Values already present per field, these are counted as duplicates and not imported again
+    :return: The classified entries and a report of duplicate and invalid lines
+    """
+    result = UrlImportResult()
+    seen = {field_name: set(values) for field_name, values in (existing or {}).items()}
+
+    # Strip the lines lazily and drop blank and comment lines before they are parsed
+    numbered_urls = ((line_number, line.strip()) for line_number, line in enumerate(lines, start=1))
+    numbered_urls = ((line_number, url) for line_number, url in numbered_urls if url and not url.startswith('#'))
+    # The parser yields one result per URL, so the line numbers can be zipped back in (tee buffers a single item)
+    numbered_urls, urls = tee(numbered_urls)
+    parsed_urls = reddit_utils.parse_reddit_urls(url for _, url in urls)
+
+    for (line_number, url), (_, reddit_url, error) in zip(numbered_urls, parsed_urls):
+        if reddit_url is None:
+            result.invalid_count += 1
+            if len(result.invalid_lines) < MAX_REPORTED_INVALID_LINES:
+                result.invalid_lines.append((line_number, url, error))
+            continue
+
+        url_type, identifying_part = reddit_url.type, reddit_url.identifier
+        field_name = URL_TYPE_FIELDS[url_type]
+        field_seen = seen.setdefault(field_name, set())
+
+        if identifying_part in field_seen:
+            result.duplicate_count += 1
+            continue
+
+        field_seen.add(identifying_part)
+        result.targets.setdefault(field_name, []).append(identifying_part)
+
+    return result
+
+
+def classify_urls_from_file(path: str, existing: Dict[str, Iterable[str]] = None) -> UrlImportResult:
+    """
+    Classify the Reddit URLs of a text file, one URL per line. See classify_urls.
+    :param path: The path of the file
+    :param existing: Values already present per field, these are not imported again
+    :return: The classified entries and a report of duplicate and invalid lines
+    """
+    with open(path, encoding='utf-8', errors='replace') as file:
+        return classify_urls(file, existing)
@@ -0,0 +1,286 @@
+"""
+Predicts the directory layout a file and folder scheme produce, before anything is downloaded.
+
+The schemes are expanded for a set of posts, either real post metadata (JSON files written by "bdfr archive", or
+JSON Lines of them) or a synthetic sample built from the configuration. From the expanded paths the number of
+directories, the maximum number of files per directory and paths exceeding file system limits are computed.
+"""
+import functools
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from bdfrg.execution.progress import get_expected_post_count
+from bdfrg.input_configuration import InputConfiguration
+
+SCHEME_KEYS = ('DATE', 'FLAIR', 'POSTID', 'REDDITOR', 'SUBREDDIT', 'TITLE', 'UPVOTES')
+
+# Limits of common file systems, in bytes of the UTF-8 encoded name
+MAX_NAME_LENGTH = 255
+MAX_PATH_LENGTH = 4096
+MAX_WINDOWS_PATH_LENGTH = 260
+
+# Directories with more files than this get slow to list and to look up on most file systems
+MAX_FILES_PER_DIRECTORY = 10000
+
+# Characters removed from the values of the keys, depending on the filename restriction scheme
+_WINDOWS_ILLEGAL_CHARACTERS = re.compile(r'[<>:"\\|?*\x00-\x1f]')
+
+_SCHEME_KEY_PATTERN = re.compile(r'{(\w+)}')
+
+# The extension assumed for all files, BDFR keeps the one of the downloaded resource
+SAMPLE_EXTENSION = '.jpg'
+
+# Number of synthetic posts analyzed if no post metadata is given
+SAMPLE_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=64)
+def compile_scheme(scheme: str) -> Callable[[dict], str]:
+    """
+    Compile a scheme into a function expanding it for the values of a post, cached per scheme so that expanding a
+    scheme while it is typed only compiles the new text.
+    Unknown keys are kept as they are, like BDFR does.
+    :param scheme: The scheme e.g. '{REDDITOR}_{TITLE}_{POSTID}'
+    :return: A function taking the values of a post by key and returning the expanded scheme
+    """
+    parts = []
+    position = 0
+    for match in _SCHEME_KEY_PATTERN.finditer(scheme):
+        parts.append(scheme[position:match.start()].replace('{', '{{').replace('}', '}}'))
+        key = match.group(1)
+        parts.append(f'{{{key}}}' if key in SCHEME_KEYS else f'{{{{{key}}}}}')
+        position = match.end()
+    parts.append(scheme[position:].replace('{', '{{').replace('}', '}}'))
+
+    return ''.join(parts).format_map
+
+
+def get_post_values(post: dict, restriction_scheme: str = None, time_format: str = None) -> dict:
+    """
+    Get the values of the scheme keys for a post.
+    :param post: The post in the format written by "bdfr archive" (id, title, author, subreddit, score, ...)
+    :param restriction_scheme: The filename restriction scheme, 'windows' removes characters Windows does not allow
+    :param time_format: The strftime format of {DATE}, ISO 8601 if not given
+    :return: The values by key
+    """
+    created = time.gmtime(post.get('created_utc') or 0)
+    if time_format and time_format.upper() != 'ISO':
+        date = time.strftime(time_format, created)
+    else:
+        date = time.strftime('%Y-%m-%dT%H:%M:%S', created)
+
+    values = {'DATE': date,
+              'FLAIR': post.get('link_flair_text') or '',
+              'POSTID': post.get('id') or '',
+              'REDDITOR': post.get('author') or 'DELETED',
+              'SUBREDDIT': post.get('subreddit') or '',
+              'TITLE': post.get('title') or '',
+              'UPVOTES': str(post.get('score') or 0)}
+
+    # Values never create sub directories
+    for key, value in values.items():
+        value = value.replace('/', '')
+        if restriction_scheme == 'windows':
+            value = _WINDOWS_ILLEGAL_CHARACTERS.sub('', value)
+        values[key] = value
+    return values
+
+
+def load_posts(path: str, limit: int = None) -> Iterator[dict]:
+    """
+    Load post metadata from a JSON Lines file, a JSON file or a directory of JSON files written by "bdfr archive".
+    :param path: The file or directory
+    :param limit: The maximum number of posts to load
+    :return: A generator of posts
+    """
+    def read_file(file_path: str) -> Iterator[dict]:
+        with open(file_path, encoding='utf-8') as f:
+            if file_path.endswith('.jsonl'):
+                yield from (json.loads(line) for line in f if line.strip())
+            else:
+                yield json.load(f)
+
+    if os.path.isdir(path):
+        file_paths = (os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                      if name.endswith('.json') or name.endswith('.jsonl'))
+    else:
+        file_paths = [path]
+
+    count = 0
+    for file_path in file_paths:
+        for post in read_file(file_path):
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield post
+
+
+def generate_sample_posts(subreddits: List[str], users: List[str], count: int = SAMPLE_SIZE,
+                          seed: int = 0) -> List[dict]:
+    """
+    Generate synthetic posts, with realistic title lengths and dates spread over the last year. The sample is
+    deterministic for the same arguments.
+    :param subreddits: The subreddits of the posts, 'pics' if empty
+    :param users: The authors of the posts, random names if empty
+    :param count: The number of posts
+    :param seed: The seed of the random values
+    :return: The posts
+    """
+    generator = random.Random(seed)
+    subreddits = subreddits or ['pics']
+    words = ['the', 'my', 'first', 'picture', 'of', 'a', 'very', 'old', 'cat', 'sunset', 'over', 'mountains', 'this',
+             'is', 'what', 'happened', 'today', 'after', 'years', 'finally', 'finished', 'build', 'OC']
+    flairs = ['', '', 'OC', 'Discussion', 'Art']
+    now = time.time()
+
+    posts = []
+    for index in range(count):
+        # Reddit titles are up to 300 characters, most are short
+        title_length = min(300, int(generator.expovariate(1 / 8)) + 1)
+        posts.append({'id': format(36 ** 6 + index * 7919, 'x'),
+                      'title': ' '.join(generator.choice(words) for _ in range(title_length))[:300],
+                      'author': generator.choice(users) if users else f'user{generator.randrange(count // 4 + 1)}',
+                      'subreddit': generator.choice(subreddits),
+                      'score': int(generator.expovariate(1 / 500)),
+                      'link_flair_text': generator.choice(flairs),
+                      'created_utc': now - generator.uniform(0, 365 * 24 * 3600)})
+    return posts
+
+
+@dataclass
+class SchemeAnalysis:
+    post_count: int = 0
+    directory_count: int = 0
+    max_files_per_directory: int = 0
+    busiest_directory: str = ''
+    # Max files per directory extrapolated to the expected number of posts, None if that number is not known
+    projected_max_files_per_directory: Optional[int] = None
+    # File names BDFR has to shorten (it keeps the end with the ID)
+    truncated_file_names: int = 0
+    # Paths with a directory name or total length above the limit, downloading these fails
+    overflowing_paths: int = 0
+    longest_path_length: int = 0
+    example_path: str = ''
+    warnings: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        parts = [f'{self.directory_count} directories for {self.post_count} posts',
+                 f'max {self.max_files_per_directory} files in {self.busiest_directory or "."}']
+        if self.projected_max_files_per_directory is not None:
+            parts.append(f'about {self.projected_max_files_per_directory} at the expected post count')
+        parts.append(f'longest path {self.longest_path_length} bytes')
+        return ', '.join(parts)
+
+
+@functools.lru_cache(maxsize=8)
+def get_sample_post_values(subreddits: Tuple[str, ...], users: Tuple[str, ...], restriction_scheme: str = None,
+                           time_format: str = None) -> Tuple[dict, ...]:
+    """
+    Get the scheme values of the synthetic sample, cached so that only the schemes are expanded while typing.
+    :param subreddits: The subreddits of the posts
+    :param users: The authors of the posts
+    :param restriction_scheme: The filename restriction scheme
+    :param time_format: The format of {DATE}
+    :return: The values of every post, see get_post_values
+    """
+    return tuple(get_post_values(post, restriction_scheme, time_format)
+                 for post in generate_sample_posts(list(subreddits), list(users)))
+
+
+def analyze_schemes(post_values: Iterable[dict], file_scheme: str, folder_scheme: str, directory: str = '',
+                    expected_post_count: int = None, restriction_scheme: str = None) -> SchemeAnalysis:
+    """
+    Expand the schemes for every post and analyze the resulting paths.
+    :param post_values: The scheme values of the posts, see get_post_values
+    :param file_scheme: The file scheme
+    :param folder_scheme: The folder scheme
+    :param directory: The download directory, only used for the path lengths
+    :param expected_post_count: The number of posts the configuration is expected to download, for the projection
+    :param restriction_scheme: The filename restriction scheme
+    :return: The analysis
+    """
+    expand_file = compile_scheme(file_scheme)
+    expand_folder = compile_scheme(folder_scheme)
+    max_path_length = MAX_WINDOWS_PATH_LENGTH if restriction_scheme == 'windows' else MAX_PATH_LENGTH
+    directory_length = len(os.path.abspath(directory).encode()) + 1 if directory else 0
+
+    analysis = SchemeAnalysis()
+    files_per_directory = Counter()
+
+    for values in post_values:
+        folder = expand_folder(values).strip('/')
+        file_name = expand_file(values) + SAMPLE_EXTENSION
+
+        analysis.post_count += 1
+        files_per_directory[folder] += 1
+
+        file_name_length = len(file_name.encode())
+        if file_name_length > MAX_NAME_LENGTH:
+            analysis.truncated_file_names += 1
+            file_name_length = MAX_NAME_LENGTH
+
+        folder_length = len(folder.encode())
+        path_length = directory_length + (folder_length + 1 if folder else 0) + file_name_length
+        analysis.longest_path_length = max(analysis.longest_path_length, path_length)
+        # Only a folder longer than the name limit can have a directory name above it
+        if path_length > max_path_length or folder_length > MAX_NAME_LENGTH and any(
+                len(part.encode()) > MAX_NAME_LENGTH for part in folder.split('/')):
+            analysis.overflowing_paths += 1
+
+        if not analysis.example_path:
+            analysis.example_path = os.path.join(directory, folder, file_name)
+
+    if not analysis.post_count:
+        return analysis
+
+    analysis.directory_count = len(files_per_directory)
+    analysis.busiest_directory, analysis.max_files_per_directory = files_per_directory.most_common(1)[0]
+
+    max_files = analysis.max_files_per_directory
+    if expected_post_count is not None:
+        # Assumes the expected posts are spread over the directories like the sample
+        max_files = analysis.projected_max_files_per_directory = \
+            -(-analysis.max_files_per_directory * expected_post_count // analysis.post_count)
+
+    if max_files > MAX_FILES_PER_DIRECTORY:
+        analysis.warnings.append(f'Up to {max_files} files in a single directory, add a key like {{DATE}} or '
+                                 f'{{POSTID}} to the folder scheme to spread them')
+    if analysis.overflowing_paths:
+        analysis.warnings.append(f'{analysis.overflowing_paths} paths exceed the file system limits, shorten the '
+                                 f'schemes or the download directory')
+    if analysis.truncated_file_names:
+        analysis.warnings.append(f'{analysis.truncated_file_names} file names are longer than {MAX_NAME_LENGTH} '
+                                 f'bytes and will be shortened')
+    if '{POSTID}' not in file_scheme + folder_scheme:
+        analysis.warnings.append('Neither scheme contains {POSTID}, files of different posts may overwrite each '
+                                 'other and downloaded posts can not be indexed')
+
+    return analysis
+
+
+def analyze_configuration(input_config: InputConfiguration, posts: Iterable[dict] = None) -> SchemeAnalysis:
+    """
+    Analyze the schemes of a configuration.
+    :param input_config: The configuration
+    :param posts: The posts to expand the schemes for, a synthetic sample for the subreddits and users of the
+    configuration if not given
+    :return: The analysis
+    """
+    restriction_scheme = input_config.filename_restriction_scheme
+    time_format = input_config.time_format
+
+    if posts is None:
+        post_values = get_sample_post_values(tuple(input_config.subreddit or ()), tuple(input_config.user or ()),
+                                             restriction_scheme, time_format)
+    else:
+        post_values = (get_post_values(post, restriction_scheme, time_format) for post in posts)
+
+    download_config = input_config.download_config
+    return analyze_schemes(post_values, download_config.file_scheme or '', download_config.folder_scheme or '',
+                           input_config.directory or '', get_expected_post_count(input_config), restriction_scheme)
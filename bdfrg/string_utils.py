@@ -1,48 +1,48 @@
+import functools
+from typing import Iterator
+
+
+@functools.lru_cache(maxsize=256)
 def split_lines(text: str, max_characters_per_line: int) -> str:
     """
-    Split a string into multiple lines if any of the lines are too long.
+    Split a string into multiple lines if any of the lines are too long. Results are memoized per text and width.
     :param text: The text to split
     :param max_characters_per_line: The maximum number of characters per line
     :return: The text with new lines inserted
     """
 
-    # Split the text into lines
-    lines = text.splitlines()
-
-    new_lines = []
-
-    # Split the lines into multiple lines if they are too long
-    for i in range(len(lines)):
-        line = lines[i]
-        new_lines.extend(split_line(line, max_characters_per_line))
+    # Split the lines into multiple lines if they are too long and join them back together
+    return "\n".join(new_line for line in text.splitlines() for new_line in split_line(line, max_characters_per_line))
 
-    # Join the lines back together
-    return "\n".join(new_lines)
 
-
-def split_line(line: str, max_characters_per_line: int) -> []:
+def split_line(line: str, max_characters_per_line: int) -> Iterator[str]:
     """
-    Split a line into multiple lines if it is too long. Recursively splits the line if it is still too long.
+    Split a line into multiple lines if it is too long. The line is split at the last space before the maximum length,
+    or at the maximum length if there is no space.
     :param line:  The line to split
     :param max_characters_per_line: The maximum number of characters per line
-    :return: A list of lines
+    :return: A generator of the lines
+    :raises ValueError: If max_characters_per_line is not positive, no line would ever be short enough
     """
-    if len(line) <= max_characters_per_line:
-        return [line]
-
-    # Split the line at the next space after the max characters
-    split_index = line.rfind(" ", 0, max_characters_per_line)
-    if split_index == -1:
-        # No space found, split at the max characters
-        split_index = max_characters_per_line
-
-    # Split the line
-    lines = [line[:split_index]]
-
-    # Recursively split the rest of the line
-    lines.extend(split_line(line[split_index + 1:], max_characters_per_line))
+    if max_characters_per_line <= 0:
+        raise ValueError(f'max_characters_per_line must be positive, got {max_characters_per_line}')
+    start = 0
+
+    while len(line) - start > max_characters_per_line:
+        # Split the line at the last space before the max characters
+        split_index = line.rfind(" ", start, start + max_characters_per_line)
+        if split_index == -1:
+            # No space found, split at the max characters and keep all characters
+            split_index = start + max_characters_per_line
+            yield line[start:split_index]
+            start = split_index
+        else:
+            # Drop the space the line is split at
+            yield line[start:split_index]
+            start = split_index + 1
+
+    yield line[start:]
 
-    return lines
 
 def get_substring_from_string(string: str, start: str, end: str) -> str:
     """
@@ -55,9 +55,8 @@ def get_substring_from_string(string: str, start: str, end: str) -> str:
     start_index = string.find(start)
 
     # Check if end is found after start
-    if end in string[start_index:]:
-        end_index = string.find(end, start_index + len(start))
-    else:
+    end_index = string.find(end, start_index + len(start))
+    if end_index == -1:
         # End not found after start, return the rest of the string
         end_index = len(string)
 
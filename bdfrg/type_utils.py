@@ -1,4 +1,5 @@
 import dataclasses
+from collections.abc import Sequence
 from dataclasses import fields
 from enum import Enum
 from typing import Union, List
@@ -37,3 +38,65 @@ def convert_str_to_type(string: str, type_val: type):
         return getattr(type_val, string)
     else:
         raise Exception(f'Could not convert string to type {type_val}')
+
+
+def dataclass_to_dict(instance) -> dict:
+    """
+    Convert a dataclass instance to a dict of JSON compatible values. Enums are stored by name and nested dataclasses
+    are converted recursively.
+    :param instance: The dataclass instance to convert
+    :return: A dict of field name -> value
+    """
+    values = {}
+
+    for field in fields(instance):
+        value = getattr(instance, field.name)
+
+        if dataclasses.is_dataclass(value):
+            value = dataclass_to_dict(value)
+        elif isinstance(value, Enum):
+            value = value.name
+        elif isinstance(value, Sequence) and not isinstance(value, str):
+            value = list(value)
+
+        values[field.name] = value
+
+    return values
+
+
+def dataclass_from_dict(dataclass: dataclasses.dataclass, values: dict, instance=None):
+    """
+    Create or update a dataclass instance from a dict created by dataclass_to_dict. Fields missing from the dict keep
+    their current (or default) value, so partial dicts can be used as overrides.
+    :param dataclass: The dataclass to create
+    :param values: A dict of field name -> value
+    :param instance: The instance to update, a new instance with default values is created if not given
+    :return: The instance
+    """
+    if instance is None:
+        instance = dataclass()
+
+    field_types = get_field_types_of_dataclass(dataclass)
+
+    for field_name, value in values.items():
+        if field_name not in field_types:
+            raise Exception(f'Unknown field {field_name} for {dataclass.__name__}')
+
+        field_type = field_types[field_name]
+
+        if dataclasses.is_dataclass(field_type):
+            value = dataclass_from_dict(field_type, value, getattr(instance, field_name)) if value is not None else None
+        elif value is not None and isinstance(field_type, type) and issubclass(field_type, Enum):
+            if not isinstance(value, str) or value not in field_type.__members__:
+                raise Exception(f'{field_name}: unknown value {value!r}, expected one of '
+                                f'{", ".join(field_type.__members__)}')
+            value = field_type[value]
+        elif value is not None and field_type == List[str]:
+            # list() would split a single string into its characters
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                raise Exception(f'{field_name}: expected a list of strings, got {value!r}')
+            value = list(value)
+
+        setattr(instance, field_name, value)
+
+    return instance
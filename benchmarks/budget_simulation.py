@@ -0,0 +1,80 @@
+"""
+Runs jobs of the stub BDFR executable under a shared API budget with a simulated clock, SPEEDUP times faster than
+real time, and checks that the budget serializes the jobs it should. Archive jobs are estimated at 60 requests per
+minute, two of them exceed the budget of 90 and have to run one after another, download jobs run side by side.
+Exits with status 1 if jobs overlap that must not.
+Run from the repository root: python -m benchmarks.budget_simulation
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bdfrg.execution.job_runner import run_job_to_file
+from bdfrg.execution.rate_budget import BudgetLease, RateBudget
+
+# Simulated seconds per real second. The leases report every 2 real seconds, this has to stay below the lease
+# timeout of 30 simulated seconds.
+SPEEDUP = 10
+
+STUB_EXECUTABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_bdfr.py')
+
+
+class SimulatedClock:
+    """
+    A clock starting at 0 and running SPEEDUP times faster than real time, injected into the RateBudget.
+    """
+
+    def __init__(self):
+        self.real_start = time.monotonic()
+
+    def __call__(self) -> float:
+        return (time.monotonic() - self.real_start) * SPEEDUP
+
+
+def run_jobs(budget: RateBudget, mode: str, job_count: int, directory: str) -> list:
+    """
+    Run jobs of the stub concurrently, each one waits for the budget.
+    :return: The (admitted, finished) simulated times of every job
+    """
+    def run(index: int):
+        lease = BudgetLease(budget, f'{mode} {index}', mode)
+        command = [sys.executable, STUB_EXECUTABLE, mode, directory, '--limit', '20', '--stub-delay', '0.1']
+        return_code, _ = run_job_to_file(command, os.path.join(directory, f'{mode}{index}.out'), lease)
+        if return_code != 0:
+            raise Exception(f'The stub exited with {return_code}')
+        return lease.started, budget.clock()
+
+    with ThreadPoolExecutor(max_workers=job_count) as pool:
+        return list(pool.map(run, range(job_count)))
+
+
+def count_overlaps(spans: list) -> int:
+    return sum(1 for index, (start, end) in enumerate(spans) for other_start, other_end in spans[index + 1:]
+               if start < other_end and other_start < end)
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        budget = RateBudget(os.path.join(directory, 'rate_budget.sqlite3'), clock=SimulatedClock())
+        budget.configure(requests_per_minute=90, max_jobs=4)
+
+        for mode, job_count, expect_overlap in (('archive', 3, False), ('download', 3, True)):
+            spans = run_jobs(budget, mode, job_count, directory)
+            for index, (start, end) in enumerate(spans):
+                print(f'{mode} {index}: admitted at {start:.0f}s, finished at {end:.0f}s (simulated)')
+            overlaps = count_overlaps(spans)
+            print(f'{mode}: {overlaps} overlapping pairs, {budget.metrics().summary()}')
+            if expect_overlap != bool(overlaps):
+                failures.append(f'{mode} jobs {"did not run" if expect_overlap else "ran"} concurrently')
+        budget.close()
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures the time from starting the GUI until its window is drawn, and the number of widgets created by then.
+Given a git revision, e.g. the commit before a change, the GUI of that revision is measured as well for comparison.
+Needs a display. Without one the benchmark runs itself under xvfb-run, if installed.
+Run from the repository root: python -m benchmarks.gui_startup_benchmark [REVISION]
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+# Runs the GUI module as script, mainloop is replaced so that the process exits once the window is drawn. Older
+# revisions create the window when the module is run and import their siblings from the directory of the script.
+DRIVER_SCRIPT = '''
+import json, os, runpy, sys, time, tkinter
+start = time.perf_counter()
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+def measure(self, n=0):
+    self.update()
+    print(json.dumps({'ms': (time.perf_counter() - start) * 1000, 'widgets': count_widgets(self.winfo_toplevel())}))
+    self.winfo_toplevel().destroy()
+
+tkinter.Misc.mainloop = measure
+sys.path[:0] = [os.getcwd(), os.path.join(os.getcwd(), 'bdfrg', 'gui')]
+runpy.run_path(os.path.join('bdfrg', 'gui', 'configuration_gui.py'), run_name='__main__')
+'''
+
+
+def measure(directory: str) -> dict:
+    """
+    Start the GUI of a source tree RUNS times.
+    :param directory: The root of the source tree
+    :return: The fastest startup in milliseconds and the number of widgets
+    """
+    results = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, '-c', DRIVER_SCRIPT], cwd=directory, check=True, capture_output=True,
+                                text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return min(results, key=lambda result: result['ms'])
+
+
+def main():
+    if subprocess.run([sys.executable, '-c', 'import tkinter; tkinter.Tk()'], capture_output=True).returncode != 0:
+        xvfb_run = shutil.which('xvfb-run')
+        if xvfb_run is None or 'XVFB_RUN' in os.environ:
+            print('No display available and xvfb-run is not installed, run with a display')
+            sys.exit(2)
+        # Once, in case xvfb-run starts but its display does not work
+        os.environ['XVFB_RUN'] = '1'
+        sys.exit(subprocess.run([xvfb_run, '--auto-servernum', sys.executable, '-m', 'benchmarks.gui_startup_benchmark']
+                                + sys.argv[1:]).returncode)
+
+    trees = [('working tree', os.getcwd())]
+    with tempfile.TemporaryDirectory() as directory:
+        if len(sys.argv) > 1:
+            archive = subprocess.run(['git', 'archive', sys.argv[1]], check=True, capture_output=True).stdout
+            subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+            trees.insert(0, (sys.argv[1], directory))
+
+        for name, tree in trees:
+            result = measure(tree)
+            print(f'{name}: window drawn after {result["ms"]:.0f} ms, {result["widgets"]} widgets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures how fast a filter searches the lines already in a LogBuffer, and checks that the lines found by the background
+scan are the lines the same filter matches one by one as they are appended. Covers patterns matching the empty string
+(^, $, .*, x*), which once made the scan loop forever.
+Exits with status 1 if the results differ or a scan does not finish within SCAN_TIMEOUT_SECONDS.
+Run from the repository root: python -m benchmarks.log_filter_benchmark
+"""
+import sys
+import time
+
+from bdfrg.execution.log_buffer import LogBuffer, build_filter_pattern
+
+LINE_COUNT = 200000
+
+SCAN_TIMEOUT_SECONDS = 30
+
+PATTERNS = ['^', '$', '.*', 'x*', r'^\[', r'abc12$', r'ERROR', r'a\sb', r'^$']
+
+
+def generate_lines(count: int) -> list:
+    levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+    lines = []
+    for index in range(count):
+        if index % 50 == 0:
+            lines.append(('', False))
+        elif index % 7 == 0:
+            lines.append(('a', False))
+        else:
+            lines.append((f'[2024-01-01 00:00:00,000 - bdfr.downloader - {levels[index % 4]}] - Downloaded '
+                          f'submission abc{index % 13}', index % 11 == 0))
+    return lines
+
+
+def main():
+    failures = []
+    lines = generate_lines(LINE_COUNT)
+
+    for text in PATTERNS:
+        pattern = build_filter_pattern(text)
+        # Every line is appended to an unfiltered buffer first and scanned, then appended again while filtering live
+        log_buffer = LogBuffer()
+        log_buffer.append_lines(lines)
+
+        start = time.perf_counter()
+        log_filter = log_buffer.set_filter(pattern)
+        while not log_filter.live and time.perf_counter() - start < SCAN_TIMEOUT_SECONDS:
+            time.sleep(0.001)
+        seconds = time.perf_counter() - start
+        if not log_filter.live:
+            log_filter.cancel()
+            failures.append(f'{text!r}: the scan did not finish within {SCAN_TIMEOUT_SECONDS}s')
+            continue
+
+        scanned = list(log_filter.matches)
+        log_buffer.append_lines(lines)
+        live = [line_number - LINE_COUNT for line_number in log_filter.matches[len(scanned):]]
+        print(f'{text!r}: {len(scanned)} matches, scanned {LINE_COUNT} lines in {seconds * 1000:.0f} ms')
+        if scanned != live:
+            failures.append(f'{text!r}: the scan found {len(scanned)} lines, matching live found {len(live)}')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
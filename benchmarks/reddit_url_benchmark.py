@@ -0,0 +1,92 @@
+"""
+Compares the single pass Reddit URL parser with the previous type and identifying part functions.
+Run from the repository root: python -m benchmarks.reddit_url_benchmark
+"""
+import timeit
+
+from bdfrg.reddit.reddit_utils import RedditUrlType, parse_reddit_url, parse_reddit_urls
+
+
+def legacy_get_substring_from_string(string: str, start: str, end: str) -> str:
+    start_index = string.find(start)
+
+    if end in string[start_index:]:
+        end_index = string.find(end, start_index + len(start))
+    else:
+        end_index = len(string)
+
+    return string[start_index + len(start):end_index]
+
+
+def legacy_get_reddit_type_from_url(url: str) -> RedditUrlType:
+    if url.startswith('https://reddit.com'):
+        url = url.replace('https://reddit.com', 'https://www.reddit.com')
+
+    if not url.startswith('https://www.reddit.com'):
+        raise Exception(f'Not a Reddit URL: {url}')
+
+    url = url.lower()
+    if url.startswith('https://www.reddit.com/user/') and '/m/' in url:
+        return RedditUrlType.MULTIREDDIT
+    elif url.startswith('https://www.reddit.com/user/'):
+        return RedditUrlType.USER
+    elif url.startswith('https://www.reddit.com/r/'):
+        if '/comments/' in url:
+            if '/comment/' in url:
+                return RedditUrlType.COMMENT
+            return RedditUrlType.POST
+        return RedditUrlType.SUBREDDIT
+
+    raise Exception(f'Could not determine Reddit URL type from {url}. Unsupported URL type.')
+
+
+def legacy_get_identifying_part_of_reddit_url(url: str, url_type: RedditUrlType) -> str:
+    if url_type == RedditUrlType.SUBREDDIT:
+        return legacy_get_substring_from_string(url, 'https://www.reddit.com/r/', '/')
+    elif url_type == RedditUrlType.USER:
+        return legacy_get_substring_from_string(url, 'https://www.reddit.com/user/', '/')
+    elif url_type == RedditUrlType.MULTIREDDIT:
+        return legacy_get_substring_from_string(url, '/m/', '/')
+    elif url_type == RedditUrlType.POST:
+        return legacy_get_substring_from_string(url, '/comments/', '/')
+    elif url_type == RedditUrlType.COMMENT:
+        return legacy_get_substring_from_string(url, '/comment/', '/')
+
+    raise Exception(f'Could not get identifying part of Reddit URL {url} of type {url_type}')
+
+
+def legacy_parse(url: str):
+    url_type = legacy_get_reddit_type_from_url(url)
+    return url_type, legacy_get_identifying_part_of_reddit_url(url, url_type)
+
+
+def create_urls(count: int) -> list:
+    templates = ['https://www.reddit.com/r/subreddit{}/',
+                 'https://www.reddit.com/user/user{}/',
+                 'https://www.reddit.com/user/owner/m/multi{}/',
+                 'https://www.reddit.com/r/pics/comments/{:x}/some_title_of_the_post/',
+                 'https://www.reddit.com/r/pics/comments/abc/comment/{:x}/']
+    return [templates[i % len(templates)].format(i) for i in range(count)]
+
+
+def main():
+    unique_urls = create_urls(100_000)
+    # A bulk import typically contains the same subreddits and users many times
+    repeated_urls = create_urls(1_000) * 100
+
+    for name, urls in (('unique', unique_urls), ('repeated', repeated_urls)):
+        print(f'{len(urls)} {name} URLs')
+
+        legacy_seconds = min(timeit.repeat(lambda: [legacy_parse(url) for url in urls], number=1, repeat=3))
+        print(f'  {"legacy":<16}{legacy_seconds * 1000:10.2f} ms')
+
+        def parse_single():
+            parse_reddit_url.cache_clear()
+            return [parse_reddit_url(url) for url in urls]
+
+        for parser_name, parser in (('single pass', parse_single), ('batch', lambda: list(parse_reddit_urls(urls)))):
+            seconds = min(timeit.repeat(parser, number=1, repeat=3))
+            print(f'  {parser_name:<16}{seconds * 1000:10.2f} ms')
+
+if __name__ == '__main__':
+    main()
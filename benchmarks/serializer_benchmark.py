@@ -0,0 +1,148 @@
+"""
+Compares the metadata driven serializer with the previous hand written if chain on configurations with large lists.
+Run from the repository root: python -m benchmarks.serializer_benchmark
+"""
+import timeit
+
+from bdfrg.input_configuration import InputConfiguration, SortType, TimeFilter, Format, \
+    serialize_input_configuration, serialize_input_configuration_to_argv
+
+
+def legacy_serialize_downloader_configuration(downloader_config):
+    command_list = []
+    if downloader_config.make_hard_links:
+        command_list.append('--hard-link')
+    if downloader_config.max_wait_time is not None and downloader_config.max_wait_time != 120:
+        command_list.append(f'--max-wait-time {downloader_config.max_wait_time}')
+    if downloader_config.no_dupes:
+        command_list.append('--no-dupes')
+    if downloader_config.search_existing:
+        command_list.append('--search-existing')
+    if downloader_config.file_scheme != '{REDDITOR}_{TITLE}_{POSTID}':
+        command_list.append(f'--file-scheme {downloader_config.file_scheme}')
+    if downloader_config.folder_scheme != '{SUBREDDIT}':
+        command_list.append(f'--folder-scheme {downloader_config.folder_scheme}')
+    if downloader_config.exclude_id is not None:
+        for item in downloader_config.exclude_id:
+            command_list.append(f'--exclude-id {item}')
+    if downloader_config.exclude_id_file is not None:
+        for item in downloader_config.exclude_id_file:
+            command_list.append(f'--exclude-id-file {item}')
+    if downloader_config.skip_domain is not None:
+        for item in downloader_config.skip_domain:
+            command_list.append(f'--skip-domain {item}')
+    if downloader_config.skip is not None:
+        for item in downloader_config.skip:
+            command_list.append(f'--skip {item}')
+    if downloader_config.skip_subreddit is not None:
+        for item in downloader_config.skip_subreddit:
+            command_list.append(f'--skip-subreddit {item}')
+    if downloader_config.min_score is not None:
+        command_list.append(f'--min-score {downloader_config.min_score}')
+    if downloader_config.max_score is not None:
+        command_list.append(f'--max-score {downloader_config.max_score}')
+    if downloader_config.min_score_ratio is not None:
+        command_list.append(f'--min-score-ratio {downloader_config.min_score_ratio}')
+    if downloader_config.max_score_ratio is not None:
+        command_list.append(f'--max-score-ratio {downloader_config.max_score_ratio}')
+
+    return ' '.join(command_list)
+
+
+def legacy_serialize_input_configuration(input_config):
+    command_list = []
+    if input_config.directory is not None:
+        command_list.append(f'--directory {input_config.directory}')
+    if input_config.authenticate:
+        command_list.append('--authenticate')
+    if input_config.config is not None:
+        command_list.append(f'--config {input_config.config}')
+    if input_config.opts is not None:
+        command_list.append(f'--opts {input_config.opts}')
+    if input_config.disable_module is not None:
+        for item in input_config.disable_module:
+            command_list.append(f'--disable-module {item}')
+    if input_config.filename_restriction_scheme is not None:
+        command_list.append(f'--filename-restriction-scheme {input_config.filename_restriction_scheme}')
+    if input_config.ignore_user is not None:
+        for item in input_config.ignore_user:
+            command_list.append(f'--ignore-user {item}')
+    if input_config.include_id_file is not None:
+        for item in input_config.include_id_file:
+            command_list.append(f'--include-id-file {item}')
+    if input_config.log is not None:
+        command_list.append(f'--log {input_config.log}')
+    if input_config.saved:
+        command_list.append('--saved')
+    if input_config.search is not None:
+        command_list.append(f'--search {input_config.search}')
+    if input_config.submitted:
+        command_list.append('--submitted')
+    if input_config.upvoted:
+        command_list.append('--upvoted')
+    if input_config.limit is not None:
+        command_list.append(f'--limit {input_config.limit}')
+    if input_config.sort != SortType.HOT:
+        command_list.append(f'--sort {input_config.sort.value}')
+    if input_config.link is not None:
+        for item in input_config.link:
+            command_list.append(f'--link {item}')
+    if input_config.multireddit is not None:
+        for item in input_config.multireddit:
+            command_list.append(f'--multireddit {item}')
+    if input_config.subreddit is not None:
+        for item in input_config.subreddit:
+            command_list.append(f'--subreddit {item}')
+    if input_config.time != TimeFilter.ALL:
+        command_list.append(f'--time {input_config.time.value}')
+    if input_config.time_format is not None:
+        command_list.append(f'--time-format {input_config.time_format}')
+    if input_config.user is not None:
+        for item in input_config.user:
+            command_list.append(f'--user {item}')
+    if input_config.verbose is not None and input_config.verbose != 0:
+        command_list.append(f'-{"v" * input_config.verbose}')
+
+    downloader_command = ''
+
+    if input_config.download_config is not None:
+        downloader_command = legacy_serialize_downloader_configuration(input_config.download_config)
+
+    archiver_command = ''
+
+    if (input_config.archiver_config):
+        archiver_command += '--all-comments ' if input_config.archiver_config.all_comments else ''
+
+        if input_config.archiver_config.format != Format.JSON:
+            archiver_command += f'-f {input_config.archiver_config.format.value}'
+
+        archiver_command += '--comment-context ' if input_config.archiver_config.comment_context else ''
+
+    return ' '.join(command_list) + ' ' + downloader_command + ' ' + archiver_command
+
+
+def create_large_configuration(list_size: int) -> InputConfiguration:
+    input_config = InputConfiguration(directory='/data/reddit', limit=100, sort=SortType.NEW,
+                                      link=[f'post{i}' for i in range(list_size)],
+                                      subreddit=[f'subreddit{i}' for i in range(list_size // 10)],
+                                      ignore_user=[f'user{i}' for i in range(list_size // 10)])
+    input_config.download_config.exclude_id = [f'{i:06x}' for i in range(list_size)]
+    input_config.download_config.skip_domain = [f'domain{i}.com' for i in range(list_size // 10)]
+    return input_config
+
+
+def main():
+    for list_size in (1_000, 50_000, 200_000):
+        input_config = create_large_configuration(list_size)
+        number = max(1, 200_000 // list_size)
+
+        print(f'List size {list_size}, {number} runs each')
+        for name, function in (('legacy string', legacy_serialize_input_configuration),
+                               ('argv', serialize_input_configuration_to_argv),
+                               ('argv as string', serialize_input_configuration)):
+            seconds = min(timeit.repeat(lambda: function(input_config), number=number, repeat=3)) / number
+            print(f'  {name:<16}{seconds * 1000:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
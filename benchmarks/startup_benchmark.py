@@ -0,0 +1,79 @@
+"""
+Measures the import footprint and the startup time of the headless command line interface against its budget.
+Exits with status 1 if a budget is exceeded or Tk is imported, so it can guard the cron use on servers without display.
+Run from the repository root: python -m benchmarks.startup_benchmark
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Wall time of "python -m bdfrg validate" on top of a bare interpreter start, and modules imported by bdfrg.cli
+STARTUP_BUDGET_MS = 100
+MODULE_BUDGET = 150
+
+RUNS = 10
+
+# Prints the modules added by importing the CLI, in a fresh interpreter
+FOOTPRINT_SCRIPT = '''
+import json, sys
+before = set(sys.modules)
+import bdfrg.cli
+print(json.dumps(sorted(set(sys.modules) - before)))
+'''
+
+
+def measure_wall_time(arguments) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def measure_import_time() -> int:
+    # Cumulative import time of bdfrg.cli in microseconds, from the last line of -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import bdfrg.cli'],
+                            check=True, capture_output=True, text=True)
+    line = next(line for line in reversed(result.stderr.splitlines()) if line.endswith(' bdfrg.cli'))
+    return int(line.split('|')[1])
+
+
+def main():
+    failures = []
+
+    modules = json.loads(subprocess.run([sys.executable, '-c', FOOTPRINT_SCRIPT], check=True, capture_output=True,
+                                        text=True).stdout)
+    gui_modules = [module for module in modules if module.split('.')[0] in ('tkinter', '_tkinter')
+                   or module.startswith('bdfrg.gui')]
+    print(f'Modules imported by bdfrg.cli: {len(modules)} (budget {MODULE_BUDGET})')
+    if gui_modules:
+        failures.append(f'GUI modules imported: {", ".join(gui_modules)}')
+    if len(modules) > MODULE_BUDGET:
+        failures.append(f'{len(modules)} modules imported, budget is {MODULE_BUDGET}')
+
+    print(f'Import time of bdfrg.cli: {measure_import_time() / 1000:.1f} ms')
+
+    with tempfile.TemporaryDirectory() as directory:
+        configuration_path = os.path.join(directory, 'configuration.json')
+        with open(configuration_path, 'w') as f:
+            json.dump({'subreddit': ['pics', 'funny'], 'directory': directory}, f)
+
+        interpreter_ms = measure_wall_time(['-c', 'pass'])
+        cli_ms = measure_wall_time(['-m', 'bdfrg', 'validate', configuration_path])
+
+    print(f'Interpreter start: {interpreter_ms:.1f} ms, bdfrg validate: {cli_ms:.1f} ms '
+          f'(+{cli_ms - interpreter_ms:.1f} ms, budget +{STARTUP_BUDGET_MS} ms)')
+    if cli_ms - interpreter_ms > STARTUP_BUDGET_MS:
+        failures.append(f'Startup takes {cli_ms - interpreter_ms:.1f} ms, budget is {STARTUP_BUDGET_MS} ms')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Stands in for the BDFR executable without network access. Prints the messages of BDFR for completed posts, so that
+jobs can be run, tracked and budgeted locally: one 'Downloaded submission' (download) or 'Record for entry item'
+(archive, clone) line per post.
+The arguments are parsed like BDFR does, the directory is required and an unknown option fails with status 2, so a
+command BDFR would reject is rejected by the stub as well.
+Run as: benchmarks/stub_bdfr.py download DIRECTORY --limit 20 [--stub-delay 0.1]
+"""
+import argparse
+import random
+import sys
+import time
+
+# The options of BDFR 2, by sub command
+COMMON_OPTIONS = ['--authenticate', '--saved', '--submitted', '--upvoted']
+COMMON_VALUE_OPTIONS = ['--config', '--opts', '--filename-restriction-scheme', '--log', '--search', '--sort', '--time',
+                        '--time-format', '--file-scheme', '--folder-scheme']
+COMMON_REPEATED_OPTIONS = ['--disable-module', '--ignore-user', '--include-id-file', '--link', '--multireddit',
+                           '--subreddit', '--user', '--exclude-id', '--exclude-id-file']
+DOWNLOAD_OPTIONS = ['--make-hard-links', '--no-dupes', '--search-existing']
+DOWNLOAD_VALUE_OPTIONS = ['--max-wait-time', '--min-score', '--max-score', '--min-score-ratio', '--max-score-ratio']
+DOWNLOAD_REPEATED_OPTIONS = ['--skip-domain', '--skip', '--skip-subreddit']
+ARCHIVE_OPTIONS = ['--all-comments', '--comment-context']
+ARCHIVE_VALUE_OPTIONS = ['-f']
+
+
+def add_options(parser: argparse.ArgumentParser, flags: list, values: list, repeated: list):
+    for option in flags:
+        parser.add_argument(option, action='store_true')
+    for option in values:
+        parser.add_argument(option)
+    for option in repeated:
+        parser.add_argument(option, action='append')
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='bdfr')
+    modes = parser.add_subparsers(dest='mode', required=True)
+    for mode in ('download', 'archive', 'clone'):
+        mode_parser = modes.add_parser(mode)
+        mode_parser.add_argument('directory')
+        mode_parser.add_argument('--limit', type=int, default=20, help='The number of posts')
+        mode_parser.add_argument('-v', '--verbose', action='count', default=0)
+        mode_parser.add_argument('--stub-delay', type=float, default=0.05, help='Seconds per post, only of the stub')
+        add_options(mode_parser, COMMON_OPTIONS, COMMON_VALUE_OPTIONS, COMMON_REPEATED_OPTIONS)
+        if mode != 'archive':
+            add_options(mode_parser, DOWNLOAD_OPTIONS, DOWNLOAD_VALUE_OPTIONS, DOWNLOAD_REPEATED_OPTIONS)
+        if mode != 'download':
+            add_options(mode_parser, ARCHIVE_OPTIONS, ARCHIVE_VALUE_OPTIONS, [])
+    return parser
+
+
+def main():
+    arguments = create_parser().parse_args()
+
+    for _ in range(arguments.limit):
+        time.sleep(arguments.stub_delay)
+        post_id = ''.join(random.choices('0123456789abcdefghijklmnopqrstuvwxyz', k=7))
+        if arguments.mode == 'download':
+            print(f'[2024-01-01 00:00:00,000 - bdfr.downloader - INFO] - Downloaded submission {post_id} from pics')
+        else:
+            print(f'[2024-01-01 00:00:00,000 - bdfr.archiver - DEBUG] - Record for entry item {post_id} '
+                  f'written to disk')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()